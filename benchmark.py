@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+CloudHealth Perspective Parser Benchmarks
+Runs the full parse/render pipeline on generated schemas of several sizes
+and reports wall time, peak traced memory and throughput for each phase:
+
+    decode      read the schema file and decode the JSON (--json-backend)
+    index       compile the schema into the indexed Perspective form
+    categorize  render the categorize rules (dynamic group blocks)
+    static      render the static groups
+    write       stream the rendered lines to a file
+
+JSON decode time is also measured for every installed JSON backend, and
+classifying a generated inventory (--classify-assets) for every rule
+evaluator of classify_assets.py. Fetching schemas from a local mock API
+server (--fetch-schemas) is timed with an empty cache, with a warm cache
+revalidated by 304 responses, and with injected 429 and 500 responses.
+
+Results can be saved as a JSON baseline and compared on a later run;
+phases slower than the baseline by more than --threshold are flagged and
+the script exits non-zero.
+
+Requirements:
+    - Python 3.6+
+    - same requirements as parse_perspective.py
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+import classify_assets
+import parse_perspective
+from generate_schema import generate_inventory, generate_schema
+from mock_api_server import start_mock_server
+
+
+BASELINE_VERSION = 1
+
+# Generated schema sizes; keyword arguments for generate_schema()
+SIZES = {
+    'small': dict(blocks=3, groups_per_block=200, static_groups=20),
+    'medium': dict(blocks=10, groups_per_block=5000, static_groups=200,
+                   rules_per_static_group=4, clauses_per_filter=2),
+    'large': dict(blocks=20, groups_per_block=25000, static_groups=1000,
+                  rules_per_static_group=4, clauses_per_filter=2),
+}
+
+DEFAULT_SIZES = 'small,medium'
+DEFAULT_CLASSIFY_ASSETS = 20000
+DEFAULT_FETCH_SCHEMAS = 200
+
+# Simulated per-request latency of the mock API server, so concurrency matters
+FETCH_LATENCY_SECONDS = 0.01
+
+FETCH_RETRY_AFTER_SECONDS = 0.05
+
+# Fetch scenarios: (name, injected 429 and 500 rates, HTTP cache directory).
+# 'warm' reuses the cache filled by 'cold'; with a TTL of 0 every entry is
+# revalidated and answered with 304.
+FETCH_SCENARIOS = (
+    ('cold', dict(rate_429=0.0, error_rate=0.0), 'http-cache'),
+    ('warm', dict(rate_429=0.0, error_rate=0.0), 'http-cache'),
+    ('faults', dict(rate_429=0.1, error_rate=0.02), 'http-cache-faults'),
+)
+
+# Phase timings below this many seconds are too noisy to flag as regressions
+NOISE_FLOOR_SECONDS = 0.002
+
+
+def _measure(func, trace_memory):
+    """Run func() and return (result, seconds, peak traced bytes or None)."""
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = None
+        if trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def _phases(schema_path, output_path):
+    """Return the pipeline as a list of (phase name, step) pairs sharing one state dict."""
+    def decode(state):
+        state['schema_data'] = parse_perspective.load_schema_file(schema_path)
+
+    def index(state):
+        state['perspective'] = parse_perspective.compile_perspective(state['schema_data'])
+
+    def categorize(state):
+        state['categorize_lines'] = list(parse_perspective.iter_categorize_lines(state['perspective']))
+        return len(state['categorize_lines'])
+
+    def static(state):
+        state['static_lines'] = list(parse_perspective.iter_static_lines(state['perspective']))
+        return len(state['static_lines'])
+
+    def write(state):
+        lines = state['categorize_lines'] + state['static_lines']
+        with open(output_path, 'w', buffering=parse_perspective.OUTPUT_BUFFER_SIZE) as f:
+            parse_perspective.write_perspective_lines(lines, f)
+        return len(lines)
+
+    return [
+        ('decode', decode),
+        ('index', index),
+        ('categorize', categorize),
+        ('static', static),
+        ('write', write),
+    ]
+
+
+def run_pipeline(schema_path, output_path, trace_memory=False):
+    """Run every phase once. Returns {phase: (seconds, peak bytes, lines)}."""
+    state = {}
+    results = {}
+    for name, step in _phases(schema_path, output_path):
+        lines, seconds, peak = _measure(lambda: step(state), trace_memory)
+        results[name] = (seconds, peak, lines)
+    return results
+
+
+def benchmark_classify(schema_data, perspective, assets, repeat=5, seed=0):
+    """Time classifying a generated inventory with each evaluator. Returns {evaluator: result}."""
+    inventory = [
+        classify_assets.Asset(asset['id'], asset['type'], asset['fields'], asset['tags'])
+        for asset in generate_inventory(schema_data, assets, seed=seed)
+    ]
+    results = {}
+    for evaluator in classify_assets.EVALUATORS:
+        try:
+            classifier, build_seconds, _ = _measure(
+                lambda: classify_assets.PerspectiveClassifier(perspective, evaluator=evaluator), False)
+        except ValueError:  # NumPy not installed
+            continue
+        seconds = min(
+            _measure(lambda: list(classify_assets.classify_assets(classifier, inventory)), False)[1]
+            for _ in range(repeat)
+        )
+        results[evaluator] = {
+            'build_seconds': build_seconds,
+            'seconds': seconds,
+            'assets_per_sec': len(inventory) / seconds if seconds > 0 else 0.0,
+        }
+    return results
+
+
+def benchmark_fetch(count, workdir, seed=0, workers=parse_perspective.DEFAULT_FETCH_WORKERS):
+    """Time fetching count schemas from a local mock API server in each of FETCH_SCENARIOS. Returns {name: result}."""
+    fixtures_dir = os.path.join(workdir, 'fixtures')
+    os.makedirs(fixtures_dir, exist_ok=True)
+    body = json.dumps(generate_schema(seed=seed, **SIZES['small']))
+    perspective_ids = [str(1000 + index) for index in range(count)]
+    for perspective_id in perspective_ids:
+        with open(os.path.join(fixtures_dir, f"{perspective_id}.json"), 'w') as f:
+            f.write(body)
+
+    results = {}
+    # One server for all scenarios, as cache entries are keyed by its URL
+    server = start_mock_server(fixtures_dir, latency=FETCH_LATENCY_SECONDS, retry_after=FETCH_RETRY_AFTER_SECONDS)
+    try:
+        for name, faults, cache_name in FETCH_SCENARIOS:
+            server.rate_429 = faults['rate_429']
+            server.error_rate = faults['error_rate']
+            server.counters = {}
+            cache = parse_perspective.HTTPSchemaCache(os.path.join(workdir, cache_name), ttl=0)
+            scheduler = parse_perspective.FetchScheduler(max_concurrency=workers)
+            start = time.perf_counter()
+            schemas, errors = parse_perspective.fetch_perspectives_bulk(
+                'benchmark', perspective_ids, workers, cache=cache, scheduler=scheduler, base_url=server.base_url)
+            seconds = time.perf_counter() - start
+            results[name] = {
+                'seconds': seconds,
+                'schemas': len(schemas),
+                'errors': len(errors),
+                'requests': scheduler.requests,
+                'requests_per_sec': scheduler.requests / seconds if seconds > 0 else 0.0,
+                'throttled': scheduler.throttled,
+                'retries': scheduler.retries,
+                'cache': {'hits': cache.hits, 'revalidated': cache.revalidated, 'misses': cache.misses},
+                'server': dict(server.counters),
+            }
+    finally:
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+def benchmark_size(size_name, params, workdir, repeat=5, seed=0, classify_assets_count=0):
+    """Benchmark one generated schema size. Returns its result dict."""
+    schema_path = os.path.join(workdir, f"{size_name}.json")
+    output_path = os.path.join(workdir, f"{size_name}.txt")
+
+    schema_data = generate_schema(seed=seed, **params)
+    with open(schema_path, 'w') as f:
+        json.dump(schema_data, f)
+    input_bytes = os.path.getsize(schema_path)
+
+    # Best-of-N timings without tracing overhead, then one traced run for memory
+    best = {}
+    for _ in range(repeat):
+        for name, (seconds, _, lines) in run_pipeline(schema_path, output_path).items():
+            if name not in best or seconds < best[name][0]:
+                best[name] = (seconds, lines)
+    traced = run_pipeline(schema_path, output_path, trace_memory=True)
+
+    # Decode time for each installed JSON backend
+    with open(schema_path, 'rb') as f:
+        data = f.read()
+    decode_backends = {}
+    for backend in parse_perspective.JSON_BACKENDS:
+        try:
+            _, loads = parse_perspective.load_json_backend(backend)
+        except ValueError:
+            continue
+        decode_backends[backend] = min(
+            _measure(lambda: loads(data), False)[1] for _ in range(repeat)
+        )
+    del data
+
+    classify = {}
+    if classify_assets_count:
+        perspective = parse_perspective.compile_perspective(schema_data)
+        classify = benchmark_classify(schema_data, perspective, classify_assets_count, repeat=repeat, seed=seed)
+    del schema_data
+
+    phases = {}
+    for name, (seconds, lines) in best.items():
+        phase = {'seconds': seconds, 'peak_bytes': traced[name][1]}
+        if lines is not None:
+            phase['lines'] = lines
+            phase['lines_per_sec'] = lines / seconds if seconds > 0 else 0.0
+        if name == 'decode':
+            phase['mb_per_sec'] = input_bytes / (1024 * 1024) / seconds if seconds > 0 else 0.0
+        phases[name] = phase
+
+    return {
+        'params': dict(params, seed=seed),
+        'input_bytes': input_bytes,
+        'json_backend': parse_perspective.json_backend_name(),
+        'phases': phases,
+        'decode_backends': decode_backends,
+        'classify_assets': classify_assets_count,
+        'classify': classify,
+    }
+
+
+def run_benchmarks(size_names, repeat=5, seed=0, classify_assets_count=0, fetch_schemas=0):
+    """Benchmark each named size, and fetching if fetch_schemas, and return the full results document."""
+    results = {
+        'version': BASELINE_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sizes': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='perspective-bench-') as workdir:
+        for size_name in size_names:
+            results['sizes'][size_name] = benchmark_size(
+                size_name, SIZES[size_name], workdir, repeat=repeat, seed=seed,
+                classify_assets_count=classify_assets_count
+            )
+        if fetch_schemas:
+            results['fetch_schemas'] = fetch_schemas
+            results['fetch'] = benchmark_fetch(fetch_schemas, workdir, seed=seed)
+
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS and kilobytes elsewhere
+        results['peak_rss_bytes'] = max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+    return results
+
+
+def compare_results(current, baseline, threshold):
+    """Return a list of (size, phase, baseline seconds, current seconds) regressions."""
+    regressions = []
+    for size_name, size_result in current['sizes'].items():
+        base_size = baseline.get('sizes', {}).get(size_name)
+        if not base_size or base_size.get('params') != size_result['params']:
+            continue
+        for phase, result in size_result['phases'].items():
+            base_phase = base_size['phases'].get(phase)
+            if not base_phase:
+                continue
+            # Decode times are only comparable with the same JSON backend
+            if phase == 'decode' and base_size.get('json_backend') != size_result['json_backend']:
+                continue
+            base_seconds = base_phase['seconds']
+            seconds = result['seconds']
+            if seconds - base_seconds > NOISE_FLOOR_SECONDS and seconds > base_seconds * (1 + threshold):
+                regressions.append((size_name, phase, base_seconds, seconds))
+    return regressions
+
+
+def format_results(results, baseline=None):
+    """Format results as a text table, with the change against baseline if given."""
+    lines = []
+    header = f"{'size':<8} {'phase':<11} {'seconds':>10} {'peak MB':>9} {'lines/sec':>12}"
+    if baseline:
+        header += f" {'vs base':>9}"
+    lines.append(header)
+    lines.append('-' * len(header))
+
+    for size_name, size_result in results['sizes'].items():
+        base_phases = {}
+        if baseline:
+            base_size = baseline.get('sizes', {}).get(size_name, {})
+            if base_size.get('params') == size_result['params']:
+                base_phases = base_size.get('phases', {})
+
+        for phase, result in size_result['phases'].items():
+            peak = result.get('peak_bytes')
+            peak_mb = f"{peak / (1024 * 1024):.1f}" if peak is not None else '-'
+            rate = f"{result['lines_per_sec']:,.0f}" if 'lines_per_sec' in result else '-'
+            row = f"{size_name:<8} {phase:<11} {result['seconds']:>10.4f} {peak_mb:>9} {rate:>12}"
+            if baseline:
+                base_phase = base_phases.get(phase)
+                if base_phase and base_phase['seconds'] > 0:
+                    change = (result['seconds'] / base_phase['seconds'] - 1) * 100
+                    row += f" {change:>+8.1f}%"
+                else:
+                    row += f" {'-':>9}"
+            lines.append(row)
+
+        size_mb = size_result['input_bytes'] / (1024 * 1024)
+        lines.append(f"{'':<8} input {size_mb:.1f} MB, decoded with {size_result['json_backend']}")
+
+        decode_backends = size_result.get('decode_backends', {})
+        stdlib_seconds = decode_backends.get('json')
+        for backend, seconds in decode_backends.items():
+            speedup = f" ({stdlib_seconds / seconds:.1f}x json)" if stdlib_seconds and seconds > 0 else ''
+            lines.append(f"{'':<8} decode with {backend:<9} {seconds:>10.4f}s{speedup}")
+
+        classify = size_result.get('classify', {})
+        interpreted = classify.get('interpreted', {}).get('seconds')
+        for evaluator, result in classify.items():
+            seconds = result['seconds']
+            speedup = f" ({interpreted / seconds:.1f}x interpreted)" if interpreted and seconds > 0 else ''
+            lines.append(f"{'':<8} classify {size_result['classify_assets']} assets, {evaluator:<11} "
+                         f"{seconds:>8.4f}s {result['assets_per_sec']:>10,.0f}/sec "
+                         f"(build {result['build_seconds']:.4f}s){speedup}")
+
+    for scenario, result in results.get('fetch', {}).items():
+        server = ', '.join(f"{count} {name}" for name, count in sorted(result['server'].items()))
+        lines.append(f"fetch {results['fetch_schemas']} schemas, {scenario:<6} {result['seconds']:>8.4f}s "
+                     f"{result['requests_per_sec']:>8,.0f} req/sec, {result['retries']} retries, "
+                     f"{result['errors']} errors (server: {server})")
+
+    if 'peak_rss_bytes' in results:
+        lines.append(f"Peak RSS: {results['peak_rss_bytes'] / (1024 * 1024):.1f} MB")
+
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the perspective parse/render pipeline on generated schemas'
+    )
+    parser.add_argument(
+        '--sizes',
+        default=DEFAULT_SIZES,
+        help=f"Comma-separated sizes to run: {', '.join(SIZES)} (default: {DEFAULT_SIZES})"
+    )
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timing runs per size; the fastest is reported (default: 5)')
+    parser.add_argument('--seed', type=int, default=0, help='Schema generator seed (default: 0)')
+    parser.add_argument('--classify-assets', type=int, default=DEFAULT_CLASSIFY_ASSETS,
+                        help=f'Generated assets to classify with each rule evaluator; 0 to skip '
+                             f'(default: {DEFAULT_CLASSIFY_ASSETS})')
+    parser.add_argument('--fetch-schemas', type=int, default=DEFAULT_FETCH_SCHEMAS,
+                        help=f'Schemas to fetch from a local mock API server: cold, warm (304) and with '
+                             f'injected 429/500 responses; 0 to skip (default: {DEFAULT_FETCH_SCHEMAS})')
+    parser.add_argument('--save', default=None, help='Write results to this JSON baseline file')
+    parser.add_argument('--compare', default=None, help='Compare against this JSON baseline file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Flag phases slower than the baseline by more than this fraction (default: 0.10)')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON instead of a table')
+    parser.add_argument('--json-backend', choices=('auto',) + parse_perspective.JSON_BACKENDS, default='auto',
+                        help='JSON backend for the decode phase (default: auto, fastest installed)')
+
+    args = parser.parse_args()
+
+    size_names = [name.strip() for name in args.sizes.split(',') if name.strip()]
+    unknown = [name for name in size_names if name not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+
+    try:
+        parse_perspective.set_json_backend(args.json_backend)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, 'r') as f:
+                baseline = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error: Could not read baseline '{args.compare}': {e}", file=sys.stderr)
+            sys.exit(1)
+
+    results = run_benchmarks(size_names, repeat=args.repeat, seed=args.seed,
+                             classify_assets_count=args.classify_assets, fetch_schemas=args.fetch_schemas)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(format_results(results, baseline))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save}", file=sys.stderr)
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}:", file=sys.stderr)
+            for size_name, phase, base_seconds, seconds in regressions:
+                print(f"  {size_name}/{phase}: {base_seconds:.4f}s -> {seconds:.4f}s", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
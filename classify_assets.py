@@ -0,0 +1,1691 @@
+#!/usr/bin/env python3
+"""
+CloudHealth Perspective Asset Classifier
+Assigns every asset of an inventory to its group in a perspective, using
+the rules that parse_perspective.py renders:
+
+    - rules are evaluated in schema order and the first matching rule wins
+    - a categorize rule puts an asset in the dynamic group of its block
+      whose value equals the asset's tag_field tag
+    - a filter rule (clauses AND'd) puts a matching asset in its group;
+      a group's filter rules are OR'd through this first-match order
+    - merged groups are followed to the group they are merged into
+    - assets that match no rule land in the is_other ('Other') group
+
+Inventories are JSONL, one asset per line:
+
+    {"id": "...", "type": "AzureSubscription", "fields": {"Subscription Name": "..."}, "tags": {"Owner": "..."}}
+
+or CSV with 'id' and 'type' columns, a 'tag:<key>' column per tag key and
+a column per field. Empty cells are missing values. gzip/bz2/xz files are
+decompressed on the fly. With --jobs N, an uncompressed inventory is split
+into N byte ranges classified by forked worker processes. Given several
+schema files, the inventory is read once and classified against all of
+them, with an assignment column per perspective.
+
+Requirements:
+    - Python 3.6+
+    - same requirements as parse_perspective.py
+"""
+
+import argparse
+import codecs
+import csv
+import functools
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from operator import attrgetter, methodcaller
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+import parse_perspective
+from parse_perspective import (
+    COMPRESSED_EXTENSIONS, COMPRESSED_FORMATS, DECOMPRESSION_ERRORS, OUTPUT_BUFFER_SIZE, GroupBlock, json_loads,
+    open_output, open_schema_file, profile_iter, profile_note, profile_stage,
+)
+
+
+INVENTORY_FORMATS = ('jsonl', 'csv')
+OUTPUT_FORMATS = ('csv', 'jsonl')
+CSV_HEADER = 'id,type,group_id,group\n'
+CONTAINS_MATCHERS = ('ahocorasick', 'automaton', 'substring')
+EVALUATORS = ('compiled', 'encoded', 'numpy', 'interpreted')
+
+# Assets per batch of the 'numpy' evaluator
+NUMPY_BATCH_ASSETS = 65536
+# Assets per batch routed by asset type for per-type stats; small enough
+# that a batch of decoded assets does not add garbage collector work
+TYPE_BATCH_ASSETS = 4096
+
+# With 'auto', the pure-Python automaton is only used for a field with at
+# least this many distinct Contains values; below it, separate substring
+# tests (each a single C-level scan) are faster.
+AUTOMATON_MIN_PATTERNS = 64
+
+# Default bound of the signature table of --dedupe (entries, per asset type)
+DEFAULT_SIGNATURE_CACHE_SIZE = 65536
+
+# Clause operators (lower-case) -> test(value, val). value is None when the
+# asset lacks the field or tag; the negated operators are exact negations,
+# so a missing value is != any val and does not contain anything.
+CLAUSE_TESTS = {
+    '=': lambda value, val: value == val,
+    '!=': lambda value, val: value != val,
+    'contains': lambda value, val: value is not None and val in value,
+    'does not contain': lambda value, val: value is None or val not in value,
+    'is null': lambda value, val: not value,
+    'is not null': lambda value, val: bool(value),
+}
+
+
+class Asset(namedtuple('Asset', 'id type fields tags')):
+    """One inventory asset; fields and tags are dicts of str values."""
+
+    __slots__ = ()
+
+
+def detect_inventory_format(path):
+    """Guess the inventory format from the file name: csv for *.csv(.gz|.bz2|.xz), else jsonl."""
+    name, ext = os.path.splitext(path.lower())
+    if ext in COMPRESSED_EXTENSIONS:
+        ext = os.path.splitext(name)[1]
+    return 'csv' if ext == '.csv' else 'jsonl'
+
+
+# Types of the field and tag values classified without conversion
+_STRING_TYPES = frozenset([str])
+
+
+def _string_values(values, kind):
+    """
+    Return a JSONL asset's fields or tags (kind) with string values.
+
+    Numbers become strings and booleans 'true' / 'false', as written in the
+    JSON; null values are left out, like missing ones. Raises ValueError
+    for anything else.
+    """
+    if type(values) is not dict:
+        raise ValueError(f"'{kind}' is not an object")
+
+    converted = {}
+    for key, value in values.items():
+        if type(value) is str:
+            converted[key] = value
+        elif value is None:
+            continue
+        elif type(value) is bool:
+            converted[key] = 'true' if value else 'false'
+        elif type(value) in (int, float):
+            converted[key] = str(value)
+        else:
+            raise ValueError(f"{kind[:-1]} '{key}' is {type(value).__name__}, not a string")
+    return converted
+
+
+def iter_jsonl_assets(f):
+    """
+    Yield Assets from a binary JSONL stream. Raises ValueError on a bad
+    line, including field and tag values that are not strings, numbers,
+    booleans or null.
+    """
+    only_strings = _STRING_TYPES.issuperset
+    for line_number, line in enumerate(iter(f.readline, b''), 1):
+        if line.isspace():
+            continue
+        try:
+            record = json_loads(line)
+            fields = record.get('fields') or {}
+            tags = record.get('tags') or {}
+            # Fast path: string values in an object
+            if type(fields) is not dict or not only_strings(map(type, fields.values())):
+                fields = _string_values(fields, 'fields')
+            if type(tags) is not dict or not only_strings(map(type, tags.values())):
+                tags = _string_values(tags, 'tags')
+            yield Asset(record.get('id'), record.get('type', ''), fields, tags)
+        except (ValueError, AttributeError) as e:
+            raise ValueError(f"Invalid asset on line {line_number}: {e}")
+
+
+def iter_csv_assets(f):
+    """Yield Assets from a binary CSV stream with a header row."""
+    reader = csv.reader(codecs.iterdecode(iter(f.readline, b''), 'utf-8'))
+    header = next(reader, None)
+    if header is None:
+        return
+    if 'type' not in header:
+        raise ValueError("CSV inventory has no 'type' column")
+
+    id_index = header.index('id') if 'id' in header else None
+    type_index = header.index('type')
+    field_columns = []
+    tag_columns = []
+    for index, column in enumerate(header):
+        if index in (id_index, type_index):
+            continue
+        if column.startswith('tag:'):
+            tag_columns.append((index, column[4:]))
+        else:
+            field_columns.append((index, column))
+
+    width = len(header)
+    for row in reader:
+        if not row:
+            continue
+        if len(row) < width:
+            row.extend([''] * (width - len(row)))
+        yield Asset(
+            row[id_index] if id_index is not None else None,
+            row[type_index],
+            {field: row[index] for index, field in field_columns if row[index]},
+            {key: row[index] for index, key in tag_columns if row[index]},
+        )
+
+
+def iter_inventory(f, inventory_format='jsonl'):
+    """Yield Assets from a binary stream (see parse_perspective.open_schema_file())."""
+    if inventory_format == 'csv':
+        return iter_csv_assets(f)
+    if inventory_format == 'jsonl':
+        return iter_jsonl_assets(f)
+    raise ValueError(f"Unknown inventory format '{inventory_format}'")
+
+
+class AhoCorasick:
+    """
+    Pure-Python Aho-Corasick automaton over a fixed list of patterns.
+
+    match(text) scans text once and returns a bitmask with bit i set when
+    patterns[i] occurs in it.
+    """
+
+    def __init__(self, patterns):
+        goto = [{}]  # node -> {char: node}
+        fail = [0]
+        out = [0]  # node -> mask of the patterns ending there
+        for bit, pattern in enumerate(patterns):
+            node = 0
+            for char in pattern:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = goto[node][char] = len(goto)
+                    goto.append({})
+                    fail.append(0)
+                    out.append(0)
+                node = next_node
+            out[node] |= 1 << bit
+
+        # Breadth-first, so a node's failure link is final before its children's
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, next_node in goto[node].items():
+                queue.append(next_node)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[next_node] = goto[state].get(char, 0)
+                out[next_node] |= out[fail[next_node]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def match(self, text):
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        node = 0
+        found = 0
+        for char in text:
+            next_node = goto[node].get(char)
+            while next_node is None and node:
+                node = fail[node]
+                next_node = goto[node].get(char)
+            node = next_node or 0
+            found |= out[node]
+        return found
+
+
+class PyAhoCorasick:
+    """The AhoCorasick interface over a pyahocorasick automaton (C extension)."""
+
+    def __init__(self, patterns):
+        automaton = ahocorasick.Automaton()
+        masks = {}
+        for bit, pattern in enumerate(patterns):
+            masks[pattern] = masks.get(pattern, 0) | 1 << bit
+        for pattern, mask in masks.items():
+            automaton.add_word(pattern, mask)
+        automaton.make_automaton()
+        self._iter = automaton.iter
+
+    def match(self, text):
+        found = 0
+        for _, mask in self._iter(text):
+            found |= mask
+        return found
+
+
+def build_contains_matcher(patterns, matcher='auto'):
+    """
+    Return a matcher for a field's Contains values, or None to test each
+    value with a substring search. matcher is one of CONTAINS_MATCHERS or
+    'auto': pyahocorasick if installed, else the pure-Python automaton for
+    at least AUTOMATON_MIN_PATTERNS values. Raises ValueError for an
+    unknown or unavailable matcher.
+    """
+    if matcher == 'auto':
+        if ahocorasick is not None:
+            matcher = 'ahocorasick'
+        elif len(patterns) >= AUTOMATON_MIN_PATTERNS:
+            matcher = 'automaton'
+        else:
+            matcher = 'substring'
+    if matcher == 'substring':
+        return None
+    if matcher == 'automaton':
+        return AhoCorasick(patterns)
+    if matcher == 'ahocorasick':
+        if ahocorasick is None:
+            raise ValueError("Contains matcher 'ahocorasick' is not installed (pip install pyahocorasick)")
+        return PyAhoCorasick(patterns)
+    raise ValueError(f"Unknown contains matcher '{matcher}'")
+
+
+class _ContainsField:
+    """
+    One (asset type, field) automaton. The clauses of consecutive rules see
+    the same value object for an asset, so the mask of the last value scanned
+    is reused and each asset's value is scanned at most once.
+    """
+
+    def __init__(self, patterns, matcher):
+        self.patterns = patterns
+        self.bits = {pattern: 1 << bit for bit, pattern in enumerate(patterns)}
+        self._match = matcher.match
+        self._value = None
+        self._mask = 0
+
+    def mask(self, value):
+        if value is not self._value:
+            self._mask = self._match(value) if value is not None else 0
+            self._value = value
+        return self._mask
+
+    def tests(self):
+        """Return (contains test, does not contain test) bound to this field's masks."""
+        mask = self.mask
+        contains = lambda value, bit: value is not None and mask(value) & bit != 0
+        does_not_contain = lambda value, bit: value is None or mask(value) & bit == 0
+        return contains, does_not_contain
+
+
+def _contains_fields(rules_by_type, matcher):
+    """Build a _ContainsField per (asset type, is_tag, field) with enough Contains values."""
+    patterns = {}
+    for asset_type, rules in rules_by_type.items():
+        for clauses, _, _ in rules:
+            for clause in clauses:
+                if clause.op.lower() in ('contains', 'does not contain'):
+                    values = patterns.setdefault((asset_type, clause.is_tag, clause.field), {})
+                    values.setdefault(clause.val, None)
+
+    fields = {}
+    for key, values in patterns.items():
+        # The empty string is in every value; the substring test handles it
+        values = [val for val in values if val]
+        field_matcher = build_contains_matcher(values, matcher) if values else None
+        if field_matcher is not None:
+            fields[key] = _ContainsField(values, field_matcher)
+    return fields
+
+
+def _compile_tests(clauses, asset_type=None, contains_fields=None):
+    """
+    Bind each clause to its operator test: (is_tag, field, test, val) tuples.
+    Contains clauses on a field in contains_fields test its automaton's mask
+    (val is then the pattern's bit).
+    """
+    tests = []
+    for clause in clauses:
+        op = clause.op.lower()
+        test = CLAUSE_TESTS.get(op)
+        if test is None:
+            raise ValueError(f"Unsupported operator '{clause.op}' on {clause.field}")
+        val = clause.val
+        contains_field = None
+        if op in ('contains', 'does not contain') and contains_fields:
+            contains_field = contains_fields.get((asset_type, clause.is_tag, clause.field))
+        if contains_field is not None and val in contains_field.bits:
+            contains, does_not_contain = contains_field.tests()
+            test = contains if op == 'contains' else does_not_contain
+            val = contains_field.bits[val]
+        tests.append((clause.is_tag, clause.field, test, val))
+    return tuple(tests)
+
+
+def _clause_source(clause, asset_type, contains_fields, constant):
+    """Return a Python expression for one clause over the locals fields and tags."""
+    op = clause.op.lower()
+    if op not in CLAUSE_TESTS:
+        raise ValueError(f"Unsupported operator '{clause.op}' on {clause.field}")
+    value = f"{'tags' if clause.is_tag else 'fields'}.get({constant(clause.field)})"
+    val = clause.val
+
+    if op == '=':
+        return f"{value} == {constant(val)}"
+    if op == '!=':
+        return f"{value} != {constant(val)}"
+    if op == 'is null':
+        return f"not {value}"
+    if op == 'is not null':
+        return value
+
+    contains = op == 'contains'
+    if val == '':
+        return f"{value} is not None" if contains else f"{value} is None"
+    contains_field = contains_fields.get((asset_type, clause.is_tag, clause.field))
+    if contains_field is not None and val in contains_field.bits:
+        test = f"{constant(contains_field.mask)}({value}) & {contains_field.bits[val]}"
+        return test if contains else f"not {test}"
+    return f"{constant(val)} {'in' if contains else 'not in'} ({value} or '')"
+
+
+def _generate_classifier(asset_type, rules, contains_fields, other_id, new_group, cache=None):
+    """
+    Generate the source of one function classify(fields, tags) running an
+    asset type's rules (see PerspectiveClassifier) as a chain of if
+    statements, and compile it. Returns (function, source).
+
+    Consecutive filter rules of the same group become one OR'd condition.
+    Field names and values are inlined as literals; anything else (tag
+    indexes, automaton masks) is bound in the function's globals. With a
+    CompiledPerspectiveCache the bytecode is reused across runs.
+    """
+    namespace = {'_new_group': new_group}
+    names = {}  # (object id or bound method key) -> global name
+
+    def constant(value):
+        if value is None or type(value) in (str, int, bool):
+            return repr(value)
+        # Bound methods are new objects on every access; key them by their instance
+        key = (id(value.__self__), value.__name__) if hasattr(value, '__self__') else id(value)
+        name = names.get(key)
+        if name is None:
+            name = names[key] = f"_k{len(names)}"
+            namespace[name] = value
+        return name
+
+    def condition(clauses):
+        if not clauses:
+            return 'True'
+        return ' and '.join(_clause_source(clause, asset_type, contains_fields, constant) for clause in clauses)
+
+    lines = [f"# Rules for asset type {asset_type!r}", 'def classify(fields, tags):']
+    position = 0
+    while position < len(rules):
+        clauses, group_id, block = rules[position]
+        position += 1
+        if block is not None:
+            lines.append(f"    if {condition(clauses)}:")
+            lines.append(f"        value = tags.get({constant(block.tag_field)})")
+            lines.append("        if value:")
+            lines.append(f"            group = {constant(block.index)}.get(value)")
+            lines.append(f"            return _new_group({block.ref_id}, value) if group is None else group")
+            continue
+
+        alternatives = [clauses]
+        while position < len(rules) and rules[position][2] is None and rules[position][1] == group_id:
+            alternatives.append(rules[position][0])
+            position += 1
+        if len(alternatives) == 1:
+            test = condition(clauses)
+        else:
+            test = ' or '.join(f"({condition(alternative)})" for alternative in alternatives)
+        lines.append(f"    if {test}:")
+        lines.append(f"        return {group_id}")
+    lines.append(f"    return {other_id}")
+
+    source = '\n'.join(lines) + '\n'
+    code = cache.load_code(source) if cache is not None else None
+    if code is None:
+        code = compile(source, f"<classifier {asset_type}>", 'exec')
+        if cache is not None:
+            cache.store_code(source, code)
+    exec(code, namespace)
+    return namespace['classify'], source
+
+
+class _Column:
+    """
+    A dictionary-encoded field or tag column of one asset type's rules.
+
+    Each distinct value gets an integer code and a bitmask of the rules it
+    fails, i.e. the rules with a clause on this column that the value does
+    not satisfy. Clauses are evaluated once per distinct value: '=' and
+    '!=' clauses through dict lookups, Contains clauses by finding the
+    values' matching patterns (with the column's automaton, if it has one).
+    """
+
+    def __init__(self, is_tag, field, contains_field=None):
+        self.is_tag = is_tag
+        self.field = field
+        self._contains_field = contains_field
+        self.codes = {}  # value -> code
+        self.values = []  # code -> value
+        self.masks = []  # code -> failed rules mask
+        self._equal_vals = {}  # rule bit -> set of '=' values
+        self._equal = {}  # value -> rules whose '=' clauses it satisfies
+        self._equal_rules = 0  # rules with '=' clauses
+        self._not_equal = {}  # value -> rules with a '!=' clause on it
+        self._null = 0  # rules with an 'is null' clause
+        self._not_null = 0  # rules with an 'is not null' clause
+        self._contains_vals = {}  # rule bit -> set of 'contains' values
+        self._contains = {}  # val -> rules whose only 'contains' value it is
+        self._contains_rules = 0  # rules with a single 'contains' value
+        self._contains_multi = []  # (rule bit, set of 'contains' values)
+        self._not_contains = {}  # val -> rules with a 'does not contain' clause on it
+        self._scan = []  # patterns not in the automaton, tested one by one
+
+    def add_clause(self, bit, op, val):
+        """Add a clause of the rule with bit (one of CLAUSE_TESTS)."""
+        if op == '=':
+            self._equal_vals.setdefault(bit, set()).add(val)
+        elif op == '!=':
+            self._not_equal[val] = self._not_equal.get(val, 0) | bit
+        elif op == 'is null':
+            self._null |= bit
+        elif op == 'is not null':
+            self._not_null |= bit
+        elif op == 'contains':
+            self._contains_vals.setdefault(bit, set()).add(val)
+        else:
+            self._not_contains[val] = self._not_contains.get(val, 0) | bit
+
+    def finish(self):
+        """Index the '=' and 'contains' clauses once all rules are added."""
+        for bit, vals in self._equal_vals.items():
+            self._equal_rules |= bit
+            # Equal to two different values at once never holds
+            if len(vals) == 1:
+                val, = vals
+                self._equal[val] = self._equal.get(val, 0) | bit
+
+        for bit, vals in self._contains_vals.items():
+            if len(vals) == 1:
+                val, = vals
+                self._contains[val] = self._contains.get(val, 0) | bit
+                self._contains_rules |= bit
+            else:
+                self._contains_multi.append((bit, vals))
+
+        patterns = set(self._not_contains)
+        for vals in self._contains_vals.values():
+            patterns.update(vals)
+        automaton = self._contains_field.bits if self._contains_field is not None else {}
+        self._scan = [val for val in patterns if val not in automaton]
+
+    def _matching_patterns(self, value):
+        """Return the Contains / Does Not Contain values found in value."""
+        matched = [val for val in self._scan if val in value]
+        if self._contains_field is not None:
+            patterns = self._contains_field.patterns
+            mask = self._contains_field.mask(value)
+            while mask:
+                low = mask & -mask
+                matched.append(patterns[low.bit_length() - 1])
+                mask ^= low
+        return matched
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            fails = (self._equal_rules & ~self._equal.get(value, 0)) | self._not_equal.get(value, 0)
+            fails |= self._null if value else self._not_null
+            matched = self._matching_patterns(value) if value is not None else ()
+            passes = 0
+            for val in matched:
+                passes |= self._contains.get(val, 0)
+                fails |= self._not_contains.get(val, 0)
+            fails |= self._contains_rules & ~passes
+            if self._contains_multi:
+                matched = set(matched)
+                for bit, vals in self._contains_multi:
+                    if not vals <= matched:
+                        fails |= bit
+            code = self.codes[value] = len(self.masks)
+            self.values.append(value)
+            self.masks.append(fails)
+        return code
+
+
+class _EncodedRules:
+    """
+    One asset type's rules over dictionary-encoded columns.
+
+    Rule i (in schema order) is bit i. An asset's failed rules are the OR of
+    its column values' masks, and the first matching rule is the lowest bit
+    left clear. A categorize block's rule also needs its tag_field tag (an
+    'is not null' clause), so a block without a tag value falls through.
+    """
+
+    def __init__(self, asset_type, rules, contains_fields, other_id, new_group):
+        self.other_id = other_id
+        self._new_group = new_group
+        self._all_rules = (1 << len(rules)) - 1
+        self._rules = []  # (group id, GroupBlock or None) per rule bit
+
+        columns = {}  # (is_tag, field) -> _Column
+        for position, (clauses, group_id, block) in enumerate(rules):
+            bit = 1 << position
+            clauses = [(clause.is_tag, clause.field, clause.op.lower(), clause.val) for clause in clauses]
+            if block is not None:
+                clauses.append((True, block.tag_field, 'is not null', ''))
+            for is_tag, field, op, val in clauses:
+                if op not in CLAUSE_TESTS:
+                    raise ValueError(f"Unsupported operator '{op}' on {field}")
+                column = columns.get((is_tag, field))
+                if column is None:
+                    column = columns[(is_tag, field)] = _Column(
+                        is_tag, field, contains_fields.get((asset_type, is_tag, field)))
+                column.add_clause(bit, op, val)
+            self._rules.append((group_id, block))
+
+        self.columns = list(columns.values())
+        for column in self.columns:
+            column.finish()
+        self._columns = [(column.is_tag, column.field, column.codes, column.masks, column.encode)
+                         for column in self.columns]
+
+    def classify(self, fields, tags):
+        fails = 0
+        for is_tag, field, codes, masks, encode in self._columns:
+            value = (tags if is_tag else fields).get(field)
+            code = codes.get(value)
+            if code is None:
+                code = encode(value)
+            fails |= masks[code]
+
+        matches = self._all_rules & ~fails
+        if not matches:
+            return self.other_id
+        group_id, block = self._rules[(matches & -matches).bit_length() - 1]
+        if block is None:
+            return group_id
+        value = tags[block.tag_field]
+        group = block.index.get(value)
+        return self._new_group(block.ref_id, value) if group is None else group
+
+
+class _NumpyRules(_EncodedRules):
+    """
+    _EncodedRules evaluated with NumPy over batches of assets.
+
+    Each column's failed-rule masks are kept as rows of a packed bit matrix
+    (one uint8 per 8 rules). A batch encodes every column into an array of
+    codes, gathers and ORs their rows, and takes each asset's first
+    matching rule as the lowest clear bit: argmax over the non-zero bytes of
+    the inverted matrix, then a lowest-bit table lookup. Assets whose rule
+    is a categorize block are resolved through a group per tag value code.
+    """
+
+    # Index of the lowest set bit of each byte value
+    LOWEST_BIT = None
+
+    def __init__(self, asset_type, rules, contains_fields, other_id, new_group):
+        super().__init__(asset_type, rules, contains_fields, other_id, new_group)
+        if _NumpyRules.LOWEST_BIT is None:
+            _NumpyRules.LOWEST_BIT = np.array([(byte & -byte).bit_length() - 1 for byte in range(256)], np.intp)
+
+        self._width = (len(self._rules) + 7) // 8
+        self._last_byte = 0xFF >> (8 * self._width - len(self._rules))
+        self._packed = [np.zeros((0, self._width), np.uint8) for _ in self.columns]
+        # Group per rule; -1 stands for None and is replaced for block rules
+        self._other = -1 if other_id is None else other_id
+        self._rule_groups = np.array([-1 if group_id is None else group_id for group_id, _ in self._rules],
+                                     np.int64)
+
+        column_index = {(column.is_tag, column.field): index for index, column in enumerate(self.columns)}
+        # (rule position, GroupBlock, tag column index) per categorize rule
+        self._blocks = [
+            (position, block, column_index[(True, block.tag_field)])
+            for position, (_, block) in enumerate(self._rules) if block is not None
+        ]
+        self._block_groups = {position: np.zeros(0, np.int64) for position, _, _ in self._blocks}
+
+    def _column_rows(self, index):
+        """Return column index's packed matrix, extended with rows for any new codes."""
+        column = self.columns[index]
+        packed = self._packed[index]
+        if len(packed) < len(column.masks):
+            rows = b''.join(mask.to_bytes(self._width, 'little') for mask in column.masks[len(packed):])
+            packed = self._packed[index] = np.concatenate(
+                [packed, np.frombuffer(rows, np.uint8).reshape(-1, self._width)])
+        return packed
+
+    def _block_group_codes(self, position, block, column, codes):
+        """Return the group of each tag value code in codes for a categorize rule."""
+        table = self._block_groups[position]
+        if len(table) < len(column.values):
+            table = self._block_groups[position] = np.concatenate(
+                [table, np.full(len(column.values) - len(table), -2, np.int64)])
+        pending = codes[table[codes] == -2]
+        if pending.size:
+            # New dynamic groups are numbered in order of first appearance
+            unique, first = np.unique(pending, return_index=True)
+            for code in unique[np.argsort(first)].tolist():
+                value = column.values[code]
+                group = block.index.get(value)
+                table[code] = self._new_group(block.ref_id, value) if group is None else group
+        return table[codes]
+
+    def classify_batch(self, fields_list, tags_list):
+        """Return an int64 array of group ids (-1 for None) for parallel lists of fields and tags."""
+        count = len(fields_list)
+        fails = np.zeros((count, self._width), np.uint8)
+        codes_by_column = []
+        for index, column in enumerate(self.columns):
+            # Look up known values without a Python-level loop, then encode the new ones
+            values = list(map(methodcaller('get', column.field), tags_list if column.is_tag else fields_list))
+            codes = np.fromiter(map(column.codes.get, values, itertools.repeat(-1)), np.intp, count)
+            for position in np.flatnonzero(codes < 0).tolist():
+                codes[position] = column.encode(values[position])
+            np.bitwise_or(fails, self._column_rows(index)[codes], out=fails)
+            codes_by_column.append(codes)
+
+        matches = np.invert(fails, out=fails)
+        matches[:, -1] &= self._last_byte
+        nonzero = matches != 0
+        first_byte = nonzero.argmax(axis=1)
+        rows = np.arange(count)
+        matched = nonzero[rows, first_byte]
+        rule = first_byte * 8 + self.LOWEST_BIT[matches[rows, first_byte]]
+        groups = np.where(matched, self._rule_groups[rule], self._other)
+
+        for position, block, index in self._blocks:
+            selected = np.flatnonzero(matched & (rule == position))
+            if selected.size:
+                groups[selected] = self._block_group_codes(
+                    position, block, self.columns[index], codes_by_column[index][selected])
+        return groups
+
+
+def _signature_classifier(classify, attributes, max_signatures):
+    """
+    Wrap classify(fields, tags) for an asset type so that assets with the
+    same values for attributes, the (is_tag, name) pairs its rules read, are
+    classified once. Returns (project, classify_signature): project(fields,
+    tags) returns an asset's signature tuple, and classify_signature(signature)
+    its group id from an LRU table of at most max_signatures entries.
+    """
+    getters = ''.join(f"{'tags' if is_tag else 'fields'}.get({name!r}), " for is_tag, name in attributes)
+    project = eval(f"lambda fields, tags: ({getters})")
+
+    @functools.lru_cache(maxsize=max_signatures)
+    def classify_signature(signature):
+        # A missing attribute and a None value classify the same way
+        fields = {}
+        tags = {}
+        for (is_tag, name), value in zip(attributes, signature):
+            if value is not None:
+                (tags if is_tag else fields)[name] = value
+        return classify(fields, tags)
+
+    return project, classify_signature
+
+
+class _SharedRules(_EncodedRules):
+    """
+    The rules of one asset type in several perspectives, over shared
+    dictionary-encoded columns.
+
+    Each perspective's rules take a consecutive range of rule bits, so a
+    clause found in several perspectives is indexed once in its column, and
+    each distinct value is evaluated once for all of them. classify()
+    returns a tuple of group ids, one per perspective.
+    """
+
+    def __init__(self, asset_type, rule_lists, contains_fields, groups):
+        super().__init__(asset_type, [rule for rules in rule_lists for rule in rules], contains_fields, None, None)
+        self._ranges = []  # (rule bits, other_id, new_group) per perspective
+        position = 0
+        for rules, names in zip(rule_lists, groups):
+            self._ranges.append((((1 << len(rules)) - 1) << position, names.other_id, names._new_group))
+            position += len(rules)
+
+    def classify(self, fields, tags):
+        fails = 0
+        for is_tag, field, codes, masks, encode in self._columns:
+            value = (tags if is_tag else fields).get(field)
+            code = codes.get(value)
+            if code is None:
+                code = encode(value)
+            fails |= masks[code]
+
+        matches = self._all_rules & ~fails
+        group_ids = []
+        for rules, other_id, new_group in self._ranges:
+            perspective_matches = matches & rules
+            if not perspective_matches:
+                group_ids.append(other_id)
+                continue
+            group_id, block = self._rules[(perspective_matches & -perspective_matches).bit_length() - 1]
+            if block is not None:
+                value = tags[block.tag_field]
+                group_id = block.index.get(value)
+                if group_id is None:
+                    group_id = new_group(block.ref_id, value)
+            group_ids.append(group_id)
+        return tuple(group_ids)
+
+
+def _add_type_stats(type_stats, asset_type, assets, seconds):
+    """Add assets and seconds to the [assets, seconds] entry of asset_type in type_stats."""
+    stats = type_stats.get(asset_type)
+    if stats is None:
+        stats = type_stats[asset_type] = [0, 0.0]
+    stats[0] += assets
+    stats[1] += seconds
+
+
+def _classify_by_type(classifiers, other, assets, type_stats):
+    """
+    Return the group ids of a list of Assets, routing them to their asset
+    type's classify(fields, tags) in classifiers (other for types without
+    rules) one type at a time, and adding each type's assets and seconds
+    to type_stats.
+    """
+    positions_by_type = {}  # asset type -> asset positions
+    for position, asset_type in enumerate(map(attrgetter('type'), assets)):
+        positions = positions_by_type.get(asset_type)
+        if positions is None:
+            positions = positions_by_type[asset_type] = []
+        positions.append(position)
+
+    group_ids = [other] * len(assets)
+    perf_counter = time.perf_counter
+    for asset_type, positions in positions_by_type.items():
+        start = perf_counter()
+        classify = classifiers.get(asset_type)
+        if classify is not None:
+            for position in positions:
+                asset = assets[position]
+                group_ids[position] = classify(asset.fields, asset.tags)
+        _add_type_stats(type_stats, asset_type, len(positions), perf_counter() - start)
+    return group_ids
+
+
+def _rules_by_type(perspective):
+    """
+    Return each asset type's rules in schema order: (clauses, final group
+    id or None, GroupBlock or None) per rule.
+    """
+    rules_by_type = {}
+    for rule in perspective.rules:
+        if type(rule) is GroupBlock:
+            rules_by_type.setdefault(rule.asset, []).append((rule.clauses, None, rule))
+        else:
+            rules_by_type.setdefault(rule.rule.asset, []).append(
+                (rule.rule.clauses, perspective.final_group(rule.to), None))
+    return rules_by_type
+
+
+class _GroupNames:
+    """The group names of a Perspective, and the new dynamic groups seen while classifying."""
+
+    def __init__(self, perspective):
+        self.perspective = perspective
+        self._names = {}  # group id -> name
+        self._new_groups = {}  # (block ref_id, tag value) -> new group id
+        self._new_names = []  # tag value per new group id
+
+        for group in perspective.dynamic_groups.values():
+            self._names[group.ref_id] = group.name
+        self.other_id = None
+        for group in perspective.static_groups:
+            self._names[group.ref_id] = group.name
+            if group.is_other and self.other_id is None:
+                self.other_id = group.ref_id
+
+    def _new_group(self, block_ref, value):
+        key = (block_ref, value)
+        group_id = self._new_groups.get(key)
+        if group_id is None:
+            group_id = len(self.perspective.ref_ids) + len(self._new_names)
+            self._new_groups[key] = group_id
+            self._new_names.append(value)
+        return group_id
+
+    def group_label(self, group_id):
+        """Return (schema ref id string, group name) for a group id; ('', '') for None."""
+        if group_id is None:
+            return '', ''
+        ref_ids = self.perspective.ref_ids
+        if group_id >= len(ref_ids):
+            return '', self._new_names[group_id - len(ref_ids)]
+        return ref_ids[group_id], self._names.get(group_id, '')
+
+
+class PerspectiveClassifier(_GroupNames):
+    """
+    Assigns assets to the groups of a compiled Perspective.
+
+    classify() returns a group id: the perspective's integer ref id of the
+    final group (after following merges), the is_other group's id if no rule
+    matches, or None if there is no is_other group. A categorize rule may see
+    a tag value without a dynamic group yet (CloudHealth creates one on its
+    next recompute); such values get new ids above the perspective's ref ids.
+
+    Contains / Does Not Contain clauses are answered by one automaton per
+    (asset type, field) over all of its Contains values; contains_matcher
+    picks the implementation (see build_contains_matcher()).
+
+    With the 'compiled' evaluator each asset type's rules are compiled into
+    one generated Python function (see _generate_classifier()), with its
+    bytecode kept in code_cache (a CompiledPerspectiveCache) if given. The
+    'encoded' evaluator evaluates clauses once per distinct field value (see
+    _EncodedRules), so its cost follows the number of distinct values rather
+    than assets. The 'numpy' evaluator does the same with array operations
+    over batches of assets (see classify_batch() and _NumpyRules). The
+    'interpreted' evaluator walks per-clause test tuples.
+
+    With max_signatures, assets are projected onto the fields and tags their
+    type's rules read, and each distinct projection (signature) is
+    classified once by the evaluator; the last max_signatures signatures of
+    each asset type are kept in an LRU table.
+    """
+
+    def __init__(self, perspective, contains_matcher='auto', evaluator='compiled', code_cache=None,
+                 max_signatures=None):
+        super().__init__(perspective)
+        rules_by_type = _rules_by_type(perspective)
+        contains_fields = _contains_fields(rules_by_type, contains_matcher)
+        self.rule_counts = {asset_type: len(rules) for asset_type, rules in rules_by_type.items()}
+
+        self.evaluator = evaluator
+        self.sources = {}  # asset type -> generated source, for debugging
+        self._encoded = {}  # asset type -> _EncodedRules
+        self._classifiers = {}  # asset type -> classify(fields, tags)
+        self._signature_tables = []  # lru_cache'd classify_signature() per asset type
+        # asset type -> (clause tests, group id or block ref_id, block
+        # tag_field or None, block tag index or None) per rule
+        self._rules_by_type = {}
+        for asset_type, rules in rules_by_type.items():
+            if evaluator == 'compiled':
+                self._classifiers[asset_type], self.sources[asset_type] = _generate_classifier(
+                    asset_type, rules, contains_fields, self.other_id, self._new_group, code_cache)
+            elif evaluator in ('encoded', 'numpy'):
+                if evaluator == 'numpy' and np is None:
+                    raise ValueError("Evaluator 'numpy' needs NumPy (pip install numpy)")
+                encoded = self._encoded[asset_type] = (_NumpyRules if evaluator == 'numpy' else _EncodedRules)(
+                    asset_type, rules, contains_fields, self.other_id, self._new_group)
+                self._classifiers[asset_type] = encoded.classify
+            elif evaluator == 'interpreted':
+                self._rules_by_type[asset_type] = [
+                    (_compile_tests(clauses, asset_type, contains_fields),
+                     block.ref_id if block else group_id,
+                     block.tag_field if block else None,
+                     block.index if block else None)
+                    for clauses, group_id, block in rules
+                ]
+                self._classifiers[asset_type] = functools.partial(self.interpret, asset_type)
+            else:
+                raise ValueError(f"Unknown evaluator '{evaluator}'")
+
+            if max_signatures:
+                attributes = {}
+                for clauses, _, block in rules:
+                    for clause in clauses:
+                        attributes.setdefault((clause.is_tag, clause.field), None)
+                    if block is not None:
+                        attributes.setdefault((True, block.tag_field), None)
+                project, classify_signature = _signature_classifier(
+                    self._classifiers[asset_type], list(attributes), max_signatures)
+                self._signature_tables.append(classify_signature)
+                self._classifiers[asset_type] = (
+                    lambda fields, tags, project=project, classify_signature=classify_signature:
+                    classify_signature(project(fields, tags))
+                )
+
+    def classify(self, asset_type, fields, tags):
+        """Return the group id for an asset (see the class docstring)."""
+        classify = self._classifiers.get(asset_type)
+        return self.other_id if classify is None else classify(fields, tags)
+
+    def classify_batch(self, assets, type_stats=None):
+        """
+        Return the group ids of a list of Assets (see classify()). The
+        'numpy' evaluator classifies the assets of each type with array
+        operations; the others classify one asset at a time, or one asset
+        type at a time with type_stats, a dict that each type's assets and
+        classification seconds are added to as [assets, seconds].
+        """
+        if self.evaluator != 'numpy':
+            if type_stats is not None:
+                return _classify_by_type(self._classifiers, self.other_id, assets, type_stats)
+            classify = self.classify
+            return [classify(asset.type, asset.fields, asset.tags) for asset in assets]
+
+        # Number each asset type by the position of its first asset
+        types = {}
+        type_codes = np.fromiter(map(types.setdefault, map(attrgetter('type'), assets), itertools.count()),
+                                 np.intp, len(assets))
+        groups = np.full(len(assets), -1 if self.other_id is None else self.other_id, np.int64)
+        for asset_type, type_code in types.items():
+            start = time.perf_counter()
+            positions = np.flatnonzero(type_codes == type_code)
+            rules = self._encoded.get(asset_type)
+            if rules is not None:
+                selected = [assets[position] for position in positions.tolist()]
+                groups[positions] = rules.classify_batch(list(map(attrgetter('fields'), selected)),
+                                                         list(map(attrgetter('tags'), selected)))
+            if type_stats is not None:
+                _add_type_stats(type_stats, asset_type, positions.size, time.perf_counter() - start)
+
+        groups = groups.tolist()
+        if self.other_id is None:
+            groups = [None if group_id < 0 else group_id for group_id in groups]
+        return groups
+
+    def interpret(self, asset_type, fields, tags):
+        """classify() for the 'interpreted' evaluator."""
+        for tests, group_id, tag_field, index in self._rules_by_type.get(asset_type, ()):
+            for is_tag, field, test, val in tests:
+                if not test((tags if is_tag else fields).get(field), val):
+                    break
+            else:
+                if tag_field is None:
+                    return group_id
+                value = tags.get(tag_field)
+                if not value:
+                    continue
+                block_group = index.get(value)
+                if block_group is None:
+                    block_group = self._new_group(group_id, value)
+                return block_group
+        return self.other_id
+
+    def encoding_stats(self):
+        """Return the column and distinct value counts of the 'encoded' and 'numpy' evaluators."""
+        columns = [column for encoded in self._encoded.values() for column in encoded.columns]
+        return {
+            'columns': len(columns),
+            'values': sum(len(column.masks) for column in columns),
+        }
+
+    def signature_stats(self):
+        """Return the signature table size and hit/miss counts with max_signatures."""
+        infos = [table.cache_info() for table in self._signature_tables]
+        return {
+            'signatures': sum(info.currsize for info in infos),
+            'hits': sum(info.hits for info in infos),
+            'misses': sum(info.misses for info in infos),
+        }
+
+
+class MultiPerspectiveClassifier:
+    """
+    Assigns assets to the groups of several compiled Perspectives at once.
+
+    classify() returns a tuple with the asset's group id in each
+    perspective (as PerspectiveClassifier.classify() would). The rules of
+    all perspectives are evaluated together with the 'encoded' evaluator
+    (see _SharedRules): every field and tag column is encoded once per asset
+    for all perspectives, and a clause that several perspectives share,
+    such as the same "Subscription Name = X", is evaluated once per distinct
+    value. groups holds each perspective's _GroupNames, for group_label().
+    """
+
+    evaluator = 'encoded'
+
+    def __init__(self, perspectives, contains_matcher='auto'):
+        self.perspectives = list(perspectives)
+        self.groups = [_GroupNames(perspective) for perspective in self.perspectives]
+        rule_lists_by_type = {}  # asset type -> rules per perspective
+        for index, perspective in enumerate(self.perspectives):
+            for asset_type, rules in _rules_by_type(perspective).items():
+                rule_lists_by_type.setdefault(asset_type, [[] for _ in self.perspectives])[index] = rules
+        contains_fields = _contains_fields(
+            {asset_type: [rule for rules in rule_lists for rule in rules]
+             for asset_type, rule_lists in rule_lists_by_type.items()},
+            contains_matcher)
+
+        self._clauses = 0
+        distinct = set()
+        for asset_type, rule_lists in rule_lists_by_type.items():
+            for rules in rule_lists:
+                for clauses, _, _ in rules:
+                    self._clauses += len(clauses)
+                    distinct.update((asset_type,) + clause for clause in clauses)
+        self._distinct_clauses = len(distinct)
+
+        self.rule_counts = {asset_type: sum(map(len, rule_lists))
+                            for asset_type, rule_lists in rule_lists_by_type.items()}
+        self._encoded = {}  # asset type -> _SharedRules
+        self._classifiers = {}  # asset type -> classify(fields, tags)
+        for asset_type, rule_lists in rule_lists_by_type.items():
+            encoded = self._encoded[asset_type] = _SharedRules(asset_type, rule_lists, contains_fields, self.groups)
+            self._classifiers[asset_type] = encoded.classify
+        self._other_ids = tuple(names.other_id for names in self.groups)
+
+    def classify(self, asset_type, fields, tags):
+        """Return the group id of an asset in each perspective."""
+        classify = self._classifiers.get(asset_type)
+        return self._other_ids if classify is None else classify(fields, tags)
+
+    def classify_batch(self, assets, type_stats=None):
+        """Return the group ids of a list of Assets (see PerspectiveClassifier.classify_batch())."""
+        if type_stats is not None:
+            return _classify_by_type(self._classifiers, self._other_ids, assets, type_stats)
+        classify = self.classify
+        return [classify(asset.type, asset.fields, asset.tags) for asset in assets]
+
+    def encoding_stats(self):
+        """Return the column and distinct value counts, and the clause counts before and after sharing."""
+        columns = [column for encoded in self._encoded.values() for column in encoded.columns]
+        return {
+            'columns': len(columns),
+            'values': sum(len(column.masks) for column in columns),
+            'clauses': self._clauses,
+            'distinct_clauses': self._distinct_clauses,
+        }
+
+
+def classify_assets(classifier, assets, batch_size=None, type_stats=None):
+    """
+    Yield (asset, group id) for each asset. With the 'numpy' evaluator, or
+    with type_stats (see PerspectiveClassifier.classify_batch()), assets are
+    classified batch_size at a time (default NUMPY_BATCH_ASSETS or
+    TYPE_BATCH_ASSETS).
+    """
+    if classifier.evaluator == 'numpy' or type_stats is not None:
+        if batch_size is None:
+            batch_size = NUMPY_BATCH_ASSETS if classifier.evaluator == 'numpy' else TYPE_BATCH_ASSETS
+        assets = iter(assets)
+        while True:
+            batch = list(itertools.islice(assets, batch_size))
+            if not batch:
+                return
+            yield from zip(batch, classifier.classify_batch(batch, type_stats))
+
+    classify = classifier.classify
+    for asset in assets:
+        yield asset, classify(asset.type, asset.fields, asset.tags)
+
+
+def write_assignments(results, stream, classifier, output_format='csv', header=True):
+    """
+    Write (asset, group id) pairs to a text stream. Returns {group id: asset count}.
+
+    Each row has the asset id and type, and the schema ref id and name of
+    its group (empty if unassigned). header=False leaves out the CSV header.
+    """
+    if output_format == 'csv':
+        encode = _csv_value
+        if header:
+            stream.write(CSV_HEADER)
+        row_format = '{},{}{}'
+        label_format = ',{},{}\n'
+    elif output_format == 'jsonl':
+        encode = json.dumps
+        row_format = '{{"id": {}, "type": {}{}'
+        label_format = ', "group_id": {}, "group": {}}}\n'
+    else:
+        raise ValueError(f"Unknown output format '{output_format}'")
+
+    # Group columns and asset types repeat, so each is encoded only once
+    counts = Counter()
+    labels = {}  # group id -> encoded group columns
+    types = {}  # asset type -> encoded type
+    write = stream.write
+    for asset, group_id in results:
+        label = labels.get(group_id)
+        if label is None:
+            ref_id, name = classifier.group_label(group_id)
+            label = labels[group_id] = label_format.format(encode(ref_id), encode(name))
+        asset_type = types.get(asset.type)
+        if asset_type is None:
+            asset_type = types[asset.type] = encode(asset.type)
+        write(row_format.format(encode(asset.id), asset_type, label))
+        counts[group_id] += 1
+    return counts
+
+
+def write_multi_assignments(results, stream, classifier, names, output_format='csv'):
+    """
+    Write (asset, group ids) pairs of a MultiPerspectiveClassifier to a text
+    stream. Returns {group id: asset count} per perspective.
+
+    Each row has the asset id and type, then the group ref id and name in
+    each perspective: CSV columns '<name>:group_id' and '<name>:group', or a
+    JSONL "groups" object keyed by name, where names are the perspective
+    column names.
+    """
+    if output_format == 'csv':
+        encode = _csv_value
+        stream.write(','.join(['id', 'type'] + [encode(f"{name}:{column}") for name in names
+                                                for column in ('group_id', 'group')]) + '\n')
+        row_format = '{},{}{}\n'
+        label_formats = [',{},{}'] * len(names)
+    elif output_format == 'jsonl':
+        encode = json.dumps
+        row_format = '{{"id": {}, "type": {}, "groups": {{{}}}}}\n'
+        label_formats = [
+            ('' if index == 0 else ', ') + encode(name).replace('{', '{{').replace('}', '}}')
+            + ': {{"group_id": {}, "group": {}}}'
+            for index, name in enumerate(names)
+        ]
+    else:
+        raise ValueError(f"Unknown output format '{output_format}'")
+
+    # As in write_assignments(), each perspective's group columns are encoded once per group
+    counts = [Counter() for _ in names]
+    labels = [{} for _ in names]  # per perspective: group id -> encoded group columns
+    columns = list(zip(classifier.groups, label_formats, labels, counts))
+    types = {}  # asset type -> encoded type
+    write = stream.write
+    for asset, group_ids in results:
+        row = []
+        for group_id, (groups, label_format, perspective_labels, perspective_counts) in zip(group_ids, columns):
+            label = perspective_labels.get(group_id)
+            if label is None:
+                ref_id, name = groups.group_label(group_id)
+                label = perspective_labels[group_id] = label_format.format(encode(ref_id), encode(name))
+            row.append(label)
+            perspective_counts[group_id] += 1
+        asset_type = types.get(asset.type)
+        if asset_type is None:
+            asset_type = types[asset.type] = encode(asset.type)
+        write(row_format.format(encode(asset.id), asset_type, ''.join(row)))
+    return counts
+
+
+def perspective_column_names(perspectives):
+    """Return an output column name per perspective: its name, numbered if several share it."""
+    seen = Counter(perspective.name for perspective in perspectives)
+    numbers = Counter()
+    names = []
+    for perspective in perspectives:
+        name = perspective.name
+        if seen[name] > 1:
+            numbers[name] += 1
+            name = f"{name} ({numbers[name]})"
+        names.append(name)
+    return names
+
+
+def _csv_value(value):
+    """Encode one CSV cell, quoting only when needed (as csv.QUOTE_MINIMAL does)."""
+    if value is None:
+        return ''
+    value = str(value)
+    if '"' in value or ',' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+class _LineRange:
+    """readline() over the lines of a binary file that start in [start, end), after an optional header line."""
+
+    def __init__(self, f, start, end, header=b''):
+        f.seek(start)
+        self._readline = f.readline
+        self._position = start
+        self._end = end
+        self._header = header
+
+    def readline(self):
+        if self._header:
+            line, self._header = self._header, b''
+            return line
+        if self._position >= self._end:
+            return b''
+        line = self._readline()
+        self._position += len(line)
+        return line
+
+
+def plan_shards(path, shards, inventory_format='jsonl'):
+    """
+    Split an uncompressed inventory file into up to shards line-aligned
+    byte ranges. Returns (header line, [(start, end, max assets)]); the
+    header is the CSV header row, or b'' for JSONL.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline() if inventory_format == 'csv' else b''
+        begin = len(header)
+        size = os.fstat(f.fileno()).st_size
+
+        bounds = [begin]
+        for shard in range(1, shards):
+            # Move each cut to the start of the next line
+            offset = begin + (size - begin) * shard // shards
+            if offset <= bounds[-1]:
+                continue
+            f.seek(offset - 1)
+            f.readline()
+            if bounds[-1] < f.tell() < size:
+                bounds.append(f.tell())
+        bounds.append(size)
+
+        ranges = []
+        for start, end in zip(bounds, bounds[1:]):
+            # Lines (an upper bound on assets) = newlines, plus an unterminated last line
+            f.seek(start)
+            lines = 1
+            remaining = end - start
+            while remaining > 0:
+                chunk = f.read(min(remaining, parse_perspective.STREAM_CHUNK_SIZE))
+                if not chunk:
+                    break
+                lines += chunk.count(b'\n')
+                remaining -= len(chunk)
+            ranges.append((start, end, lines))
+    return header, ranges
+
+
+def is_shardable(path):
+    """Return whether an inventory file can be split by byte range (a regular, uncompressed file)."""
+    if not os.path.isfile(path):
+        return False
+    with open(path, 'rb') as f:
+        magic = f.read(6)
+    return not any(magic.startswith(prefix) for prefix, _ in COMPRESSED_FORMATS)
+
+
+def csv_has_multiline_rows(path):
+    """
+    Return whether a CSV file has a quoted value spanning a line break,
+    seen as a line with an odd number of '"'. Such files cannot be split
+    on line boundaries.
+    """
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(parse_perspective.STREAM_CHUNK_SIZE)
+            if not chunk:
+                return False
+            # Whole lines only, so each line's quotes are counted together
+            if not chunk.endswith(b'\n'):
+                chunk += f.readline()
+            if b'"' in chunk and any(line.count(b'"') & 1 for line in chunk.split(b'\n')):
+                return True
+
+
+# (PerspectiveClassifier, SharedMemory of group ids) of a shard worker
+_shard_state = None
+
+
+def _init_shard_worker(classifier_args, shm_name, json_backend):
+    """
+    Set up a shard worker. Forked workers inherit _shard_state from the
+    parent and get classifier_args None; spawned ones build the classifier
+    from the pickled perspective once and attach to the shared memory.
+    """
+    global _shard_state
+    if classifier_args is None:
+        return
+    parse_perspective.set_json_backend(json_backend)
+    _shard_state = (PerspectiveClassifier(*classifier_args), shared_memory.SharedMemory(name=shm_name))
+
+
+def _classify_shard(path, inventory_format, header, start, end, row, output_path, output_format, type_stats):
+    """
+    Classify the assets of one byte range into the group id array from row
+    on, and write their rows to output_path. Returns (assets, this
+    worker's new group keys, per asset type stats or None): new groups are
+    stored as -2 - their index in the key list, and the parent numbers
+    them. type_stats is True to collect per asset type stats.
+    """
+    classifier, shm = _shard_state
+    type_stats = {} if type_stats else None
+    group_ids = shm.buf.cast('i')
+    new_base = len(classifier.perspective.ref_ids)
+
+    def store(results):
+        for position, (asset, group_id) in enumerate(results, row):
+            if group_id is None:
+                group_ids[position] = -1
+            elif group_id >= new_base:
+                group_ids[position] = new_base - 2 - group_id
+            else:
+                group_ids[position] = group_id
+            yield asset, group_id
+
+    try:
+        with open(path, 'rb') as f:
+            assets = iter_inventory(_LineRange(f, start, end, header), inventory_format)
+            with open(output_path, 'w', buffering=OUTPUT_BUFFER_SIZE) as out:
+                results = classify_assets(classifier, assets, type_stats=type_stats)
+                counts = write_assignments(store(results), out, classifier, output_format, header=False)
+    except ValueError as e:
+        raise ValueError(f"{e} (in the shard starting at byte {start})")
+    finally:
+        group_ids.release()
+    return sum(counts.values()), list(classifier._new_groups), type_stats
+
+
+def classify_parallel(classifier, path, output, jobs, inventory_format='jsonl', output_format='csv',
+                      classifier_args=None, type_stats=None, start_method=None):
+    """
+    Classify an uncompressed inventory file with jobs worker processes and
+    write the assignments to output (a path, or None for stdout), in file
+    order. Returns {group id: asset count}.
+
+    The file is split into jobs line-aligned byte ranges. Workers are
+    forked from this process, so they share the built classifier; where
+    fork is unavailable (or with another start_method) they are spawned
+    and rebuild it from classifier_args, the PerspectiveClassifier
+    arguments. Each writes its assets' group ids into one shared int32
+    array and its output rows to a temporary file, so no per-asset results
+    are pickled. Dynamic groups first seen in a worker are numbered
+    afterwards, shard by shard, giving the same numbering as a single
+    process. The workers' per asset type stats are added to type_stats, if
+    given (see classify_assets()).
+    """
+    with profile_stage('plan'):
+        header, shards = plan_shards(path, jobs, inventory_format)
+    rows = [0]
+    for _, _, lines in shards:
+        rows.append(rows[-1] + lines)
+
+    global _shard_state
+    if start_method is None and 'fork' in multiprocessing.get_all_start_methods():
+        start_method = 'fork'
+    forking = start_method == 'fork'
+    context = multiprocessing.get_context(start_method)
+    shm = shared_memory.SharedMemory(create=True, size=max(4, rows[-1] * 4))
+    try:
+        with tempfile.TemporaryDirectory(prefix='classify-') as tmp_dir:
+            outputs = [os.path.join(tmp_dir, f"shard-{index}.out") for index in range(len(shards))]
+            _shard_state = (classifier, shm)
+            with profile_stage('classify'), ProcessPoolExecutor(
+                    max_workers=len(shards), mp_context=context, initializer=_init_shard_worker,
+                    initargs=(None if forking else classifier_args, shm.name,
+                              parse_perspective.json_backend_name())) as executor:
+                futures = [
+                    executor.submit(_classify_shard, path, inventory_format, header, start, end, row,
+                                    output_path, output_format, type_stats is not None)
+                    for (start, end, _), row, output_path in zip(shards, rows, outputs)
+                ]
+                results = [future.result() for future in futures]
+
+            with profile_stage('write'):
+                with open_output(output, binary=True) as out:
+                    if output_format == 'csv':
+                        out.write(CSV_HEADER.encode('utf-8'))
+                    for output_path in outputs:
+                        with open(output_path, 'rb') as f:
+                            shutil.copyfileobj(f, out, OUTPUT_BUFFER_SIZE)
+
+        # Count group ids shard by shard, numbering each worker's new groups
+        counts = Counter()
+        group_ids = shm.buf.cast('i')
+        try:
+            for (assets, new_keys, shard_type_stats), row in zip(results, rows):
+                for asset_type, (type_assets, seconds) in (shard_type_stats or {}).items():
+                    _add_type_stats(type_stats, asset_type, type_assets, seconds)
+                for group_id, count in Counter(group_ids[row:row + assets]).items():
+                    if group_id == -1:
+                        group_id = None
+                    elif group_id <= -2:
+                        group_id = classifier._new_group(*new_keys[-2 - group_id])
+                    counts[group_id] += count
+        finally:
+            group_ids.release()
+    finally:
+        _shard_state = None
+        shm.close()
+        shm.unlink()
+    return counts
+
+
+def format_type_stats(type_stats, rule_counts):
+    """
+    Format per asset type counts and classification time, most time first,
+    as a text table. type_stats maps asset type to [assets, seconds], and
+    rule_counts asset type to its number of rules.
+    """
+    total_assets = sum(assets for assets, _ in type_stats.values())
+    total_seconds = sum(seconds for _, seconds in type_stats.values())
+    header = f"{'assets':>10} {'%':>6} {'seconds':>9} {'%':>6} {'us/asset':>9} {'rules':>6}  asset type"
+    lines = [header, '-' * len(header)]
+    for asset_type, (assets, seconds) in sorted(type_stats.items(), key=lambda item: -item[1][1]):
+        asset_share = assets / total_assets * 100 if total_assets else 0.0
+        time_share = seconds / total_seconds * 100 if total_seconds > 0 else 0.0
+        per_asset = seconds / assets * 1e6 if assets else 0.0
+        lines.append(f"{assets:>10} {asset_share:>5.1f}% {seconds:>9.4f} {time_share:>5.1f}% {per_asset:>9.2f} "
+                     f"{rule_counts.get(asset_type, 0):>6}  {asset_type or '(no type)'}")
+    return '\n'.join(lines)
+
+
+def format_summary(classifier, counts):
+    """Format per-group asset counts, largest first, as a text table."""
+    total = sum(counts.values())
+    lines = [f"{'assets':>10} {'%':>6}  group", '-' * 60]
+    for group_id, count in counts.most_common():
+        ref_id, name = classifier.group_label(group_id)
+        if group_id is None:
+            name = '(unassigned)'
+        elif not ref_id:
+            name = f"{name} (new dynamic group)"
+        share = count / total * 100 if total else 0.0
+        lines.append(f"{count:>10} {share:>5.1f}%  {name}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Assign the assets of an inventory to the groups of a CloudHealth perspective'
+    )
+    parser.add_argument('schema_files', nargs='+', metavar='schema_file',
+                        help='Perspective schema JSON file (may be compressed); several are classified in one pass')
+    parser.add_argument('inventory_file', help='Asset inventory, JSONL or CSV (may be compressed)')
+    parser.add_argument('-o', '--output', default=None,
+                        help='Optional output file for the assignments (default: print to screen)')
+    parser.add_argument('--inventory-format', choices=INVENTORY_FORMATS, default=None,
+                        help='Inventory format (default: csv for *.csv files, else jsonl)')
+    parser.add_argument('--output-format', choices=OUTPUT_FORMATS, default='csv',
+                        help='Assignment output format (default: csv)')
+    parser.add_argument('--summary', action='store_true',
+                        help='Print the number of assets per group on stderr')
+    parser.add_argument('--cache-dir', default=parse_perspective.DEFAULT_CACHE_DIR,
+                        help=f'Root directory for on-disk caches (default: {parse_perspective.DEFAULT_CACHE_DIR})')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not use the compiled perspective cache')
+    parser.add_argument('--json-backend', choices=('auto',) + parse_perspective.JSON_BACKENDS, default='auto',
+                        help='JSON decoder for the schema and JSONL inventories (default: auto, fastest installed)')
+    parser.add_argument('--contains-matcher', choices=('auto',) + CONTAINS_MATCHERS, default='auto',
+                        help='Matcher for Contains clauses (default: auto, pyahocorasick if installed)')
+    parser.add_argument('--evaluator', choices=EVALUATORS, default=None,
+                        help='Rule evaluator: compiled (generated Python), encoded (clauses per distinct value), '
+                             'numpy (vectorized encoded) or interpreted (default: compiled; several schema files '
+                             'always use encoded)')
+    parser.add_argument('--dedupe', action='store_true',
+                        help='Classify each distinct combination of the fields and tags the rules read only once')
+    parser.add_argument('--max-signatures', type=int, default=DEFAULT_SIGNATURE_CACHE_SIZE,
+                        help=f'Signatures kept per asset type with --dedupe (LRU; default: {DEFAULT_SIGNATURE_CACHE_SIZE})')
+    parser.add_argument('--type-stats', action='store_true',
+                        help='Classify assets one asset type at a time per batch and print the assets, '
+                             'classification time and rules of each asset type on stderr')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Worker processes, each classifying a byte range of an uncompressed inventory '
+                             '(default: 1)')
+    parser.add_argument('--profile', nargs='?', const='table', choices=['table', 'json'], default=None,
+                        help='Report per-stage timings on stderr as a table (default) or JSON')
+
+    args = parser.parse_args()
+
+    if not args.profile:
+        run(args)
+        return
+
+    with parse_perspective.profiling(trace_memory=False) as profiler:
+        try:
+            run(args)
+        finally:
+            profiler.stop()
+            if args.profile == 'json':
+                print(json.dumps(profiler.report(), indent=2), file=sys.stderr)
+            else:
+                print(profiler.format_table(), file=sys.stderr)
+
+
+def run(args):
+    """Run the command-line tool for parsed arguments."""
+    try:
+        parse_perspective.set_json_backend(args.json_backend)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    multi = len(args.schema_files) > 1
+    if multi and (args.evaluator not in (None, 'encoded') or args.dedupe or args.jobs > 1):
+        print("Error: Several schema files are classified with the encoded evaluator; --evaluator, --dedupe "
+              "and --jobs do not apply", file=sys.stderr)
+        sys.exit(1)
+    if args.evaluator is None:
+        args.evaluator = 'encoded' if multi else 'compiled'
+    if args.evaluator == 'numpy' and np is None:
+        print("Error: Evaluator 'numpy' needs NumPy (pip install numpy)", file=sys.stderr)
+        sys.exit(1)
+    if args.evaluator == 'numpy' and args.dedupe:
+        print("Error: --dedupe does not apply to the numpy evaluator", file=sys.stderr)
+        sys.exit(1)
+    if args.max_signatures < 1:
+        print("Error: --max-signatures must be at least 1", file=sys.stderr)
+        sys.exit(1)
+    if args.contains_matcher == 'ahocorasick' and ahocorasick is None:
+        print("Error: Contains matcher 'ahocorasick' is not installed (pip install pyahocorasick)", file=sys.stderr)
+        sys.exit(1)
+    if args.jobs < 1:
+        print("Error: --jobs must be at least 1", file=sys.stderr)
+        sys.exit(1)
+    if args.jobs > 1 and shared_memory is None:
+        print("Error: --jobs needs Python 3.8+ (multiprocessing.shared_memory)", file=sys.stderr)
+        sys.exit(1)
+
+    cache = None
+    if not args.no_cache:
+        cache = parse_perspective.open_cache(parse_perspective.CompiledPerspectiveCache,
+                                             os.path.join(args.cache_dir, 'compiled'))
+
+    perspectives = []
+    for schema_file in args.schema_files:
+        try:
+            perspectives.append(parse_perspective.load_perspective(schema_file, cache=cache))
+        except FileNotFoundError:
+            print(f"Error: File '{schema_file}' not found", file=sys.stderr)
+            sys.exit(1)
+        except ValueError as e:
+            print(f"Error: Invalid schema '{schema_file}': {e}", file=sys.stderr)
+            sys.exit(1)
+        except (OSError,) + DECOMPRESSION_ERRORS as e:
+            print(f"Error: Could not read '{schema_file}': {e}", file=sys.stderr)
+            sys.exit(1)
+    perspective = perspectives[0]
+
+    try:
+        with profile_stage('build'):
+            if multi:
+                classifier = MultiPerspectiveClassifier(perspectives, args.contains_matcher)
+            else:
+                classifier = PerspectiveClassifier(perspective, args.contains_matcher, args.evaluator, cache,
+                                                   args.max_signatures if args.dedupe else None)
+    except ValueError as e:
+        print(f"Error: Invalid schema '{', '.join(args.schema_files)}': {e}", file=sys.stderr)
+        sys.exit(1)
+    names = perspective_column_names(perspectives)
+
+    inventory_format = args.inventory_format or detect_inventory_format(args.inventory_file)
+    jobs = args.jobs
+    if jobs > 1 and os.path.exists(args.inventory_file) and not is_shardable(args.inventory_file):
+        print(f"Warning: '{args.inventory_file}' is compressed or not a regular file; classifying "
+              f"with one process", file=sys.stderr)
+        jobs = 1
+    if jobs > 1 and inventory_format == 'csv' and csv_has_multiline_rows(args.inventory_file):
+        print(f"Warning: '{args.inventory_file}' has quoted values spanning lines; classifying "
+              f"with one process", file=sys.stderr)
+        jobs = 1
+    type_stats = {} if args.type_stats else None
+    start = time.perf_counter()
+    try:
+        if jobs > 1:
+            classifier_args = (perspective, args.contains_matcher, args.evaluator, cache,
+                               args.max_signatures if args.dedupe else None)
+            counts = classify_parallel(classifier, args.inventory_file, args.output, jobs, inventory_format,
+                                       args.output_format, classifier_args, type_stats)
+        else:
+            with open_schema_file(args.inventory_file) as f:
+                assets = profile_iter('read', iter_inventory(f, inventory_format))
+                results = classify_assets(classifier, assets, type_stats=type_stats)
+                with profile_stage('classify'), \
+                        open_output(args.output) as out:
+                    if multi:
+                        counts = write_multi_assignments(results, out, classifier, names, args.output_format)
+                    else:
+                        counts = write_assignments(results, out, classifier, args.output_format)
+    except FileNotFoundError:
+        print(f"Error: File '{args.inventory_file}' not found", file=sys.stderr)
+        sys.exit(1)
+    except ValueError as e:
+        print(f"Error: {args.inventory_file}: {e}", file=sys.stderr)
+        sys.exit(1)
+    except BrokenPipeError:
+        # Output closed early (e.g. piped into head); silence the final flush
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
+    except (OSError,) + DECOMPRESSION_ERRORS as e:
+        print(f"Error: Could not read '{args.inventory_file}': {e}", file=sys.stderr)
+        sys.exit(1)
+    elapsed = time.perf_counter() - start
+    # With --jobs the statistics stay in the workers
+    if args.evaluator in ('encoded', 'numpy') and jobs == 1:
+        profile_note('classify', **classifier.encoding_stats())
+    if args.dedupe and jobs == 1:
+        profile_note('classify', **classifier.signature_stats())
+    if jobs > 1:
+        profile_note('classify', jobs=jobs)
+
+    if multi:
+        total = sum(counts[0].values())
+        rate = total / elapsed if elapsed > 0 else 0.0
+        print(f"Classified {total} assets against {len(perspectives)} perspectives in {elapsed:.2f}s "
+              f"({rate:,.0f} assets/sec)", file=sys.stderr)
+    else:
+        total = sum(counts.values())
+        rate = total / elapsed if elapsed > 0 else 0.0
+        print(f"Classified {total} assets into {len(counts)} groups in {elapsed:.2f}s "
+              f"({rate:,.0f} assets/sec)", file=sys.stderr)
+    if args.output:
+        print(f"Output written to {args.output}")
+    if args.summary and multi:
+        for name, groups, perspective_counts in zip(names, classifier.groups, counts):
+            print(f"\n{name}\n{format_summary(groups, perspective_counts)}", file=sys.stderr)
+    elif args.summary:
+        print(format_summary(classifier, counts), file=sys.stderr)
+    if type_stats is not None:
+        print(format_type_stats(type_stats, classifier.rule_counts), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
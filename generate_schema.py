@@ -0,0 +1,425 @@
+#!/usr/bin/env python3
+"""
+Synthetic CloudHealth Perspective Schema Generator
+Generates valid perspective schemas of arbitrary size, in the same shape as
+the exported schemas in examples/, for scale testing and benchmarks.
+
+Output is fully determined by the size knobs and --seed, so benchmark
+inputs stay comparable between releases.
+
+With --inventory N it instead writes N synthetic assets (JSONL or CSV)
+for a generated or existing schema, for classify_assets.py.
+
+Requirements:
+    - Python 3.6+ (standard library only)
+"""
+
+import argparse
+import csv
+import json
+import random
+import sys
+
+
+# Asset types with the non-tag fields their filter rules may reference
+ASSET_FIELDS = {
+    'AzureSubscription': ['Subscription Name'],
+    'AzureResourceGroup': ['Resource Group Name'],
+    'AzureTaggableAsset': [],
+    'AwsAccount': ['Amazon Name', 'Account Name'],
+}
+
+TAG_KEYS = ['Business Unit', 'Environment', 'Owner', 'Cost Center', 'Application', 'Project']
+
+# Operators with relative weights, roughly matching real exports
+OPERATORS = [
+    ('=', 40),
+    ('Contains', 30),
+    ('!=', 10),
+    ('Does Not Contain', 10),
+    ('Is Null', 5),
+    ('Is Not Null', 5),
+]
+
+SYLLABLES = [
+    'ar', 'be', 'ca', 'do', 'el', 'fi', 'ga', 'ho', 'in', 'ju', 'ka', 'lo', 'mi', 'no',
+    'or', 'pa', 'qu', 're', 'si', 'ta', 'un', 've', 'wa', 'xi', 'yo', 'za',
+]
+
+# First ref id handed out; real exports use 11-14 digit numeric strings
+REF_ID_BASE = 70000000000
+
+
+class _RefIds:
+    """Hands out sequential numeric ref id strings."""
+
+    def __init__(self, start=REF_ID_BASE):
+        self.next_id = start
+
+    def __call__(self):
+        ref_id = str(self.next_id)
+        self.next_id += 1
+        return ref_id
+
+
+def _word(rng, syllables=3):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(syllables)).capitalize()
+
+
+def _name(rng, index):
+    """Readable, unique value such as 'Karosi-Dopa 17'."""
+    return f"{_word(rng)}-{_word(rng, 2)} {index}"
+
+
+def _clause(rng, asset_type, values):
+    """Generate one condition clause for a filter rule on asset_type."""
+    op = rng.choices([op for op, _ in OPERATORS], weights=[w for _, w in OPERATORS])[0]
+
+    fields = ASSET_FIELDS[asset_type]
+    if fields and rng.random() < 0.6:
+        clause = {'field': [rng.choice(fields)]}
+    else:
+        clause = {'tag_field': [rng.choice(TAG_KEYS)]}
+
+    clause['op'] = op
+    if op.lower() not in ('is null', 'is not null'):
+        value = rng.choice(values)
+        if op in ('Contains', 'Does Not Contain'):
+            # Substring of a known value so CONTAINS rules actually match
+            value = value.split('-')[0]
+        clause['val'] = value
+    return clause
+
+
+def generate_schema(blocks=3, groups_per_block=100, static_groups=10, rules_per_static_group=3,
+                    clauses_per_filter=1, merges_per_block=None, merge_fan_in=2,
+                    include_other=True, seed=0, name=None):
+    """
+    Generate a perspective schema dict.
+
+    blocks                  categorize rules (Dynamic Group Blocks)
+    groups_per_block        dynamic groups (tag values) per block
+    static_groups           static groups, excluding the 'Other' group
+    rules_per_static_group  filter rules per static group (OR'd together)
+    clauses_per_filter      clauses per filter rule (AND'd together)
+    merges_per_block        merges per block (default: groups_per_block // 10)
+    merge_fan_in            dynamic groups merged into each merge target
+    include_other           add the is_other catch-all static group
+    """
+    rng = random.Random(seed)
+    next_ref = _RefIds()
+
+    if merges_per_block is None:
+        merges_per_block = groups_per_block // 10
+
+    rules = []
+    merges = []
+    block_list = []
+    dynamic_list = []
+    static_list = []
+    values = []
+
+    asset_types = sorted(ASSET_FIELDS)
+
+    # Categorize rules and their dynamic groups
+    for block_idx in range(blocks):
+        block_ref = next_ref()
+        block_name = f"{_word(rng)} Block {block_idx}"
+        tag_key = TAG_KEYS[block_idx % len(TAG_KEYS)]
+
+        rules.append({
+            'type': 'categorize',
+            'asset': rng.choice(asset_types),
+            'ref_id': block_ref,
+            'name': block_name,
+            'tag_field': [tag_key],
+        })
+        block_list.append({'ref_id': block_ref, 'name': block_name})
+
+        block_groups = []
+        for group_idx in range(groups_per_block):
+            value = _name(rng, group_idx)
+            values.append(value)
+            group = {'ref_id': next_ref(), 'name': value, 'val': value, 'blk_id': block_ref}
+            block_groups.append(group)
+            dynamic_list.append(group)
+
+        # Merge disjoint runs of merge_fan_in groups into a target group
+        candidates = list(range(len(block_groups)))
+        rng.shuffle(candidates)
+        for _ in range(merges_per_block):
+            if len(candidates) < merge_fan_in + 1:
+                break
+            target = block_groups[candidates.pop()]
+            sources = [block_groups[candidates.pop()] for _ in range(merge_fan_in)]
+            for source in sources:
+                source['fwd_to'] = target['ref_id']
+            merges.append({
+                'type': 'Group',
+                'to': target['ref_id'],
+                'from': [source['ref_id'] for source in sources],
+            })
+
+    if not values:
+        values = [_name(rng, idx) for idx in range(max(1, static_groups))]
+
+    # Static groups and their filter rules
+    for static_idx in range(static_groups):
+        group_ref = next_ref()
+        static_list.append({'ref_id': group_ref, 'name': f"{_word(rng)} Group {static_idx}"})
+
+        for _ in range(rules_per_static_group):
+            asset_type = rng.choice(asset_types)
+            rules.append({
+                'type': 'filter',
+                'asset': asset_type,
+                'to': group_ref,
+                'condition': {
+                    'clauses': [_clause(rng, asset_type, values) for _ in range(clauses_per_filter)]
+                },
+            })
+
+    # Filter rules forwarded to merge targets, as seen in real exports
+    for merge in merges:
+        asset_type = rng.choice(asset_types)
+        rules.append({
+            'type': 'filter',
+            'asset': asset_type,
+            'to': merge['from'][0],
+            'fwd_to': merge['to'],
+            'condition': {'clauses': [_clause(rng, asset_type, values)]},
+        })
+
+    if include_other:
+        static_list.append({'ref_id': next_ref(), 'name': 'Other', 'is_other': 'true'})
+
+    rng.shuffle(rules)
+
+    constants = [
+        {'type': 'Dynamic Group Block', 'list': block_list},
+        {'type': 'Dynamic Group', 'list': dynamic_list},
+        {'type': 'Static Group', 'list': static_list},
+    ]
+
+    return {
+        'schema': {
+            'name': name or f"Synthetic {blocks}x{groups_per_block} seed {seed}",
+            'type': None,
+            'immutable': None,
+            'rules': rules,
+            'merges': merges,
+            'constants': constants,
+            'include_in_reports': 'true',
+        }
+    }
+
+
+# Noise values per field or tag key that no rule mentions
+NOISE_VALUES = 20
+
+
+def _satisfy(rng, clause, attrs, pool):
+    """Set attrs (fields or tags) so that clause holds for the asset."""
+    key = (clause.get('field') or clause.get('tag_field') or [''])[0]
+    op = clause.get('op', '=').lower()
+    val = clause.get('val', '')
+    if op == '=':
+        attrs[key] = val
+    elif op == 'contains':
+        attrs[key] = f"{_word(rng, 1)}{val}{_word(rng, 1)}"
+    elif op == 'is null':
+        attrs.pop(key, None)
+    elif op == 'is not null':
+        attrs.setdefault(key, rng.choice(pool))
+    else:
+        # != and does not contain: any pool value without val
+        choices = [value for value in pool if val not in value] or [_word(rng) + '!']
+        attrs[key] = rng.choice(choices)
+
+
+def generate_inventory(schema_data, assets=1000, seed=0, match_rate=0.9):
+    """
+    Yield synthetic asset dicts ({'id', 'type', 'fields', 'tags'}) for a schema.
+
+    About match_rate of the assets are built to satisfy a randomly chosen
+    rule of the schema; the rest get random attributes and mostly fall
+    through to the 'Other' group. Values are drawn from small pools (the
+    values the schema mentions plus a little noise), so, as in real
+    inventories, fields have few distinct values.
+    """
+    rng = random.Random(seed)
+    schema = schema_data.get('schema', {})
+    rules = schema.get('rules', [])
+
+    # Dynamic group values per block, for categorize rules
+    block_values = {}
+    for constant in schema.get('constants', []):
+        if constant.get('type') == 'Dynamic Group':
+            for group in constant.get('list', []):
+                block_values.setdefault(group.get('blk_id'), []).append(group.get('val', ''))
+
+    # Value pools per field and per tag key, and the fields of each asset type
+    field_pools = {}
+    tag_pools = {key: [] for key in TAG_KEYS}
+    type_fields = {asset_type: set(fields) for asset_type, fields in ASSET_FIELDS.items()}
+    for rule in rules:
+        asset_type = rule.get('asset', '')
+        type_fields.setdefault(asset_type, set())
+        if rule.get('type') == 'categorize':
+            for key in rule.get('tag_field', []):
+                tag_pools.setdefault(key, []).extend(block_values.get(rule.get('ref_id'), []))
+        for clause in rule.get('condition', {}).get('clauses', []):
+            val = clause.get('val')
+            if 'tag_field' in clause:
+                pool = tag_pools.setdefault(clause['tag_field'][0], [])
+            else:
+                pool = field_pools.setdefault(clause.get('field', [''])[0], [])
+                type_fields[asset_type].add(clause.get('field', [''])[0])
+            if val:
+                pool.append(val)
+    for fields in type_fields.values():
+        for field in fields:
+            field_pools.setdefault(field, [])
+    for pool in list(field_pools.values()) + list(tag_pools.values()):
+        pool.extend(_name(rng, idx) for idx in range(NOISE_VALUES))
+
+    asset_types = sorted(type_fields)
+    type_fields = {asset_type: sorted(fields) for asset_type, fields in type_fields.items()}
+    tag_keys = sorted(tag_pools)
+
+    for idx in range(assets):
+        rule = rng.choice(rules) if rules and rng.random() < match_rate else None
+        asset_type = rule.get('asset', '') if rule else rng.choice(asset_types)
+
+        fields = {}
+        for field in type_fields.get(asset_type, ()):
+            if rng.random() < 0.9:
+                fields[field] = rng.choice(field_pools[field])
+        tags = {}
+        for key in tag_keys:
+            if rng.random() < 0.5:
+                tags[key] = rng.choice(tag_pools[key])
+
+        if rule:
+            if rule.get('type') == 'categorize':
+                values = block_values.get(rule.get('ref_id'))
+                for key in rule.get('tag_field', []):
+                    tags[key] = rng.choice(values) if values else _name(rng, idx)
+            for clause in rule.get('condition', {}).get('clauses', []):
+                if 'tag_field' in clause:
+                    _satisfy(rng, clause, tags, tag_pools[clause['tag_field'][0]])
+                else:
+                    _satisfy(rng, clause, fields, field_pools[clause.get('field', [''])[0]])
+
+        yield {'id': f"asset-{idx}", 'type': asset_type, 'fields': fields, 'tags': tags}
+
+
+def write_inventory(assets, f, inventory_format='jsonl'):
+    """
+    Write asset dicts to a text file as JSONL or CSV.
+
+    CSV has id and type columns, a column per field and a 'tag:<key>'
+    column per tag key; empty cells are missing values.
+    """
+    if inventory_format == 'jsonl':
+        for asset in assets:
+            f.write(json.dumps(asset))
+            f.write('\n')
+        return
+
+    # CSV needs every column up front
+    assets = list(assets)
+    fields = sorted({field for asset in assets for field in asset['fields']})
+    tag_keys = sorted({key for asset in assets for key in asset['tags']})
+    writer = csv.writer(f)
+    writer.writerow(['id', 'type'] + fields + [f"tag:{key}" for key in tag_keys])
+    for asset in assets:
+        row = [asset['id'], asset['type']]
+        row.extend(asset['fields'].get(field, '') for field in fields)
+        row.extend(asset['tags'].get(key, '') for key in tag_keys)
+        writer.writerow(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic CloudHealth Perspective schema for scale testing'
+    )
+    parser.add_argument('-o', '--output', default=None,
+                        help='Optional output file (default: print to screen)')
+    parser.add_argument('--blocks', type=int, default=3,
+                        help='Number of categorize rules / Dynamic Group Blocks (default: 3)')
+    parser.add_argument('--groups-per-block', type=int, default=100,
+                        help='Dynamic groups per block (default: 100)')
+    parser.add_argument('--static-groups', type=int, default=10,
+                        help="Static groups, not counting 'Other' (default: 10)")
+    parser.add_argument('--rules-per-static-group', type=int, default=3,
+                        help='Filter rules per static group (default: 3)')
+    parser.add_argument('--clauses-per-filter', type=int, default=1,
+                        help='Clauses per filter rule (default: 1)')
+    parser.add_argument('--merges-per-block', type=int, default=None,
+                        help='Merges per block (default: groups-per-block / 10)')
+    parser.add_argument('--merge-fan-in', type=int, default=2,
+                        help='Dynamic groups merged into each merge target (default: 2)')
+    parser.add_argument('--no-other', action='store_true',
+                        help="Omit the 'Other' (is_other) catch-all static group")
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--name', default=None, help='Perspective name')
+    parser.add_argument('--indent', type=int, default=None,
+                        help='Pretty-print with this indent (default: compact)')
+    parser.add_argument('--inventory', type=int, default=None, metavar='N',
+                        help='Write an inventory of N synthetic assets instead of a schema')
+    parser.add_argument('--schema', default=None,
+                        help='With --inventory, build assets for this schema file '
+                             '(default: the schema the other options generate)')
+    parser.add_argument('--inventory-format', choices=['jsonl', 'csv'], default=None,
+                        help='Inventory format (default: csv for a .csv output file, else jsonl)')
+    parser.add_argument('--match-rate', type=float, default=0.9,
+                        help='Fraction of assets built to match a rule (default: 0.9)')
+
+    args = parser.parse_args()
+
+    if args.inventory is not None and args.schema:
+        try:
+            with open(args.schema, 'r') as f:
+                schema_data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read schema '{args.schema}': {e}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        schema_data = generate_schema(
+            blocks=args.blocks,
+            groups_per_block=args.groups_per_block,
+            static_groups=args.static_groups,
+            rules_per_static_group=args.rules_per_static_group,
+            clauses_per_filter=args.clauses_per_filter,
+            merges_per_block=args.merges_per_block,
+            merge_fan_in=args.merge_fan_in,
+            include_other=not args.no_other,
+            seed=args.seed,
+            name=args.name,
+        )
+
+    if args.inventory is not None:
+        inventory_format = args.inventory_format
+        if inventory_format is None:
+            inventory_format = 'csv' if (args.output or '').endswith('.csv') else 'jsonl'
+        assets = generate_inventory(schema_data, args.inventory, seed=args.seed, match_rate=args.match_rate)
+        if args.output:
+            with open(args.output, 'w', newline='') as f:
+                write_inventory(assets, f, inventory_format)
+            print(f"Inventory of {args.inventory} assets written to {args.output}")
+        else:
+            write_inventory(assets, sys.stdout, inventory_format)
+        return
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(schema_data, f, indent=args.indent)
+        print(f"Schema written to {args.output}")
+    else:
+        json.dump(schema_data, sys.stdout, indent=args.indent)
+        sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
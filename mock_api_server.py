@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Mock CloudHealth API Server
+Serves perspective schemas from a directory of JSON fixtures so that the
+fetch, caching and retry paths of parse_perspective.py can be exercised
+and benchmarked offline.
+
+Endpoints:
+    GET /v1/perspective_schemas          list of all fixtures
+    GET /v1/perspective_schemas/{id}     contents of {fixtures}/{id}.json
+
+Requirements:
+    - Python 3.7+ (standard library only)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+import email.utils
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+
+SCHEMA_PATH = '/v1/perspective_schemas'
+
+
+class FixtureStore:
+    """Loads fixture files on demand and caches their bodies and validators."""
+
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+        self._cache = {}  # perspective ID -> (mtime, body, etag, last_modified)
+        self._lock = threading.Lock()
+
+    def ids(self):
+        """Return the perspective IDs available in the fixtures directory."""
+        return sorted(
+            os.path.splitext(name)[0]
+            for name in os.listdir(self.fixtures_dir)
+            if name.endswith('.json')
+        )
+
+    def get(self, perspective_id):
+        """Return (body, etag, last_modified) for a fixture, or None if missing."""
+        # Reject anything that could escape the fixtures directory
+        if not perspective_id or '/' in perspective_id or perspective_id.startswith('.'):
+            return None
+
+        path = os.path.join(self.fixtures_dir, f"{perspective_id}.json")
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._cache.get(perspective_id)
+            if cached and cached[0] == mtime:
+                return cached[1:]
+
+        with open(path, 'rb') as f:
+            body = f.read()
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        last_modified = email.utils.formatdate(mtime, usegmt=True)
+
+        with self._lock:
+            self._cache[perspective_id] = (mtime, body, etag, last_modified)
+        return body, etag, last_modified
+
+
+class MockAPIHandler(BaseHTTPRequestHandler):
+    """Request handler; behaviour is configured through attributes on the server."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body and self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_json(self, status, data, headers=None):
+        headers = dict(headers or {})
+        headers['Content-Type'] = 'application/json'
+        self._send(status, json.dumps(data).encode('utf-8'), headers)
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip('/')
+        query = parse_qs(parts.query)
+
+        # Simulated network and server latency
+        latency = server.latency + random.uniform(0, server.jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+        if server.api_key is not None and query.get('api_key', [None])[0] != server.api_key:
+            server.count('unauthorized')
+            self._send_json(401, {'error': 'Invalid API key'})
+            return
+
+        # Fault injection
+        roll = random.random()
+        if roll < server.rate_429:
+            server.count('throttled')
+            self._send_json(429, {'error': 'Too Many Requests'},
+                            {'Retry-After': f"{server.retry_after:g}"})
+            return
+        if roll < server.rate_429 + server.error_rate:
+            server.count('errors')
+            self._send_json(500, {'error': 'Internal Server Error'})
+            return
+
+        if path == SCHEMA_PATH:
+            perspectives = {pid: {'name': pid, 'active': True} for pid in server.store.ids()}
+            self._send_json(200, {'perspectives': perspectives})
+            return
+
+        if not path.startswith(SCHEMA_PATH + '/'):
+            server.count('not_found')
+            self._send_json(404, {'error': 'Not Found'})
+            return
+
+        perspective_id = path[len(SCHEMA_PATH) + 1:]
+        fixture = server.store.get(perspective_id)
+        if fixture is None:
+            server.count('not_found')
+            self._send_json(404, {'error': f"Perspective '{perspective_id}' not found"})
+            return
+
+        body, etag, last_modified = fixture
+        validators = {'ETag': etag, 'Last-Modified': last_modified} if server.etags else {}
+
+        if server.etags and self._not_modified(etag, last_modified):
+            server.count('not_modified')
+            self._send(304, headers=validators)
+            return
+
+        server.count('ok')
+        headers = dict(validators)
+        headers['Content-Type'] = 'application/json'
+        self._send(200, body, headers)
+
+    do_HEAD = do_GET
+
+    def _not_modified(self, etag, last_modified):
+        """Evaluate If-None-Match / If-Modified-Since against the fixture."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+                modified = email.utils.parsedate_to_datetime(last_modified)
+            except (TypeError, ValueError):
+                return False
+            return modified <= since
+
+        return False
+
+
+class MockAPIServer(ThreadingHTTPServer):
+    """Threaded HTTP server carrying the mock API configuration and counters."""
+
+    daemon_threads = True
+
+    def __init__(self, address, fixtures_dir, latency=0.0, jitter=0.0, error_rate=0.0,
+                 rate_429=0.0, retry_after=1.0, etags=True, api_key=None, verbose=False):
+        super().__init__(address, MockAPIHandler)
+        self.store = FixtureStore(fixtures_dir)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.etags = etags
+        self.api_key = api_key
+        self.verbose = verbose
+        self.counters = {}
+        self._counter_lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._counter_lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+
+def start_mock_server(fixtures_dir, host='127.0.0.1', port=0, **options):
+    """Start a mock server on a background thread. Returns the server; call shutdown() to stop."""
+    server = MockAPIServer((host, port), fixtures_dir, **options)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve perspective schema fixtures over a local mock of the CloudHealth API',
+        epilog='Point parse_perspective.py at the server with --api-base-url http://HOST:PORT'
+    )
+    parser.add_argument(
+        'fixtures_dir',
+        nargs='?',
+        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'examples'),
+        help='Directory of <perspective-id>.json fixtures (default: examples/)'
+    )
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8080, help='Port to bind (default: 8080)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Fixed delay added to every response, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Extra random delay (0..JITTER seconds) added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--rate-429', type=float, default=0.0,
+                        help='Fraction of requests answered with HTTP 429')
+    parser.add_argument('--retry-after', type=float, default=1.0,
+                        help='Retry-After value sent with 429 responses, in seconds (default: 1)')
+    parser.add_argument('--no-etags', action='store_true',
+                        help='Do not send ETag/Last-Modified or answer conditional requests with 304')
+    parser.add_argument('--api-key', default=None,
+                        help='Require this api_key query parameter (default: accept any)')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Log every request')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.fixtures_dir):
+        print(f"Error: Fixtures directory '{args.fixtures_dir}' not found", file=sys.stderr)
+        sys.exit(1)
+
+    server = MockAPIServer(
+        (args.host, args.port), args.fixtures_dir,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        rate_429=args.rate_429, retry_after=args.retry_after, etags=not args.no_etags,
+        api_key=args.api_key, verbose=args.verbose
+    )
+    print(f"Serving {len(server.store.ids())} perspectives from {args.fixtures_dir} at {server.base_url}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Request counts: {json.dumps(server.counters, sort_keys=True)}")
+
+
+if __name__ == '__main__':
+    main()
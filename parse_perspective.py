@@ -12,8 +12,312 @@ import json
 import re
 import argparse
 import sys
+import os
+import glob
+import time
+import hashlib
+import random
+import threading
+import email.utils
+import datetime
+import codecs
+import gzip
+import bz2
+import lzma
+import mmap
+import marshal
+import pickle
+import shutil
+import contextlib
+import importlib.util
+import itertools
+import tracemalloc
+from collections import namedtuple
+from operator import attrgetter
 import requests
+import requests.adapters
 import getpass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+
+# Buffer size used when streaming rendered output to a file
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+# CloudHealth API endpoint
+API_BASE_URL = "https://chapi.cloudhealthtech.com"
+
+# Concurrent requests (and pooled connections) used for bulk fetches
+DEFAULT_FETCH_WORKERS = 8
+
+# Retry policy for throttled (429) or unavailable (503) API responses
+DEFAULT_MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 60.0
+
+# Root directory for on-disk caches
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'ch-perspective-parser'
+)
+
+# HTTP schema cache defaults: always revalidate, keep up to 256 MB
+DEFAULT_HTTP_CACHE_TTL = 0
+DEFAULT_HTTP_CACHE_MAX_MB = 256
+
+# Compiled perspective cache; bump the version whenever the IR or the
+# rendered output changes so stale entries are never served
+COMPILED_CACHE_VERSION = 3
+DEFAULT_COMPILED_CACHE_MAX_MB = 512
+
+# Name of the rendered output format stored in the compiled cache
+OUTPUT_FORMAT = 'text'
+
+
+# JSON decoders tried by --json-backend auto, fastest first
+JSON_BACKENDS = ('orjson', 'simdjson', 'ujson', 'json')
+
+
+def load_json_backend(name='auto'):
+    """
+    Return (backend name, loads function) for a JSON backend.
+
+    'auto' picks the first installed backend in JSON_BACKENDS; 'json' is the
+    standard library and always available. Every loads function accepts str
+    or bytes and raises ValueError on invalid JSON.
+    """
+    candidates = JSON_BACKENDS if name == 'auto' else (name,)
+    for candidate in candidates:
+        if candidate == 'json':
+            return 'json', json.loads
+        if candidate not in JSON_BACKENDS:
+            raise ValueError(f"Unknown JSON backend '{candidate}'")
+        try:
+            module = __import__(candidate)
+        except ImportError:
+            continue
+        return candidate, module.loads
+    raise ValueError(f"JSON backend '{name}' is not installed")
+
+
+# Active JSON backend used by json_loads()
+_json_backend = load_json_backend('auto')
+
+
+def set_json_backend(name='auto'):
+    """Select the JSON backend used for schema files and API responses. Returns its name."""
+    global _json_backend
+    _json_backend = load_json_backend(name)
+    return _json_backend[0]
+
+
+def json_backend_name():
+    """Return the name of the active JSON backend."""
+    return _json_backend[0]
+
+
+def json_loads(data):
+    """Decode JSON str or bytes with the active backend."""
+    return _json_backend[1](data)
+
+
+class Profiler:
+    """
+    Collects wall time and tracemalloc peaks for named pipeline stages.
+
+    Stages may nest; a stage's seconds exclude time spent in stages nested
+    inside it, so streamed rendering and writing are reported separately.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}  # name -> {'seconds', 'calls', 'lines', 'peak_bytes'}
+        self._stack = []  # [name, start, child seconds, peak bytes]
+        self._started = time.perf_counter()
+        self._own_tracing = False
+        self._max_peak = 0
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._own_tracing = True
+        self._started = time.perf_counter()
+
+    def stop(self):
+        if hasattr(self, 'total_seconds'):
+            return
+        self.total_seconds = time.perf_counter() - self._started
+        if self.trace_memory and tracemalloc.is_tracing():
+            self._fold_peak()
+            self.peak_bytes = self._max_peak
+            if self._own_tracing:
+                tracemalloc.stop()
+                self._own_tracing = False
+        else:
+            self.peak_bytes = None
+
+    def _fold_peak(self):
+        """Attribute the traced peak so far to the innermost stage, then reset it."""
+        if not (self.trace_memory and tracemalloc.is_tracing()):
+            return
+        peak = tracemalloc.get_traced_memory()[1]
+        self._max_peak = max(self._max_peak, peak)
+        if self._stack:
+            self._stack[-1][3] = max(self._stack[-1][3], peak)
+        # reset_peak() needs Python 3.9+; without it peaks are cumulative
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def _enter(self, name, fold=True):
+        if fold:
+            self._fold_peak()
+        self._stack.append([name, time.perf_counter(), 0.0, 0])
+
+    def _exit(self, calls=1, lines=0, fold=True):
+        if fold:
+            self._fold_peak()
+        name, start, child_seconds, peak = self._stack.pop()
+        elapsed = time.perf_counter() - start
+
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = {'seconds': 0.0, 'calls': 0, 'lines': 0, 'peak_bytes': 0}
+        stats['seconds'] += elapsed - child_seconds
+        stats['calls'] += calls
+        stats['lines'] += lines
+        stats['peak_bytes'] = max(stats['peak_bytes'], peak)
+
+        if self._stack:
+            self._stack[-1][2] += elapsed
+            self._stack[-1][3] = max(self._stack[-1][3], peak)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the enclosed block as stage name."""
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def timed_iter(self, name, iterable):
+        """
+        Yield from iterable, timing only the time spent producing items.
+
+        Production time is charged to name and excluded from the consumer's
+        stage. Memory is sampled once the iterable is exhausted, since
+        tracemalloc calls per item would dominate the timings.
+        """
+        iterator = iter(iterable)
+        perf_counter = time.perf_counter
+        stack = self._stack
+        seconds = 0.0
+        lines = 0
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed = perf_counter() - start
+                    seconds += elapsed
+                    if stack:
+                        stack[-1][2] += elapsed
+                lines += 1
+                yield item
+        finally:
+            self._enter(name)
+            self._exit(lines=lines)
+            self.stages[name]['seconds'] += seconds
+
+    def note(self, name, **values):
+        """Attach extra measurements (such as sizes) to stage name."""
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = {'seconds': 0.0, 'calls': 0, 'lines': 0, 'peak_bytes': 0}
+        stats.setdefault('notes', {}).update(values)
+
+    def report(self):
+        """Return the collected measurements as a JSON-serializable dict."""
+        return {
+            'total_seconds': getattr(self, 'total_seconds', time.perf_counter() - self._started),
+            'peak_bytes': getattr(self, 'peak_bytes', None),
+            'stages': [dict(stats, name=name) for name, stats in self.stages.items()],
+        }
+
+    def format_table(self):
+        """Return the collected measurements as a text table."""
+        report = self.report()
+        total = report['total_seconds']
+        lines = [
+            f"{'stage':<12} {'seconds':>10} {'%':>6} {'calls':>7} {'lines':>10} {'peak MB':>9}",
+            '-' * 59,
+        ]
+        for stage in report['stages']:
+            share = stage['seconds'] / total * 100 if total > 0 else 0.0
+            peak = f"{stage['peak_bytes'] / (1024 * 1024):.1f}" if self.trace_memory else '-'
+            stage_lines = stage['lines'] or '-'
+            lines.append(f"{stage['name']:<12} {stage['seconds']:>10.4f} {share:>5.1f}% "
+                         f"{stage['calls']:>7} {stage_lines:>10} {peak:>9}")
+        lines.append('-' * 59)
+        peak_total = report['peak_bytes']
+        peak_total = f"{peak_total / (1024 * 1024):.1f}" if peak_total is not None else '-'
+        lines.append(f"{'total':<12} {total:>10.4f} {'':>6} {'':>7} {'':>10} {peak_total:>9}")
+        for stage in report['stages']:
+            if stage.get('notes'):
+                notes = ', '.join(f"{key} {value:,}" if isinstance(value, int) else f"{key} {value}"
+                                  for key, value in stage['notes'].items())
+                lines.append(f"{stage['name']}: {notes}")
+        return '\n'.join(lines)
+
+
+# Profiler receiving profile_stage()/profile_iter() measurements, if any
+_active_profiler = None
+
+
+@contextlib.contextmanager
+def profiling(trace_memory=True):
+    """
+    Profile everything run inside the block.
+
+        with profiling() as profiler:
+            parse_perspective_schema(schema_data)
+        print(profiler.format_table())
+    """
+    global _active_profiler
+    previous = _active_profiler
+    profiler = Profiler(trace_memory=trace_memory)
+    _active_profiler = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _active_profiler = previous
+
+
+@contextlib.contextmanager
+def profile_stage(name):
+    """Time the enclosed block as stage name when profiling is active."""
+    if _active_profiler is None:
+        yield
+    else:
+        with _active_profiler.stage(name):
+            yield
+
+
+def profile_note(name, **values):
+    """Attach extra measurements to stage name when profiling is active."""
+    if _active_profiler is not None:
+        _active_profiler.note(name, **values)
+
+
+def profile_iter(name, iterable):
+    """Wrap iterable so its production time is recorded when profiling is active."""
+    if _active_profiler is None:
+        return iterable
+    return _active_profiler.timed_iter(name, iterable)
 
 
 def camel_to_readable(text):
@@ -23,21 +327,8 @@ def camel_to_readable(text):
     return result
 
 
-def format_condition_clause(clause):
-    """Format a condition clause into SQL-like syntax."""
-    op = clause.get('op', '=')
-    val = clause.get('val', '')
-
-    # Determine if this is a tag field or regular field
-    if 'tag_field' in clause:
-        field_list = clause.get('tag_field', [])
-        field_name = field_list[0] if field_list else ''
-        field_prefix = 'tag '
-    else:
-        field_list = clause.get('field', [])
-        field_name = field_list[0] if field_list else ''
-        field_prefix = ''
-
+def _format_condition(field_prefix, field_name, op, val):
+    """Format one condition into SQL-like syntax."""
     # Format based on operator
     if op == '=':
         return f"{field_prefix}{field_name} = '{val}'"
@@ -56,236 +347,1809 @@ def format_condition_clause(clause):
         return f"{field_prefix}{field_name} {op} '{val}'"
 
 
-def parse_perspective_schema(schema_data):
-    """Parse the perspective schema and generate human-readable output."""
-    schema = schema_data.get('schema', {})
+def format_condition_clause(clause):
+    """Format a condition clause into SQL-like syntax."""
+    op = clause.get('op', '=')
+    val = clause.get('val', '')
+
+    # Determine if this is a tag field or regular field
+    if 'tag_field' in clause:
+        field_list = clause.get('tag_field', [])
+        field_name = field_list[0] if field_list else ''
+        field_prefix = 'tag '
+    else:
+        field_list = clause.get('field', [])
+        field_name = field_list[0] if field_list else ''
+        field_prefix = ''
 
-    output_lines = []
+    return _format_condition(field_prefix, field_name, op, val)
 
-    # Perspective name
-    perspective_name = schema.get('name', 'Unknown')
-    output_lines.append(f"Perspective: {perspective_name}\n")
 
-    # Get rules, constants, merges
-    rules = schema.get('rules', [])
-    constants = schema.get('constants', [])
-    merges = schema.get('merges', [])
+def format_clause(clause):
+    """Format a compiled Clause into SQL-like syntax."""
+    return _format_condition('tag ' if clause.is_tag else '', clause.field, clause.op, clause.val)
 
-    # Build lookup dictionaries
-    group_blocks = {}  # ref_id -> block info
-    dynamic_groups = {}  # ref_id -> group info
-    static_groups = {}  # ref_id -> group info
 
-    for constant in constants:
-        const_type = constant.get('type')
+# Compiled schema classes: immutable tuples with named fields and no
+# per-instance __dict__, which keeps large perspectives compact
 
-        if const_type == 'Dynamic Group Block':
-            for block in constant.get('list', []):
-                group_blocks[block['ref_id']] = block
+class Clause(namedtuple('Clause', 'field is_tag op val')):
+    """One condition: field (or tag key if is_tag), operator and value."""
 
-        elif const_type == 'Dynamic Group':
-            for group in constant.get('list', []):
-                dynamic_groups[group['ref_id']] = group
+    __slots__ = ()
 
-        elif const_type == 'Static Group':
-            for group in constant.get('list', []):
-                static_groups[group['ref_id']] = group
 
-    # Build merge mappings
-    merge_targets = {}  # target ref_id -> list of source ref_ids
-    merged_sources = set()  # set of source ref_ids that are merged into others
+class FilterRule(namedtuple('FilterRule', 'asset clauses')):
+    """A filter rule for one asset type; its clauses are AND'd together."""
 
-    for merge in merges:
-        if merge.get('type') == 'Group':
-            to_ref = merge.get('to')
-            from_refs = merge.get('from', [])
+    __slots__ = ()
 
-            if to_ref not in merge_targets:
-                merge_targets[to_ref] = []
 
-            merge_targets[to_ref].extend(from_refs)
-            merged_sources.update(from_refs)
+class DynamicGroup(namedtuple('DynamicGroup', 'ref_id name val block_id merged_from is_merged')):
+    """
+    A dynamic group: assets whose block tag equals val.
 
-    # Collect filter rules for static groups
-    static_group_filters = {}  # ref_id -> list of filter rules
+    merged_from lists the ids of groups merged into this one; is_merged is
+    set when this group is itself merged into another group.
+    """
 
-    for rule in rules:
-        if rule.get('type') == 'filter':
-            to_ref = rule.get('to')
-            # Only process if not being forwarded (fwd_to means it's going to another group)
-            if to_ref and 'fwd_to' not in rule:
-                if to_ref not in static_group_filters:
-                    static_group_filters[to_ref] = []
+    __slots__ = ()
 
-                asset_type = rule.get('asset', '')
-                condition = rule.get('condition', {})
-                clauses = condition.get('clauses', [])
 
-                # Each filter rule is stored separately - they will be OR'd together
-                # Clauses within a single rule will be AND'd together
-                static_group_filters[to_ref].append({
-                    'asset': asset_type,
-                    'clauses': clauses
-                })
+class GroupBlock(namedtuple('GroupBlock', 'ref_id name asset tag_field clauses groups index')):
+    """
+    A categorize rule and the dynamic groups of its block, in schema order.
 
-    # Process categorize rules (dynamic groups)
-    for rule in rules:
+    index maps each tag value to the ref id of the group an asset with that
+    value ends up in, after following merges (the first group wins if two
+    share a value).
+    """
+
+    __slots__ = ()
+
+
+class StaticGroup(namedtuple('StaticGroup', 'ref_id name is_other rules')):
+    """
+    A static group and its filter rules, which are OR'd together.
+
+    Rules are ordered by asset type (in order of first appearance), then by
+    schema order, so rules for the same asset type are adjacent.
+    """
+
+    __slots__ = ()
+
+
+class FilterRoute(namedtuple('FilterRoute', 'to rule')):
+    """A filter rule and the ref id of the group (static or dynamic) it assigns assets to."""
+
+    __slots__ = ()
+
+
+class Perspective(namedtuple('Perspective', 'name blocks dynamic_groups static_groups ref_ids rules merges')):
+    """
+    Compiled perspective schema.
+
+    Ref ids are small integers; ref_ids maps each one back to the schema's
+    ref id string. dynamic_groups maps ref id to DynamicGroup and should be
+    treated as read-only.
+
+    rules holds every rule in schema (evaluation) order: a GroupBlock for
+    each categorize rule and a FilterRoute for each filter rule, including
+    rules into dynamic groups that are not rendered. merges maps each merged
+    group's ref id to the ref id it is merged into (possibly merged again).
+    """
+
+    __slots__ = ()
+
+    def ref_id_string(self, ref_id):
+        """Return the schema ref id string for an integer ref id."""
+        return self.ref_ids[ref_id]
+
+    def final_group(self, ref_id):
+        """Follow merges from ref_id to the group it ends up in."""
+        return _follow_merges(self.merges, ref_id)
+
+
+def _follow_merges(merges, ref_id):
+    """Follow merge links from ref_id; a merge cycle stops where it repeats."""
+    if ref_id not in merges:
+        return ref_id
+    seen = set()
+    while ref_id in merges and ref_id not in seen:
+        seen.add(ref_id)
+        ref_id = merges[ref_id]
+    return ref_id
+
+
+class _RefTable(dict):
+    """Maps schema ref id strings to dense integer ids, assigned on first use."""
+
+    def __missing__(self, key):
+        ref_id = self[key] = len(self)
+        return ref_id
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+def _compile_clauses(clauses):
+    compiled = []
+    for clause in clauses:
+        is_tag = 'tag_field' in clause
+        field_list = clause.get('tag_field' if is_tag else 'field', [])
+        compiled.append(Clause(
+            _intern(field_list[0] if field_list else ''),
+            is_tag,
+            _intern(clause.get('op', '=')),
+            _intern(clause.get('val', '')),
+        ))
+    return tuple(compiled)
+
+
+class PerspectiveCompiler:
+    """
+    Builds a Perspective incrementally, one schema item at a time.
+
+    Items may arrive in any order (for example rules before constants when
+    streaming a file), so only compact intermediate state is kept until
+    finish() links groups, merges and blocks together.
+    """
+
+    CONSTANT_TYPES = ('Dynamic Group', 'Static Group')
+
+    def __init__(self):
+        self.name = 'Unknown'
+        self._ref = _RefTable()  # ref id strings -> dense integer ids
+        self._dynamic_groups = {}  # ref_id -> DynamicGroup
+        self._static_groups = {}  # ref_id -> (name, is_other)
+        self._merge_targets = {}  # target ref_id -> list of source ref_ids
+        self._merged_sources = set()  # set of source ref_ids that are merged into others
+        self._static_group_filters = {}  # ref_id -> {asset: [FilterRule]}
+        self._blocks = []  # (ref_id, name, asset, tag_field, clauses) per categorize rule
+        self._rules = []  # FilterRoute, or index into _blocks, per rule in schema order
+        self._merges = {}  # source ref_id -> target ref_id
+
+    def set_name(self, name):
+        self.name = _intern(name)
+
+    def add_constant(self, const_type, item):
+        """Add one entry from the 'list' of a constant of type const_type."""
+        ref = self._ref
+        if const_type == 'Dynamic Group':
+            name = item.get('name', '')
+            val = item.get('val', '')
+            group_ref = ref[item['ref_id']]
+            # Merge links are filled in by finish()
+            self._dynamic_groups[group_ref] = DynamicGroup(
+                group_ref, _intern(name), _intern(val), ref[item.get('blk_id')], (), False
+            )
+
+        elif const_type == 'Static Group':
+            self._static_groups[ref[item['ref_id']]] = (
+                _intern(item.get('name', '')), item.get('is_other') == 'true'
+            )
+
+    def add_merge(self, merge):
+        if merge.get('type') == 'Group':
+            ref = self._ref
+            to_ref = ref[merge.get('to')]
+            from_refs = [ref[from_ref] for from_ref in merge.get('from', [])]
+
+            if to_ref not in self._merge_targets:
+                self._merge_targets[to_ref] = []
+
+            self._merge_targets[to_ref].extend(from_refs)
+            self._merged_sources.update(from_refs)
+            for from_ref in from_refs:
+                self._merges[from_ref] = to_ref
+
+    def add_rule(self, rule):
         rule_type = rule.get('type')
 
-        if rule_type == 'categorize':
-            # Get rule details
-            asset_type = rule.get('asset', '')
-            readable_asset = camel_to_readable(asset_type)
-            ref_id = rule.get('ref_id')
-            block_name = rule.get('name', '')
-            tag_fields = rule.get('tag_field', [])
-            tag_field = tag_fields[0] if tag_fields else ''
+        if rule_type == 'filter':
+            to_ref = rule.get('to')
+            if to_ref:
+                asset_type = _intern(rule.get('asset', ''))
+                condition = rule.get('condition', {})
+                filter_rule = FilterRule(asset_type, _compile_clauses(condition.get('clauses', [])))
+                self._rules.append(FilterRoute(self._ref[to_ref], filter_rule))
 
-            # Show group block header
-            output_lines.append(f"Group Block: {block_name}\n")
+                # Only render if not being forwarded (fwd_to means it's going to another group)
+                if 'fwd_to' not in rule:
+                    # Each filter rule is stored separately - they will be OR'd together
+                    # Clauses within a single rule will be AND'd together
+                    by_asset = self._static_group_filters.setdefault(self._ref[to_ref], {})
+                    by_asset.setdefault(asset_type, []).append(filter_rule)
 
-            # Find all dynamic groups belonging to this block
-            block_groups = [
-                group for group in dynamic_groups.values()
-                if group.get('blk_id') == ref_id
-            ]
+        elif rule_type == 'categorize':
+            tag_fields = rule.get('tag_field', [])
+            condition = rule.get('condition', {})
+            self._rules.append(len(self._blocks))
+            self._blocks.append((
+                self._ref[rule.get('ref_id')],
+                _intern(rule.get('name', '')),
+                _intern(rule.get('asset', '')),
+                _intern(tag_fields[0] if tag_fields else ''),
+                _compile_clauses(condition.get('clauses', [])),
+            ))
+
+    def finish(self):
+        """Link everything added so far into a Perspective."""
+        dynamic_groups = self._dynamic_groups
+        merge_targets = self._merge_targets
+        merged_sources = self._merged_sources
+
+        # Link merged groups; only groups involved in a merge are rebuilt
+        for group_ref in merged_sources.union(merge_targets):
+            group = dynamic_groups.get(group_ref)
+            if group is None:
+                continue
+            merged_from = tuple(
+                merged_ref for merged_ref in merge_targets.get(group_ref, ())
+                if merged_ref in dynamic_groups
+            )
+            dynamic_groups[group_ref] = group._replace(
+                merged_from=merged_from, is_merged=group_ref in merged_sources
+            )
+
+        # Index dynamic groups by their block so each categorize rule only
+        # touches its own groups (keeps the original group order)
+        groups_by_block = {}  # blk_id -> list of DynamicGroup
+        for group in dynamic_groups.values():
+            block_id = group.block_id
+            if block_id not in groups_by_block:
+                groups_by_block[block_id] = []
+            groups_by_block[block_id].append(group)
+
+        # Inverted tag index per block: tag value -> final (post-merge) group
+        with profile_stage('tag-index'):
+            merges = self._merges
+            blocks = []
+            for block_ref, name, asset, tag_field, clauses in self._blocks:
+                groups = tuple(groups_by_block.get(block_ref, ()))
+                index = {}
+                for group in groups:
+                    if group.val not in index:
+                        index[group.val] = _follow_merges(merges, group.ref_id)
+                blocks.append(GroupBlock(block_ref, name, asset, tag_field, clauses, groups, index))
+            blocks = tuple(blocks)
+        profile_note('tag-index', blocks=len(blocks), entries=sum(len(block.index) for block in blocks),
+                     bytes=sum(sys.getsizeof(block.index) for block in blocks))
+
+        compiled_static = []
+        for group_ref, (name, is_other) in self._static_groups.items():
+            group_rules = []
+            for asset_rules in self._static_group_filters.get(group_ref, {}).values():
+                group_rules.extend(asset_rules)
+            compiled_static.append(StaticGroup(group_ref, name, is_other, tuple(group_rules)))
+
+        rules = tuple(blocks[rule] if type(rule) is int else rule for rule in self._rules)
+
+        return Perspective(self.name, blocks, dynamic_groups, tuple(compiled_static), tuple(self._ref),
+                           rules, self._merges)
+
+
+def compile_perspective(schema_data):
+    """Compile a perspective schema dict into an immutable Perspective."""
+    schema = schema_data.get('schema', {})
 
-            # Output each group
-            for group in block_groups:
-                group_ref_id = group.get('ref_id')
+    compiler = PerspectiveCompiler()
+    compiler.set_name(schema.get('name', 'Unknown'))
 
-                # Skip groups that are merged into others
-                if group_ref_id in merged_sources:
+    for constant in schema.get('constants', []):
+        const_type = constant.get('type')
+        if const_type in PerspectiveCompiler.CONSTANT_TYPES:
+            for item in constant.get('list', []):
+                compiler.add_constant(const_type, item)
+
+    for merge in schema.get('merges', []):
+        compiler.add_merge(merge)
+
+    for rule in schema.get('rules', []):
+        compiler.add_rule(rule)
+
+    return compiler.finish()
+
+
+# Read size for the streaming schema parser
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# ijson prefixes of the items the streaming parsers hand to the compiler
+_STREAM_ITEM_PREFIXES = {
+    'schema.rules.item': 'rule',
+    'schema.merges.item': 'merge',
+    'schema.constants.item.list.item': 'constant',
+}
+
+
+class _SchemaStreamReader:
+    """
+    Pure-Python streaming reader for perspective schema files.
+
+    Walks the document structure incrementally and decodes each rule,
+    merge and constant list entry with the C-accelerated json decoder, so
+    only one item (plus a read chunk) is held in memory at a time.
+    """
+
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+    _NUMBER_START = frozenset('-0123456789')
+    _NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+    def __init__(self, fileobj, chunk_size=STREAM_CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """Read another chunk into the buffer. Returns False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.fileobj.read(self.chunk_size)
+        if isinstance(chunk, bytes):
+            text = self.utf8.decode(chunk, final=not chunk)
+        else:
+            text = chunk
+        if not chunk:
+            self.eof = True
+        # Drop consumed input before growing the buffer
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return bool(chunk) or bool(text)
+
+    def _peek(self):
+        """Skip whitespace and return the next character ('' at end of file)."""
+        # Fast path for compact JSON
+        if self.pos < len(self.buf):
+            char = self.buf[self.pos]
+            if char not in ' \t\n\r':
+                return char
+        while True:
+            self.pos = self._WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' in schema at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # Most likely the value continues past the buffer
+                if self._fill():
                     continue
+                raise
+            # A number may continue in the next chunk: '3.' of '3.5e10' decodes
+            # as 3, so refill unless a delimiter follows it
+            if (not self.eof and self.buf[self.pos] in self._NUMBER_START
+                    and (end == len(self.buf) or self.buf[end] in self._NUMBER_CHARS) and self._fill()):
+                continue
+            self.pos = end
+            return value
+
+    def keys(self):
+        """Iterate the keys of the next object; the caller must consume each value."""
+        self._expect('{')
+        first = True
+        while True:
+            char = self._peek()
+            if char == '}':
+                self.pos += 1
+                return
+            if not first:
+                self._expect(',')
+            first = False
+            key = self.value()
+            self._expect(':')
+            yield key
+
+    def items(self):
+        """Iterate the elements of the next array; the caller must consume each element."""
+        self._expect('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            char = self._peek()
+            self.pos += 1
+            if char == ']':
+                return
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' in schema at offset {self.pos - 1}")
+
+    def iter_schema_items(self):
+        """Yield (kind, value) for the schema name, rules, merges and constant entries."""
+        for key in self.keys():
+            if key != 'schema' or self._peek() != '{':
+                self.value()
+                continue
 
-                group_name = group.get('name', '')
-                group_val = group.get('val', '')
+            for schema_key in self.keys():
+                if schema_key == 'name':
+                    yield 'name', self.value()
+                elif schema_key in ('rules', 'merges') and self._peek() == '[':
+                    kind = schema_key[:-1]
+                    for _ in self.items():
+                        yield kind, self.value()
+                elif schema_key == 'constants' and self._peek() == '[':
+                    for _ in self.items():
+                        yield from self._iter_constant()
+                else:
+                    self.value()
+
+    def _iter_constant(self):
+        if self._peek() != '{':
+            self.value()
+            return
+
+        const_type = None
+        pending = []  # list entries seen before the constant's type
+        for key in self.keys():
+            if key == 'type':
+                const_type = self.value()
+                for item in pending:
+                    yield 'constant', (const_type, item)
+                pending = []
+            elif key == 'list' and self._peek() == '[':
+                for _ in self.items():
+                    item = self.value()
+                    if const_type is None:
+                        pending.append(item)
+                    else:
+                        yield 'constant', (const_type, item)
+            else:
+                self.value()
 
-                output_lines.append("-" * 76)
-                output_lines.append("")
-                output_lines.append(f"Group:  {group_name}")
-                output_lines.append("")
-                output_lines.append(f"Filter: {readable_asset}")
-                output_lines.append(f"        WHERE tag {tag_field} = '{group_val}'")
+        for item in pending:
+            yield 'constant', (const_type, item)
 
-                # If this group has others merged into it, add OR conditions
-                if group_ref_id in merge_targets:
-                    for merged_ref_id in merge_targets[group_ref_id]:
-                        merged_group = dynamic_groups.get(merged_ref_id)
-                        if merged_group:
-                            merged_val = merged_group.get('val', '')
-                            output_lines.append(f"        OR tag {tag_field} = '{merged_val}'")
 
-                output_lines.append("")  # Empty line after each group
+def _iter_schema_items_ijson(fileobj, ijson):
+    """ijson-based equivalent of _SchemaStreamReader.iter_schema_items()."""
+    try:
+        yield from _iter_ijson_events(fileobj, ijson)
+    except ijson.JSONError as e:
+        # Report malformed input as ValueError like every other JSON backend
+        raise ValueError(f"Invalid JSON in schema: {e}") from e
+
+
+def _iter_ijson_events(fileobj, ijson):
+    builder = None
+    depth = 0
+    kind = None
+    const_type = None
+    pending = []  # constant list entries seen before the constant's type
+
+    def emit(kind, item):
+        if kind != 'constant':
+            return [(kind, item)]
+        if const_type is None:
+            pending.append(item)
+            return []
+        return [('constant', (const_type, item))]
+
+    # use_float: non-integer numbers as float, as json.loads gives, not Decimal
+    for prefix, event, value in ijson.parse(fileobj, use_float=True):
+        if builder is not None:
+            builder.event(event, value)
+            if event in ('start_map', 'start_array'):
+                depth += 1
+            elif event in ('end_map', 'end_array'):
+                depth -= 1
+                if depth == 0:
+                    yield from emit(kind, builder.value)
+                    builder = None
+            continue
+
+        if prefix in _STREAM_ITEM_PREFIXES:
+            kind = _STREAM_ITEM_PREFIXES[prefix]
+            if event in ('start_map', 'start_array'):
+                builder = ijson.ObjectBuilder()
+                builder.event(event, value)
+                depth = 1
+            elif event not in ('end_map', 'end_array', 'map_key'):
+                yield from emit(kind, value)
+        elif prefix == 'schema.name' and event not in ('start_map', 'start_array', 'map_key'):
+            yield 'name', value
+        elif prefix == 'schema.constants.item':
+            if event == 'start_map':
+                const_type = None
+                pending = []
+            elif event == 'end_map':
+                for item in pending:
+                    yield 'constant', (const_type, item)
+                pending = []
+        elif prefix == 'schema.constants.item.type':
+            const_type = value
+            for item in pending:
+                yield 'constant', (const_type, item)
+            pending = []
+
+
+STREAM_PARSERS = ('auto', 'python', 'ijson')
+
+
+def iter_schema_items(fileobj, parser='auto'):
+    """
+    Stream (kind, value) pairs from a schema file without loading it whole.
+
+    kind is 'name', 'rule', 'merge' or 'constant' (value is then a
+    (constant type, list entry) pair). parser is 'python', 'ijson' or
+    'auto'. 'auto' uses the pure-Python reader: it decodes whole items with
+    the C json scanner and is faster than building them from ijson events.
+    """
+    if parser == 'ijson':
+        try:
+            import ijson
+        except ImportError:
+            raise ValueError("Streaming parser 'ijson' is not installed")
+        return _iter_schema_items_ijson(fileobj, ijson)
+    if parser not in ('auto', 'python'):
+        raise ValueError(f"Unknown streaming parser '{parser}'")
+    return _SchemaStreamReader(fileobj).iter_schema_items()
+
+
+def compile_perspective_stream(fileobj, parser='auto'):
+    """
+    Compile a schema file object into a Perspective while streaming it.
+
+    Peak memory grows with the compiled perspective rather than with the
+    size of the JSON document.
+    """
+    compiler = PerspectiveCompiler()
+    for kind, value in iter_schema_items(fileobj, parser):
+        if kind == 'rule':
+            compiler.add_rule(value)
+        elif kind == 'constant':
+            if value[0] in PerspectiveCompiler.CONSTANT_TYPES:
+                compiler.add_constant(*value)
+        elif kind == 'merge':
+            compiler.add_merge(value)
+        else:
+            compiler.set_name(value)
+    return compiler.finish()
+
+
+# Compressed schema formats read transparently: (leading magic bytes, opener)
+COMPRESSED_FORMATS = (
+    (b'\x1f\x8b', lambda f: gzip.GzipFile(fileobj=f, mode='rb')),
+    (b'BZh', bz2.BZ2File),
+    (b'\xfd7zXZ\x00', lzma.LZMAFile),
+)
+
+# File name extensions of compressed schema files
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz')
+
+# Errors raised while reading a truncated or corrupt compressed file
+# (gzip and bz2 also raise OSError)
+DECOMPRESSION_ERRORS = (EOFError, lzma.LZMAError)
+
+# JSON backends that decode straight from a memoryview of a mapped file
+_BUFFER_JSON_BACKENDS = ('orjson',)
+
+
+@contextlib.contextmanager
+def open_schema_file(path):
+    """
+    Open a schema file for binary reads.
+
+    gzip, bz2 and xz files are decompressed on the fly (detected by their
+    magic bytes, not the file name). Uncompressed files are memory-mapped.
+    Either way the result supports read(n), so it can be handed straight
+    to compile_perspective_stream().
+    """
+    with open(path, 'rb') as f:
+        # peek() does not consume input, so pipes work too
+        magic = f.peek(6)[:6]
+        for prefix, opener in COMPRESSED_FORMATS:
+            if magic.startswith(prefix):
+                with opener(f) as stream:
+                    yield stream
+                return
+
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files, pipes and special files cannot be mapped
+            yield f
+            return
+        with mapped:
+            yield mapped
+
+
+def decode_schema_file(f):
+    """Decode a file object from open_schema_file() with the active JSON backend."""
+    if isinstance(f, mmap.mmap) and _json_backend[0] in _BUFFER_JSON_BACKENDS:
+        # Decode from the mapped pages without copying them into a bytes object
+        with memoryview(f) as view:
+            return json_loads(view)
+    return json_loads(f.read())
+
+
+def load_schema_file(path):
+    """Read and decode a (possibly compressed) schema file."""
+    with open_schema_file(path) as f:
+        return decode_schema_file(f)
 
-    # Process static groups
-    if static_groups:
-        output_lines.append("Static Groups:\n")
 
-        for ref_id, group in static_groups.items():
-            group_name = group.get('name', '')
-            is_other = group.get('is_other') == 'true'
+def schema_file_stem(path):
+    """File name without directory, compression and .json extensions."""
+    name = os.path.basename(path)
+    base, ext = os.path.splitext(name)
+    if ext.lower() in COMPRESSED_EXTENSIONS:
+        name = base
+    return os.path.splitext(name)[0]
 
-            output_lines.append("-" * 76)
-            output_lines.append("")
-            output_lines.append(f"Group:  {group_name}")
+
+def iter_categorize_lines(perspective):
+    """Yield output lines for the categorize rules (dynamic group blocks)."""
+    dynamic_groups = perspective.dynamic_groups
+
+    # Process categorize rules (dynamic groups)
+    for block in perspective.blocks:
+        readable_asset = camel_to_readable(block.asset)
+        tag_field = block.tag_field
+
+        # Show group block header
+        yield f"Group Block: {block.name}\n"
+
+        # Output each group
+        for group in block.groups:
+            # Skip groups that are merged into others
+            if group.is_merged:
+                continue
+
+            yield "-" * 76
+            yield ""
+            yield f"Group:  {group.name}"
+            yield ""
+            yield f"Filter: {readable_asset}"
+            yield f"        WHERE tag {tag_field} = '{group.val}'"
+
+            # If this group has others merged into it, add OR conditions
+            for merged_ref_id in group.merged_from:
+                yield f"        OR tag {tag_field} = '{dynamic_groups[merged_ref_id].val}'"
+
+            yield ""  # Empty line after each group
+
+
+def iter_static_lines(perspective):
+    """Yield output lines for the static groups and their filter rules."""
+    # Process static groups
+    if perspective.static_groups:
+        yield "Static Groups:\n"
+
+        for group in perspective.static_groups:
+            yield "-" * 76
+            yield ""
+            yield f"Group:  {group.name}"
 
             # Special handling for "Other" group
-            if is_other:
-                output_lines.append("")
-                output_lines.append("Note: Catches all assets not matched by other groups")
-                output_lines.append("")
+            if group.is_other:
+                yield ""
+                yield "Note: Catches all assets not matched by other groups"
+                yield ""
                 continue
 
-            # Get all filter rules for this static group
-            filters = static_group_filters.get(ref_id, [])
-
-            if filters:
-                # Group filters by asset type to organize output
-                filters_by_asset = {}
-                for filter_info in filters:
-                    asset = filter_info['asset']
-                    if asset not in filters_by_asset:
-                        filters_by_asset[asset] = []
-                    filters_by_asset[asset].append(filter_info['clauses'])
-
-                # Output each asset type's filters
-                first_filter_for_asset = True
-                for asset_type, clause_groups in filters_by_asset.items():
+            if group.rules:
+                # Output each asset type's filters (rules are grouped by asset)
+                for asset_type, asset_rules in itertools.groupby(group.rules, key=attrgetter('asset')):
                     readable_asset = camel_to_readable(asset_type)
-                    output_lines.append("")
-                    output_lines.append(f"Filter: {readable_asset}")
+                    yield ""
+                    yield f"Filter: {readable_asset}"
 
-                    # Each clause_group represents one filter rule
-                    # Multiple clause_groups are OR'd together
-                    for group_idx, clauses in enumerate(clause_groups):
+                    # Each rule's clauses are AND'd; multiple rules are OR'd together
+                    for rule_idx, rule in enumerate(asset_rules):
+                        clauses = rule.clauses
                         if not clauses:
                             continue
 
                         # Within a clause group, conditions are AND'd
-                        if group_idx == 0:
+                        if rule_idx == 0:
                             # First rule for this asset type
                             for clause_idx, clause in enumerate(clauses):
-                                condition_str = format_condition_clause(clause)
+                                condition_str = format_clause(clause)
                                 if clause_idx == 0:
-                                    output_lines.append(f"        WHERE {condition_str}")
+                                    yield f"        WHERE {condition_str}"
                                 else:
-                                    output_lines.append(f"        AND {condition_str}")
+                                    yield f"        AND {condition_str}"
                         else:
                             # Subsequent rules - OR'd with previous rules
                             # If multiple clauses in this rule, wrap them logically
                             if len(clauses) == 1:
-                                condition_str = format_condition_clause(clauses[0])
-                                output_lines.append(f"        OR {condition_str}")
+                                condition_str = format_clause(clauses[0])
+                                yield f"        OR {condition_str}"
                             else:
                                 # Multiple clauses AND'd together, but OR'd with previous rules
                                 for clause_idx, clause in enumerate(clauses):
-                                    condition_str = format_condition_clause(clause)
+                                    condition_str = format_clause(clause)
                                     if clause_idx == 0:
-                                        output_lines.append(f"        OR ({condition_str}")
+                                        yield f"        OR ({condition_str}"
                                     elif clause_idx == len(clauses) - 1:
-                                        output_lines.append(f"            AND {condition_str})")
+                                        yield f"            AND {condition_str})"
                                     else:
-                                        output_lines.append(f"            AND {condition_str}")
+                                        yield f"            AND {condition_str}"
             else:
                 # Empty group - no filter rules
-                output_lines.append("")
-                output_lines.append("        EMPTY GROUP")
+                yield ""
+                yield "        EMPTY GROUP"
 
-            output_lines.append("")  # Empty line after each group
+            yield ""  # Empty line after each group
 
-    output_lines.append("Done")
 
-    return '\n'.join(output_lines)
+def iter_perspective_lines(schema_data):
+    """
+    Yield human-readable output lines for a perspective.
 
+    schema_data may be a schema dict or an already compiled Perspective.
+    """
+    if isinstance(schema_data, Perspective):
+        perspective = schema_data
+    else:
+        with profile_stage('index'):
+            perspective = compile_perspective(schema_data)
 
-def fetch_perspective_from_api(api_key, perspective_id):
-    """Fetch perspective schema from CloudHealth API."""
-    url = f"https://chapi.cloudhealthtech.com/v1/perspective_schemas/{perspective_id}"
+    # Perspective name
+    yield f"Perspective: {perspective.name}\n"
+
+    yield from profile_iter('categorize', iter_categorize_lines(perspective))
+    yield from profile_iter('static', iter_static_lines(perspective))
+
+    yield "Done"
+
+
+def parse_perspective_schema(schema_data):
+    """Parse the perspective schema and generate human-readable output."""
+    return '\n'.join(iter_perspective_lines(schema_data))
+
+
+def write_perspective_lines(lines, stream):
+    """Write output lines to a stream as they are produced, newline-separated."""
+    first = True
+    for line in lines:
+        if not first:
+            stream.write('\n')
+        stream.write(line)
+        first = False
+
+
+def collect_batch_files(pattern):
+    """Return the sorted list of schema files for a directory or glob pattern."""
+    if os.path.isdir(pattern):
+        patterns = [os.path.join(pattern, '*.json' + ext) for ext in ('',) + COMPRESSED_EXTENSIONS]
+    else:
+        patterns = [pattern]
+    return sorted(
+        path for pattern in patterns for path in glob.glob(pattern) if os.path.isfile(path)
+    )
+
+
+def batch_output_paths(input_files, out_dir):
+    """
+    Return the output path in out_dir of each schema file: its name without
+    compression and .json extensions, plus .txt, under its directory
+    relative to the inputs' common directory (so inputs from one directory
+    are written straight to out_dir).
+
+    Raises ValueError if several inputs map to the same output path.
+    """
+    if not input_files:
+        return []
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in input_files])
+    output_paths = []
+    inputs_by_output = {}
+    for path in input_files:
+        relative_dir = os.path.relpath(os.path.dirname(os.path.abspath(path)), base)
+        output_path = os.path.normpath(os.path.join(out_dir, relative_dir, schema_file_stem(path) + '.txt'))
+        inputs_by_output.setdefault(output_path, []).append(path)
+        output_paths.append(output_path)
+
+    clashes = [(output_path, paths) for output_path, paths in inputs_by_output.items() if len(paths) > 1]
+    if clashes:
+        raise ValueError('several schema files map to the same output file: ' + '; '.join(
+            f"{', '.join(paths)} -> {output_path}" for output_path, paths in clashes))
+    return output_paths
+
+
+def _compile_schema_file(input_path, stream_parser=None):
+    """Decode (or stream) and compile a schema file into a Perspective."""
+    with open_schema_file(input_path) as f:
+        if stream_parser:
+            with profile_stage('stream'):
+                return compile_perspective_stream(f, stream_parser)
+        with profile_stage('decode'):
+            schema_data = decode_schema_file(f)
+    with profile_stage('index'):
+        return compile_perspective(schema_data)
+
+
+def load_perspective(input_path, stream_parser=None, cache=None):
+    """
+    Compile a schema file into a Perspective.
+
+    With a CompiledPerspectiveCache, an unchanged file is loaded from the
+    cache instead of being decoded and compiled again.
+    """
+    key = None
+    if cache is not None and os.path.isfile(input_path):
+        with profile_stage('hash'):
+            key = cache.file_key(input_path)
+        with profile_stage('cache'):
+            perspective = cache.load(key)
+        if perspective is not None:
+            return perspective
+
+    perspective = _compile_schema_file(input_path, stream_parser)
+    if key is not None:
+        with profile_stage('cache'):
+            cache.store(key, perspective)
+    return perspective
+
+
+@contextlib.contextmanager
+def open_output(output_path, binary=False):
+    """Open output_path for writing, or yield stdout (left open) if it is None."""
+    if output_path:
+        with open(output_path, 'wb' if binary else 'w', buffering=OUTPUT_BUFFER_SIZE) as f:
+            yield f
+    elif binary:
+        sys.stdout.flush()
+        yield sys.stdout.buffer
+        sys.stdout.buffer.flush()
+    else:
+        yield sys.stdout
+
+
+def _copy_output(rendered, output_path):
+    """Copy an open binary rendered-output file to output_path (stdout if None)."""
+    with rendered, open_output(output_path, binary=True) as f:
+        shutil.copyfileobj(rendered, f, OUTPUT_BUFFER_SIZE)
+
+
+def render_schema_file(input_path, output_path=None, stream_parser=None, cache=None, cache_output=True):
+    """
+    Render one schema file to output_path (stdout if None). Returns the input size in bytes.
+
+    With stream_parser set the schema is streamed into the compiler (see
+    compile_perspective_stream()) instead of being decoded whole. With a
+    CompiledPerspectiveCache, an unchanged file is served from its cached
+    rendered output (if cache_output) or compiled perspective.
+    """
+    key = None
+    perspective = None
+
+    # Only regular files can be hashed without consuming them
+    if cache is not None and os.path.isfile(input_path):
+        with profile_stage('hash'):
+            key = cache.file_key(input_path)
+        rendered = cache.open_rendered(key) if cache_output else None
+        if rendered is not None:
+            with profile_stage('write'):
+                _copy_output(rendered, output_path)
+            return os.path.getsize(input_path)
+        with profile_stage('cache'):
+            perspective = cache.load(key)
+
+    if perspective is None:
+        perspective = _compile_schema_file(input_path, stream_parser)
+        if key is not None:
+            with profile_stage('cache'):
+                cache.store(key, perspective)
+
+    lines = iter_perspective_lines(perspective)
+    with profile_stage('write'), open_output(output_path) as f:
+        if key is not None and cache_output:
+            # Stream to the destination and the cache in one pass
+            with cache.tee_rendered(key, f) as tee:
+                write_perspective_lines(lines, tee)
+        else:
+            write_perspective_lines(lines, f)
+
+    return os.path.getsize(input_path)
+
+
+# Compiled caches opened by this batch worker process, by (cache_dir, max_bytes)
+_batch_caches = {}
+
+
+def _render_batch_item(input_path, output_path, json_backend='auto', stream_parser=None,
+                       cache_options=None):
+    """
+    Process pool worker: render one file and report errors instead of raising.
+
+    cache_options is (cache_dir, max_bytes, cache_output) to use a
+    CompiledPerspectiveCache, or None.
+    """
+    try:
+        set_json_backend(json_backend)
+        cache = None
+        cache_output = False
+        if cache_options is not None:
+            cache_dir, max_bytes, cache_output = cache_options
+            if (cache_dir, max_bytes) not in _batch_caches:
+                _batch_caches[cache_dir, max_bytes] = open_cache(CompiledPerspectiveCache, cache_dir, max_bytes)
+            cache = _batch_caches[cache_dir, max_bytes]
+        size = render_schema_file(input_path, output_path, stream_parser, cache, cache_output)
+        return input_path, size, None
+    except (OSError, ValueError, AttributeError, KeyError, TypeError) + DECOMPRESSION_ERRORS as e:
+        return input_path, 0, f"{type(e).__name__}: {e}"
+
+
+def run_batch(pattern, out_dir, jobs=None, stream_parser=None, cache_options=None):
+    """
+    Render every schema matching pattern into out_dir. Returns an exit code.
+
+    cache_options is passed to each worker; see _render_batch_item().
+    """
+    input_files = collect_batch_files(pattern)
+    if not input_files:
+        print(f"Error: No schema files match '{pattern}'", file=sys.stderr)
+        return 1
+
+    try:
+        output_paths = batch_output_paths(input_files, out_dir)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    for output_dir in sorted(set(map(os.path.dirname, output_paths))):
+        os.makedirs(output_dir, exist_ok=True)
+
+    failures = []
+    total_bytes = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        for input_path, output_path in zip(input_files, output_paths):
+            futures.append(executor.submit(
+                _render_batch_item, input_path, output_path, json_backend_name(),
+                stream_parser, cache_options
+            ))
+
+        for future in as_completed(futures):
+            input_path, size, error = future.result()
+            if error:
+                failures.append((input_path, error))
+            else:
+                total_bytes += size
+
+    elapsed = time.perf_counter() - start
+    rendered = len(input_files) - len(failures)
+    rate = rendered / elapsed if elapsed > 0 else 0.0
+    mb_rate = total_bytes / (1024 * 1024) / elapsed if elapsed > 0 else 0.0
+
+    print(f"Rendered {rendered}/{len(input_files)} schemas to {out_dir} "
+          f"in {elapsed:.2f}s ({rate:.1f} schemas/sec, {mb_rate:.2f} MB/sec)")
+
+    if failures:
+        print(f"{len(failures)} schema(s) failed:", file=sys.stderr)
+        for input_path, error in sorted(failures):
+            print(f"  {input_path}: {error}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+class _DiskLRUCache:
+    """
+    Directory of cache files bounded to max_bytes.
+
+    Files ending in one of SUFFIXES are tracked by last use, and the least
+    recently used are evicted first. Entries are written atomically, so
+    concurrent processes sharing the directory never see partial files.
+    Creating a cache raises OSError if cache_dir cannot be used (see
+    open_cache()); a failed write only skips that entry, with a warning.
+    """
+
+    SUFFIXES = ()
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self.write_errors = 0
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> (last used, size)
+
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.endswith(self.SUFFIXES):
+                path = os.path.join(cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:  # Evicted by another process meanwhile
+                    continue
+                self._entries[path] = (stat.st_mtime, stat.st_size)
+
+    def __getstate__(self):
+        # Locks cannot be pickled; a copy sent to a spawned process gets its own
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _temp_path(path):
+        return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+    def _commit(self, tmp_path, path):
+        """Move a fully written temporary file into place and account for it."""
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._entries[path] = (time.time(), os.path.getsize(path))
+            self._evict(keep=path)
+
+    @contextlib.contextmanager
+    def _write_atomic(self, path, mode='wb'):
+        """Yield a temporary file that replaces path (and is accounted for) on success."""
+        tmp_path = self._temp_path(path)
+        try:
+            with open(tmp_path, mode) as f:
+                yield f
+            self._commit(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+
+    def _write_failed(self, error):
+        """Report a failed cache write (once per cache); the caller carries on without the entry."""
+        with self._lock:
+            self.write_errors += 1
+            if self.write_errors > 1:
+                return
+        print(f"Warning: Could not write to cache '{self.cache_dir}', continuing without it: {error}",
+              file=sys.stderr)
+
+    def _touch(self, path):
+        """Mark an entry as recently used."""
+        try:
+            os.utime(path)
+        except OSError:
+            return
+        with self._lock:
+            if path in self._entries:
+                self._entries[path] = (time.time(), self._entries[path][1])
+
+    def _discard(self, path):
+        """Remove an unusable entry."""
+        with contextlib.suppress(OSError):
+            os.remove(path)
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def _evict(self, keep=None):
+        """Evict least recently used entries until under max_bytes, sparing keep."""
+        total = sum(size for _, size in self._entries.values())
+        if total <= self.max_bytes:
+            return
+        for path, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            del self._entries[path]
+            total -= size
+            self.evictions += 1
+
+
+class HTTPSchemaCache(_DiskLRUCache):
+    """
+    On-disk cache of perspective schema responses keyed by (endpoint, perspective ID).
+
+    Each entry stores the raw response body with its ETag/Last-Modified
+    validators. Entries younger than ttl seconds are served without a
+    request; older entries are revalidated with a conditional request.
+    The cache is bounded to max_bytes by evicting least recently used
+    entries.
+    """
+
+    SUFFIXES = ('.cache',)
+
+    def __init__(self, cache_dir, ttl=DEFAULT_HTTP_CACHE_TTL, max_bytes=DEFAULT_HTTP_CACHE_MAX_MB * 1024 * 1024):
+        super().__init__(cache_dir, max_bytes)
+        self.ttl = ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def _path(self, endpoint, perspective_id):
+        key = hashlib.sha256(f"{endpoint}\n{perspective_id}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.cache")
+
+    def load(self, endpoint, perspective_id):
+        """Return (meta, body) for a cached entry, or (None, None)."""
+        path = self._path(endpoint, perspective_id)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def is_fresh(self, meta):
+        """Whether a cached entry may be served without revalidation."""
+        return time.time() - meta.get('validated_at', 0) < self.ttl
+
+    def conditional_headers(self, meta):
+        """Build If-None-Match / If-Modified-Since headers from cached validators."""
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def store(self, endpoint, perspective_id, body, etag=None, last_modified=None):
+        """Write an entry atomically and evict old entries if over the size bound."""
+        path = self._path(endpoint, perspective_id)
+        meta = {
+            'endpoint': endpoint,
+            'perspective_id': perspective_id,
+            'etag': etag,
+            'last_modified': last_modified,
+            'validated_at': time.time(),
+        }
+        try:
+            with self._write_atomic(path) as f:
+                f.write(json.dumps(meta).encode('utf-8'))
+                f.write(b'\n')
+                f.write(body)
+        except OSError as e:
+            self._write_failed(e)
+
+    def touch(self, endpoint, perspective_id):
+        """Mark an entry as recently used."""
+        self._touch(self._path(endpoint, perspective_id))
+
+    def discard(self, endpoint, perspective_id):
+        """Remove an entry whose body turned out to be unusable."""
+        self._discard(self._path(endpoint, perspective_id))
+
+    def record(self, outcome):
+        """Count a lookup outcome: 'hit', 'revalidated' or 'miss'."""
+        with self._lock:
+            if outcome == 'hit':
+                self.hits += 1
+            elif outcome == 'revalidated':
+                self.revalidated += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """Return a one-line summary of cache counters."""
+        return (f"HTTP cache: {self.hits} hits, {self.revalidated} revalidated (304), "
+                f"{self.misses} misses, {self.evictions} evictions")
+
+
+class _PerspectiveUnpickler(pickle.Unpickler):
+    """
+    Unpickler that only resolves the perspective IR classes.
+
+    Classes are looked up by name in this module, so entries written when
+    running as a script (__main__) load when imported, and vice versa.
+    """
+
+    CLASSES = {cls.__name__: cls for cls in (
+        Clause, FilterRule, FilterRoute, DynamicGroup, GroupBlock, StaticGroup, Perspective
+    )}
+
+    def find_class(self, module, name):
+        if name in self.CLASSES:
+            return self.CLASSES[name]
+        raise pickle.UnpicklingError(f"Unexpected class {module}.{name} in compiled cache entry")
+
+
+class _TeeStream:
+    """
+    Text stream that copies writes to a cache file. The first error
+    writing the cache file stops the copy and is kept in cache_error;
+    writes to the destination stream raise as usual.
+    """
+
+    def __init__(self, stream, cache_file):
+        self.stream = stream
+        self.cache_file = cache_file
+        self.cache_error = None
+
+    def write(self, text):
+        self.stream.write(text)
+        if self.cache_file is not None:
+            try:
+                self.cache_file.write(text)
+            except OSError as e:
+                self.cache_error = e
+                self.cache_file = None
+
+
+class CompiledPerspectiveCache(_DiskLRUCache):
+    """
+    On-disk cache of compiled perspectives keyed by a hash of the schema file bytes.
+
+    Each key can have a pickled (version, Perspective) entry and a rendered
+    output entry per output format. A repeat run over an unchanged file
+    can then skip decoding and compiling, or rendering altogether. Code
+    generated from a perspective (see classify_assets.py) is cached as
+    marshalled bytecode keyed by its source. The cache is bounded to
+    max_bytes by evicting least recently used entries.
+    """
+
+    SUFFIXES = ('.pickle', '.txt', '.code')
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_COMPILED_CACHE_MAX_MB * 1024 * 1024):
+        super().__init__(cache_dir, max_bytes)
+        self.rendered_hits = 0
+        self.compiled_hits = 0
+        self.misses = 0
+
+    def file_key(self, path):
+        """Hash the raw bytes of a schema file (compressed files are not decompressed)."""
+        digest = hashlib.sha256(f"perspective-v{COMPILED_CACHE_VERSION}\n".encode('utf-8'))
+        with open(path, 'rb') as f:
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            else:
+                with mapped:
+                    digest.update(mapped)
+        return digest.hexdigest()
+
+    def _compiled_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pickle")
+
+    def _rendered_path(self, key, output_format):
+        return os.path.join(self.cache_dir, f"{key}.{output_format}.txt")
+
+    def load(self, key):
+        """Return the cached Perspective for key, or None."""
+        path = self._compiled_path(key)
+        try:
+            with open(path, 'rb') as f:
+                version, perspective = _PerspectiveUnpickler(f).load()
+        except FileNotFoundError:
+            self._record('miss')
+            return None
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            # Truncated or foreign entry; drop it and compile again
+            self._discard(path)
+            self._record('miss')
+            return None
+
+        if version != COMPILED_CACHE_VERSION or not isinstance(perspective, Perspective):
+            self._discard(path)
+            self._record('miss')
+            return None
+
+        self._touch(path)
+        self._record('compiled')
+        return perspective
+
+    def store(self, key, perspective):
+        """Write a compiled perspective atomically."""
+        try:
+            with self._write_atomic(self._compiled_path(key)) as f:
+                pickle.dump((COMPILED_CACHE_VERSION, perspective), f, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            self._write_failed(e)
+
+    @contextlib.contextmanager
+    def tee_rendered(self, key, stream, output_format=OUTPUT_FORMAT):
+        """
+        Yield a text stream that writes to stream and to the cached rendered
+        output for key, stored once the block completes. If the cache cannot
+        be written, stream still gets every line.
+        """
+        path = self._rendered_path(key, output_format)
+        tmp_path = self._temp_path(path)
+        try:
+            cache_file = open(tmp_path, 'w', buffering=OUTPUT_BUFFER_SIZE)
+        except OSError as e:
+            self._write_failed(e)
+            yield stream
+            return
+
+        tee = _TeeStream(stream, cache_file)
+        try:
+            yield tee
+        except BaseException:
+            with contextlib.suppress(OSError):
+                cache_file.close()
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+
+        try:
+            cache_file.close()
+            if tee.cache_error is not None:
+                raise tee.cache_error
+            self._commit(tmp_path, path)
+        except OSError as e:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            self._write_failed(e)
+
+    def open_rendered(self, key, output_format=OUTPUT_FORMAT):
+        """Open cached rendered output for binary reading, or return None if not cached."""
+        path = self._rendered_path(key, output_format)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return None
+        self._touch(path)
+        self._record('rendered')
+        return f
+
+    def _code_path(self, source):
+        # Bytecode is only valid for the interpreter version that compiled it
+        digest = hashlib.sha256(importlib.util.MAGIC_NUMBER)
+        digest.update(source.encode('utf-8'))
+        return os.path.join(self.cache_dir, f"{digest.hexdigest()}.code")
+
+    def load_code(self, source):
+        """Return the cached code object compiled from source, or None."""
+        path = self._code_path(source)
+        try:
+            with open(path, 'rb') as f:
+                code = marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError, TypeError):
+            self._discard(path)
+            return None
+        self._touch(path)
+        return code
+
+    def store_code(self, source, code):
+        """Write the code object compiled from source atomically."""
+        try:
+            with self._write_atomic(self._code_path(source)) as f:
+                marshal.dump(code, f)
+        except OSError as e:
+            self._write_failed(e)
+
+    def _record(self, outcome):
+        with self._lock:
+            if outcome == 'rendered':
+                self.rendered_hits += 1
+            elif outcome == 'compiled':
+                self.compiled_hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """Return a one-line summary of cache counters."""
+        return (f"Compiled cache: {self.rendered_hits} rendered hits, {self.compiled_hits} compiled hits, "
+                f"{self.misses} misses, {self.evictions} evictions")
+
+
+class FetchScheduler:
+    """
+    Paces API requests with a token bucket and AIMD adaptive concurrency.
+
+    At most `concurrency` requests are in flight at once. Each successful
+    response raises the concurrency limit additively (by 1/limit, so about
+    one slot per window of successes) up to max_concurrency; each 429/503
+    halves it. An optional token bucket caps the request rate at
+    rate_limit requests/sec; it holds at least one token, so rates below
+    1/sec still let a request through. Throttled requests are retried
+    after the server's Retry-After delay, or a jittered exponential
+    backoff.
+    """
+
+    RETRY_STATUSES = (429, 503)
+
+    def __init__(self, max_concurrency=DEFAULT_FETCH_WORKERS, rate_limit=None,
+                 max_retries=DEFAULT_MAX_RETRIES):
+        self.max_concurrency = max_concurrency
+        self.concurrency = float(max_concurrency)
+        self.rate_limit = rate_limit
+        self.max_retries = max_retries
+        self.requests = 0
+        self.throttled = 0
+        self.retries = 0
+        self._in_flight = 0
+        self._capacity = max(1.0, float(rate_limit or 0))
+        self._tokens = self._capacity if rate_limit else 0.0
+        self._last_refill = time.monotonic()
+        self._started = None
+        self._condition = threading.Condition()
+
+    def _acquire_token(self):
+        """Block until the token bucket allows another request."""
+        if not self.rate_limit:
+            return
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                self._tokens = min(self._capacity,
+                                   self._tokens + (now - self._last_refill) * self.rate_limit)
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate_limit
+            time.sleep(wait)
+
+    def _acquire_slot(self):
+        with self._condition:
+            while self._in_flight >= int(self.concurrency):
+                self._condition.wait()
+            self._in_flight += 1
+            if self._started is None:
+                self._started = time.perf_counter()
+
+    def _release_slot(self, throttled):
+        with self._condition:
+            self._in_flight -= 1
+            self.requests += 1
+            if throttled:
+                self.throttled += 1
+                self.concurrency = max(1.0, self.concurrency / 2)
+            else:
+                self.concurrency = min(float(self.max_concurrency),
+                                       self.concurrency + 1 / self.concurrency)
+            self._condition.notify_all()
+
+    def backoff_delay(self, response, attempt):
+        """Seconds to wait before retrying a throttled response."""
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return min(BACKOFF_MAX_SECONDS, max(0.0, float(retry_after)))
+            except ValueError:
+                pass
+            # An HTTP date; a malformed one falls back to the jittered backoff
+            try:
+                retry_date = email.utils.parsedate_to_datetime(retry_after)
+            except (TypeError, ValueError):
+                retry_date = None
+            if retry_date is not None:
+                # '-0000' dates come back naive; HTTP dates are always UTC
+                if retry_date.tzinfo is None:
+                    retry_date = retry_date.replace(tzinfo=datetime.timezone.utc)
+                delay = retry_date.timestamp() - time.time()
+                return min(BACKOFF_MAX_SECONDS, max(0.0, delay))
+
+        # Full jitter: uniform between 0 and the exponential ceiling
+        ceiling = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def send(self, send_request):
+        """Call send_request() under the rate and concurrency limits, retrying throttled responses."""
+        for attempt in range(self.max_retries + 1):
+            self._acquire_token()
+            self._acquire_slot()
+            throttled = False
+            try:
+                response = send_request()
+                throttled = response.status_code in self.RETRY_STATUSES
+            finally:
+                self._release_slot(throttled)
+
+            if not throttled or attempt == self.max_retries:
+                return response
+
+            with self._condition:
+                self.retries += 1
+            time.sleep(self.backoff_delay(response, attempt))
+
+        return response
+
+    def requests_per_second(self):
+        """Achieved request rate since the first request."""
+        if self._started is None:
+            return 0.0
+        elapsed = time.perf_counter() - self._started
+        return self.requests / elapsed if elapsed > 0 else 0.0
+
+    def stats(self):
+        """Return a one-line summary of scheduler counters."""
+        return (f"API scheduler: {self.requests} requests at {self.requests_per_second():.1f} req/sec, "
+                f"{self.throttled} throttled, {self.retries} retries, "
+                f"concurrency {self.concurrency:.1f}/{self.max_concurrency}")
+
+
+class PerspectiveFetchError(Exception):
+    """Raised when a perspective schema cannot be fetched from the API."""
+
+
+def create_api_session(pool_size=DEFAULT_FETCH_WORKERS):
+    """Create a requests Session with a keep-alive connection pool of pool_size."""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _api_get(session, url, params, headers=None, scheduler=None):
+    """GET url through session, paced by scheduler when one is given."""
+    def send_request():
+        return session.get(url, params=params, headers=headers, timeout=30)
+
+    if scheduler is None:
+        return send_request()
+    return scheduler.send(send_request)
+
+
+def fetch_perspective(session, api_key, perspective_id, cache=None, scheduler=None, base_url=None):
+    """Fetch one perspective schema through session. Raises PerspectiveFetchError."""
+    base_url = (base_url or API_BASE_URL).rstrip('/')
+    url = f"{base_url}/v1/perspective_schemas/{perspective_id}"
     params = {'api_key': api_key}
+    headers = {}
+
+    meta, cached_body = (None, None)
+    if cache is not None:
+        meta, cached_body = cache.load(base_url, perspective_id)
+        if meta is not None and cache.is_fresh(meta):
+            try:
+                schema_data = json_loads(cached_body)
+            except ValueError:
+                # Truncated or corrupt entry: drop it and fetch from the API
+                cache.discard(base_url, perspective_id)
+                meta, cached_body = (None, None)
+            else:
+                cache.record('hit')
+                cache.touch(base_url, perspective_id)
+                return schema_data
+        if meta is not None:
+            headers = cache.conditional_headers(meta)
 
     try:
-        response = requests.get(url, params=params, timeout=30)
+        response = _api_get(session, url, params, headers, scheduler)
+
+        # Cached copy is still current, unless its body cannot be decoded;
+        # then drop it and fetch the schema unconditionally
+        if response.status_code == 304 and cached_body is not None:
+            try:
+                schema_data = json_loads(cached_body)
+            except ValueError:
+                cache.discard(base_url, perspective_id)
+                response = _api_get(session, url, params, {}, scheduler)
+            else:
+                cache.record('revalidated')
+                cache.store(base_url, perspective_id, cached_body,
+                            response.headers.get('ETag', meta.get('etag')),
+                            response.headers.get('Last-Modified', meta.get('last_modified')))
+                return schema_data
 
         # Handle specific HTTP errors with helpful messages
         if response.status_code == 401:
-            print("Error: Invalid API key. Please check your CloudHealth API key.", file=sys.stderr)
-            sys.exit(1)
+            raise PerspectiveFetchError("Invalid API key. Please check your CloudHealth API key.")
         elif response.status_code == 403:
-            print("Error: Permission denied. You may not have access to this Perspective.", file=sys.stderr)
-            sys.exit(1)
+            raise PerspectiveFetchError("Permission denied. You may not have access to this Perspective.")
         elif response.status_code == 404:
-            print(f"Error: Perspective ID '{perspective_id}' not found.", file=sys.stderr)
+            raise PerspectiveFetchError(f"Perspective ID '{perspective_id}' not found.")
+
+        response.raise_for_status()
+        schema_data = json_loads(response.content)
+
+        if cache is not None:
+            cache.record('miss')
+            cache.store(base_url, perspective_id, response.content,
+                        response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+        return schema_data
+    except requests.exceptions.RequestException as e:
+        raise PerspectiveFetchError(f"Request to API failed: {e}")
+    except ValueError as e:
+        raise PerspectiveFetchError(f"Invalid JSON response from API: {e}")
+
+
+def fetch_perspective_from_api(api_key, perspective_id, cache=None, scheduler=None, base_url=None):
+    """Fetch perspective schema from CloudHealth API."""
+    if scheduler is None:
+        scheduler = FetchScheduler(max_concurrency=1)
+
+    with create_api_session(pool_size=1) as session:
+        try:
+            return fetch_perspective(session, api_key, perspective_id, cache, scheduler, base_url)
+        except PerspectiveFetchError as e:
+            print(f"Error: {e}", file=sys.stderr)
             sys.exit(1)
 
+
+def list_perspective_ids(session, api_key, scheduler=None, base_url=None):
+    """List the IDs of all perspectives visible to api_key."""
+    base_url = (base_url or API_BASE_URL).rstrip('/')
+    url = f"{base_url}/v1/perspective_schemas"
+    params = {'api_key': api_key}
+
+    try:
+        response = _api_get(session, url, params, scheduler=scheduler)
+        if response.status_code == 401:
+            raise PerspectiveFetchError("Invalid API key. Please check your CloudHealth API key.")
         response.raise_for_status()
-        return response.json()
+        data = json_loads(response.content)
     except requests.exceptions.RequestException as e:
-        print(f"Error fetching from API: {e}", file=sys.stderr)
-        sys.exit(1)
-    except json.JSONDecodeError as e:
-        print(f"Error: Invalid JSON response from API: {e}", file=sys.stderr)
-        sys.exit(1)
+        raise PerspectiveFetchError(f"Listing perspectives failed: {e}")
+    except ValueError as e:
+        raise PerspectiveFetchError(f"Invalid JSON response from API: {e}")
+
+    # The API returns {"perspectives": {"<id>": {"name": ..., "active": ...}}}
+    perspectives = data.get('perspectives', {})
+    if isinstance(perspectives, dict):
+        return [str(perspective_id) for perspective_id in perspectives]
+    return [str(item.get('id')) for item in perspectives if item.get('id') is not None]
+
+
+def iter_perspectives_bulk(api_key, perspective_ids, workers=DEFAULT_FETCH_WORKERS, session=None, cache=None,
+                           scheduler=None, base_url=None):
+    """
+    Fetch many perspective schemas concurrently over one pooled session.
+
+    Yields (perspective ID, schema data, None) or (perspective ID, None,
+    error message) for each ID as its fetch completes, so each schema can
+    be handled while the others are still being fetched.
+    """
+    own_session = session is None
+    if own_session:
+        session = create_api_session(pool_size=workers)
+    if scheduler is None:
+        scheduler = FetchScheduler(max_concurrency=workers)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(fetch_perspective, session, api_key, perspective_id, cache, scheduler,
+                                base_url): perspective_id
+                for perspective_id in perspective_ids
+            }
+            for future in as_completed(futures):
+                perspective_id = futures[future]
+                try:
+                    schema_data = future.result()
+                except PerspectiveFetchError as e:
+                    yield perspective_id, None, str(e)
+                else:
+                    yield perspective_id, schema_data, None
+    finally:
+        if own_session:
+            session.close()
+
+
+def fetch_perspectives_bulk(api_key, perspective_ids, workers=DEFAULT_FETCH_WORKERS, session=None, cache=None,
+                            scheduler=None, base_url=None):
+    """
+    Fetch many perspective schemas concurrently over one pooled session.
+
+    Returns (schemas, errors): dicts keyed by perspective ID holding the
+    schema data or the error message for each ID.
+    """
+    schemas = {}
+    errors = {}
+    for perspective_id, schema_data, error in iter_perspectives_bulk(api_key, perspective_ids, workers, session,
+                                                                     cache, scheduler, base_url):
+        if error is None:
+            schemas[perspective_id] = schema_data
+        else:
+            errors[perspective_id] = error
+    return schemas, errors
+
+
+def _render_fetched_schema(schema_data, output_path):
+    """Compile a fetched schema and write its rendered lines to output_path; removes a partial file on error."""
+    with profile_stage('index'):
+        perspective = compile_perspective(schema_data)
+    try:
+        with profile_stage('write'), open(output_path, 'w', buffering=OUTPUT_BUFFER_SIZE) as f:
+            write_perspective_lines(iter_perspective_lines(perspective), f)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(output_path)
+        raise
+
+
+def run_bulk_fetch(api_key, perspective_ids, out_dir, workers=None, fetch_all=False, cache=None,
+                   scheduler=None, base_url=None):
+    """Fetch and render many perspectives into out_dir. Returns an exit code."""
+    workers = workers or DEFAULT_FETCH_WORKERS
+    if scheduler is None:
+        scheduler = FetchScheduler(max_concurrency=workers)
+
+    with create_api_session(pool_size=workers) as session:
+        if fetch_all:
+            try:
+                perspective_ids = list_perspective_ids(session, api_key, scheduler, base_url)
+            except PerspectiveFetchError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                return 1
+
+        os.makedirs(out_dir, exist_ok=True)
+        print(f"Fetching {len(perspective_ids)} perspective schemas from CloudHealth API...")
+        start = time.perf_counter()
+        # Each schema is rendered as soon as it arrives, while the rest are
+        # still being fetched; a schema that cannot be rendered only fails
+        # its own ID
+        rendered = 0
+        errors = {}
+        with profile_stage('fetch'):
+            for perspective_id, schema_data, error in iter_perspectives_bulk(
+                    api_key, perspective_ids, workers, session, cache, scheduler, base_url):
+                if error is None:
+                    try:
+                        _render_fetched_schema(schema_data, os.path.join(out_dir, f"{perspective_id}.txt"))
+                        rendered += 1
+                    except (OSError, ValueError, AttributeError, KeyError, TypeError) as e:
+                        error = f"Could not render schema: {type(e).__name__}: {e}"
+                if error is not None:
+                    errors[perspective_id] = error
+        elapsed = time.perf_counter() - start
+
+    print(f"Fetched {rendered}/{len(perspective_ids)} perspectives to {out_dir} in {elapsed:.2f}s "
+          f"({scheduler.requests_per_second():.1f} req/sec)")
+
+    if errors:
+        print(f"{len(errors)} perspective(s) failed:", file=sys.stderr)
+        for perspective_id, error in sorted(errors.items()):
+            print(f"  {perspective_id}: {error}", file=sys.stderr)
+        return 1
+
+    return 0
+
+
+def open_cache(cache_class, cache_dir, *args, **kwargs):
+    """Create a cache_class cache in cache_dir, or warn and return None if the directory cannot be used."""
+    try:
+        return cache_class(cache_dir, *args, **kwargs)
+    except OSError as e:
+        print(f"Warning: Could not use cache '{cache_dir}', continuing without it: {e}", file=sys.stderr)
+        return None
+
+
+def create_http_cache(args):
+    """Build the API schema cache from command-line options (None if disabled or unusable)."""
+    if args.no_cache:
+        return None
+    return open_cache(
+        HTTPSchemaCache,
+        os.path.join(args.cache_dir, 'http'),
+        ttl=args.cache_ttl,
+        max_bytes=int(args.cache_max_mb * 1024 * 1024)
+    )
+
+
+def create_compiled_cache(args):
+    """Build the compiled perspective cache from command-line options (None if disabled or unusable)."""
+    if args.no_cache:
+        return None
+    return open_cache(
+        CompiledPerspectiveCache,
+        os.path.join(args.cache_dir, 'compiled'),
+        max_bytes=int(args.compiled_cache_max_mb * 1024 * 1024)
+    )
+
+
+def positive_float(value):
+    """argparse type for a number greater than 0."""
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0: {value}")
+    return number
 
 
 def main():
@@ -314,46 +2178,248 @@ def main():
         default=None
     )
 
+    parser.add_argument(
+        '--api-base-url',
+        help=f'CloudHealth API base URL (default: {API_BASE_URL})',
+        default=API_BASE_URL
+    )
+    parser.add_argument(
+        '--perspective-ids',
+        help='Comma-separated list of Perspective IDs to fetch and render into --out-dir',
+        default=None
+    )
+    parser.add_argument(
+        '--all-perspectives',
+        action='store_true',
+        help='Fetch and render every perspective visible to the API key into --out-dir'
+    )
+    parser.add_argument(
+        '--rate-limit',
+        type=positive_float,
+        help='Maximum API requests per second (default: unlimited, adapt to 429 responses)',
+        default=None
+    )
+    parser.add_argument(
+        '--max-retries',
+        type=int,
+        help=f'Retries for throttled (429/503) API responses (default: {DEFAULT_MAX_RETRIES})',
+        default=DEFAULT_MAX_RETRIES
+    )
+    parser.add_argument(
+        '--batch',
+        metavar='DIR|GLOB',
+        help='Render every schema file in a directory or matching a glob pattern',
+        default=None
+    )
+    parser.add_argument(
+        '--out-dir',
+        help='Output directory for --batch and bulk fetches (one .txt file per schema)',
+        default=None
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        help=f'Number of parallel workers: processes for --batch (default: CPU count), '
+             f'threads for bulk fetches (default: {DEFAULT_FETCH_WORKERS})',
+        default=None
+    )
+
+    parser.add_argument(
+        '--cache-dir',
+        help=f'Root directory for on-disk caches (default: {DEFAULT_CACHE_DIR})',
+        default=DEFAULT_CACHE_DIR
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Disable on-disk caching'
+    )
+    parser.add_argument(
+        '--cache-ttl',
+        type=float,
+        help='Seconds a cached API schema is served without revalidation '
+             f'(default: {DEFAULT_HTTP_CACHE_TTL}, always revalidate)',
+        default=DEFAULT_HTTP_CACHE_TTL
+    )
+    parser.add_argument(
+        '--cache-max-mb',
+        type=float,
+        help=f'Maximum size of the API schema cache in MB (default: {DEFAULT_HTTP_CACHE_MAX_MB})',
+        default=DEFAULT_HTTP_CACHE_MAX_MB
+    )
+    parser.add_argument(
+        '--compiled-cache-max-mb',
+        type=float,
+        help='Maximum size of the compiled perspective and rendered output cache in MB '
+             f'(default: {DEFAULT_COMPILED_CACHE_MAX_MB})',
+        default=DEFAULT_COMPILED_CACHE_MAX_MB
+    )
+    parser.add_argument(
+        '--no-cache-output',
+        action='store_true',
+        help='Cache only compiled perspectives, not rendered output'
+    )
+    parser.add_argument(
+        '-v', '--verbose',
+        action='store_true',
+        help='Report API and cache statistics on stderr'
+    )
+
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Stream the input file into the compiler instead of loading it whole (bounded memory)'
+    )
+    parser.add_argument(
+        '--stream-parser',
+        choices=STREAM_PARSERS,
+        help='Parser for --stream (default: auto, the built-in reader)',
+        default='auto'
+    )
+    parser.add_argument(
+        '--json-backend',
+        choices=('auto',) + JSON_BACKENDS,
+        help='JSON decoder for schema files and API responses (default: auto, fastest installed)',
+        default='auto'
+    )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const='table',
+        choices=['table', 'json'],
+        help='Report per-stage timings and tracemalloc peaks on stderr as a table (default) or JSON',
+        default=None
+    )
+    parser.add_argument(
+        '--profile-no-memory',
+        action='store_true',
+        help='With --profile, skip tracemalloc (memory tracing slows allocation-heavy stages)'
+    )
+
     args = parser.parse_args()
 
-    # Determine if we're reading from file or API
+    if not args.profile:
+        run(parser, args)
+        return
+
+    with profiling(trace_memory=not args.profile_no_memory) as profiler:
+        try:
+            run(parser, args)
+        finally:
+            # Report even when run() exits early with sys.exit()
+            profiler.stop()
+            if args.profile == 'json':
+                print(json.dumps(profiler.report(), indent=2), file=sys.stderr)
+            else:
+                print(profiler.format_table(), file=sys.stderr)
+
+
+def run(parser, args):
+    """Run the command-line tool for parsed arguments."""
+    try:
+        set_json_backend(args.json_backend)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.jobs is not None and args.jobs < 1:
+        print("Error: --jobs must be at least 1", file=sys.stderr)
+        sys.exit(1)
+
+    # Batch mode renders many files across a process pool
+    if args.batch:
+        if not args.out_dir:
+            parser.error('--batch requires --out-dir')
+        with profile_stage('batch'):
+            cache_options = None
+            # Workers open the cache themselves; check here that it is usable
+            if create_compiled_cache(args) is not None:
+                cache_options = (os.path.join(args.cache_dir, 'compiled'),
+                                 int(args.compiled_cache_max_mb * 1024 * 1024), not args.no_cache_output)
+            exit_code = run_batch(args.batch, args.out_dir, args.jobs,
+                                  args.stream_parser if args.stream else None, cache_options)
+        sys.exit(exit_code)
+
+    # Bulk fetch renders many perspectives from the API
+    if args.perspective_ids or args.all_perspectives:
+        if not args.out_dir:
+            parser.error('--perspective-ids/--all-perspectives require --out-dir')
+
+        api_key = args.api_key or input("CloudHealth API Key: ")
+        perspective_ids = []
+        if args.perspective_ids:
+            perspective_ids = [pid.strip() for pid in args.perspective_ids.split(',') if pid.strip()]
+
+        http_cache = create_http_cache(args)
+        scheduler = FetchScheduler(max_concurrency=args.jobs or DEFAULT_FETCH_WORKERS,
+                                   rate_limit=args.rate_limit, max_retries=args.max_retries)
+        exit_code = run_bulk_fetch(api_key, perspective_ids, args.out_dir, args.jobs,
+                                   fetch_all=args.all_perspectives, cache=http_cache,
+                                   scheduler=scheduler, base_url=args.api_base_url)
+        if args.verbose:
+            print(scheduler.stats(), file=sys.stderr)
+            if http_cache is not None:
+                print(http_cache.stats(), file=sys.stderr)
+        sys.exit(exit_code)
+
+    # Render a local file (memory-mapped, or decompressed while reading)
     if args.input_file:
-        # Read from file
+        compiled_cache = create_compiled_cache(args)
         try:
-            with open(args.input_file, 'r') as f:
-                schema_data = json.load(f)
+            render_schema_file(args.input_file, args.output, args.stream_parser if args.stream else None,
+                               compiled_cache, cache_output=not args.no_cache_output)
         except FileNotFoundError:
             print(f"Error: File '{args.input_file}' not found", file=sys.stderr)
             sys.exit(1)
-        except json.JSONDecodeError as e:
+        except ValueError as e:
             print(f"Error: Invalid JSON in file: {e}", file=sys.stderr)
             sys.exit(1)
-    else:
-        # Fetch from API
-        api_key = args.api_key
-        perspective_id = args.perspective_id
-
-        # Prompt for API key if not provided
-        if not api_key:
-            api_key = input("CloudHealth API Key: ")
-
-        # Prompt for Perspective ID if not provided
-        if not perspective_id:
-            perspective_id = input("Perspective ID: ")
-
-        print("Fetching perspective schema from CloudHealth API...")
-        schema_data = fetch_perspective_from_api(api_key, perspective_id)
+        except (OSError,) + DECOMPRESSION_ERRORS as e:
+            print(f"Error: Could not read '{args.input_file}': {e}", file=sys.stderr)
+            sys.exit(1)
 
-    # Parse and generate output
-    output = parse_perspective_schema(schema_data)
+        if args.output:
+            print(f"Output written to {args.output}")
+        else:
+            sys.stdout.write('\n')
+        if args.verbose and compiled_cache is not None:
+            print(compiled_cache.stats(), file=sys.stderr)
+        return
+
+    # Fetch from API
+    api_key = args.api_key
+    perspective_id = args.perspective_id
+
+    # Prompt for API key if not provided
+    if not api_key:
+        api_key = input("CloudHealth API Key: ")
+
+    # Prompt for Perspective ID if not provided
+    if not perspective_id:
+        perspective_id = input("Perspective ID: ")
+
+    print("Fetching perspective schema from CloudHealth API...")
+    http_cache = create_http_cache(args)
+    scheduler = FetchScheduler(max_concurrency=1, rate_limit=args.rate_limit,
+                               max_retries=args.max_retries)
+    with profile_stage('fetch'):
+        schema_data = fetch_perspective_from_api(api_key, perspective_id, http_cache, scheduler,
+                                                 args.api_base_url)
+    if args.verbose:
+        print(scheduler.stats(), file=sys.stderr)
+        if http_cache is not None:
+            print(http_cache.stats(), file=sys.stderr)
+
+    # Parse and stream output to file or screen
+    lines = iter_perspective_lines(schema_data)
 
-    # Write to file or print to screen
     if args.output:
-        with open(args.output, 'w') as f:
-            f.write(output)
+        with profile_stage('write'), open(args.output, 'w', buffering=OUTPUT_BUFFER_SIZE) as f:
+            write_perspective_lines(lines, f)
         print(f"Output written to {args.output}")
     else:
-        print(output)
+        with profile_stage('write'):
+            write_perspective_lines(lines, sys.stdout)
+            sys.stdout.write('\n')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,440 @@
+import csv
+import io
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+
+import pytest
+
+import classify_assets
+import parse_perspective
+from classify_assets import Asset, PerspectiveClassifier
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(ROOT, 'examples')
+
+
+def _perspective(rules, static_groups=('Match',)):
+    """Compile a schema of filter rules into static groups 1.. plus an 'Other' group 99."""
+    constants = [{'ref_id': str(index), 'name': name} for index, name in enumerate(static_groups, 1)]
+    constants.append({'ref_id': '99', 'name': 'Other', 'is_other': 'true'})
+    return parse_perspective.compile_perspective({'schema': {
+        'name': 'test',
+        'rules': [
+            {'type': 'filter', 'asset': asset, 'to': to, 'condition': {'clauses': clauses}}
+            for asset, to, clauses in rules
+        ],
+        'merges': [],
+        'constants': [{'type': 'Static Group', 'list': constants}],
+    }})
+
+
+def _evaluators():
+    return [evaluator for evaluator in classify_assets.EVALUATORS
+            if evaluator != 'numpy' or classify_assets.np is not None]
+
+
+def _classify(perspective, assets, evaluator, contains_matcher='auto'):
+    classifier = PerspectiveClassifier(perspective, contains_matcher, evaluator)
+    return [classifier.group_label(group_id)[1]
+            for _, group_id in classify_assets.classify_assets(classifier, assets)]
+
+
+def _jsonl(*records):
+    return io.BytesIO(b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in records))
+
+
+@pytest.mark.parametrize('evaluator', _evaluators())
+def test_jsonl_scalar_values_are_classified_as_strings(evaluator):
+    perspective = _perspective([
+        ('AwsAccount', '1', [{'field': ['Account Name'], 'op': '=', 'val': '5'},
+                             {'tag_field': ['Managed'], 'op': '=', 'val': 'true'}]),
+    ])
+    assets = list(classify_assets.iter_jsonl_assets(_jsonl(
+        {'id': 'a', 'type': 'AwsAccount', 'fields': {'Account Name': 5}, 'tags': {'Managed': True}},
+        {'id': 'b', 'type': 'AwsAccount', 'fields': {'Account Name': 5.5}, 'tags': {'Managed': True}},
+        {'id': 'c', 'type': 'AwsAccount', 'fields': {'Account Name': '5'}, 'tags': {'Managed': None}},
+    )))
+    assert assets[0].fields == {'Account Name': '5'} and assets[0].tags == {'Managed': 'true'}
+    assert assets[2].tags == {}
+    assert _classify(perspective, assets, evaluator) == ['Match', 'Other', 'Other']
+
+
+@pytest.mark.parametrize('record, message', [
+    ({'type': 'AwsAccount', 'fields': {'Account Name': ['x']}}, "line 2: field 'Account Name' is list"),
+    ({'type': 'AwsAccount', 'tags': {'Owner': {'a': 1}}}, "line 2: tag 'Owner' is dict"),
+    ({'type': 'AwsAccount', 'fields': 'x'}, "line 2: 'fields' is not an object"),
+])
+def test_jsonl_rejects_values_that_are_not_scalars(record, message):
+    with pytest.raises(ValueError, match=message):
+        list(classify_assets.iter_jsonl_assets(_jsonl({'type': 'AwsAccount'}, record)))
+
+
+def _contains_matchers():
+    return [matcher for matcher in classify_assets.CONTAINS_MATCHERS
+            if matcher != 'ahocorasick' or classify_assets.ahocorasick is not None]
+
+
+@pytest.mark.parametrize('contains_matcher', _contains_matchers())
+@pytest.mark.parametrize('evaluator', _evaluators())
+def test_equal_clauses_are_not_matched_as_contains_patterns(evaluator, contains_matcher):
+    # The same field and value in '=', '!=' and 'Contains' clauses: only
+    # the Contains clause may be answered by the automaton
+    perspective = _perspective([
+        ('AwsAccount', '1', [{'field': ['Account Name'], 'op': '=', 'val': 'prod'}]),
+        ('AwsAccount', '2', [{'field': ['Account Name'], 'op': '!=', 'val': 'prod'},
+                             {'field': ['Account Name'], 'op': 'Contains', 'val': 'prod'}]),
+        ('AwsAccount', '3', [{'field': ['Account Name'], 'op': 'Contains', 'val': 'prod'}]),
+    ], static_groups=('Equal', 'Contains but not equal', 'Contains'))
+    assets = [Asset(name, 'AwsAccount', {'Account Name': name}, {})
+              for name in ('prod', 'production', 'preprod', 'dev')]
+    assert _classify(perspective, assets, evaluator, contains_matcher) == [
+        'Equal', 'Contains but not equal', 'Contains but not equal', 'Other']
+
+
+def _inventory(tmp_path, inventory_format, assets=2000, multiline_every=None):
+    """Write a generated inventory for examples/example4.json. Returns (schema data, path)."""
+    import generate_schema
+    with open(os.path.join(EXAMPLES, 'example4.json')) as f:
+        schema_data = json.load(f)
+    inventory = list(generate_schema.generate_inventory(schema_data, assets, seed=3))
+    if multiline_every:
+        for asset in inventory[multiline_every - 1::multiline_every]:
+            asset['id'] += '\nsecond line, "quoted"'
+    path = tmp_path / f"inventory.{inventory_format}"
+    with open(path, 'w', newline='') as f:
+        generate_schema.write_inventory(inventory, f, inventory_format)
+    return schema_data, str(path)
+
+
+def _single_process_output(classifier, path, inventory_format):
+    out = io.StringIO()
+    with open(path, 'rb') as f:
+        results = classify_assets.classify_assets(classifier, classify_assets.iter_inventory(f, inventory_format))
+        classify_assets.write_assignments(results, out, classifier)
+    return out.getvalue()
+
+
+@pytest.mark.skipif(classify_assets.shared_memory is None, reason='needs multiprocessing.shared_memory')
+def test_parallel_classification_under_spawn(tmp_path):
+    schema_data, path = _inventory(tmp_path, 'jsonl')
+    perspective = parse_perspective.compile_perspective(schema_data)
+    cache = parse_perspective.CompiledPerspectiveCache(str(tmp_path / 'compiled'))
+    classifier = PerspectiveClassifier(perspective, 'auto', 'compiled', cache)
+    output = tmp_path / 'parallel.csv'
+    classify_assets.classify_parallel(classifier, path, str(output), 3, 'jsonl', 'csv',
+                                      (perspective, 'auto', 'compiled', cache, None), start_method='spawn')
+    assert output.read_text() == _single_process_output(classifier, path, 'jsonl')
+
+
+def test_csv_with_multiline_values_is_classified_in_one_process(tmp_path):
+    (tmp_path / 'plain').mkdir()
+    _, path = _inventory(tmp_path, 'csv', multiline_every=250)
+    _, plain_path = _inventory(tmp_path / 'plain', 'csv')
+    assert classify_assets.csv_has_multiline_rows(path)
+    assert not classify_assets.csv_has_multiline_rows(plain_path)
+
+    output = tmp_path / 'out.csv'
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'classify_assets.py'), '--no-cache', '--jobs', '3',
+         os.path.join(EXAMPLES, 'example4.json'), path, '-o', str(output)],
+        capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert 'classifying with one process' in result.stderr
+    with open(output, newline='') as f:
+        assert len(list(csv.reader(f))) == 1 + 2000
+
+
+def test_unusable_cache_dir_warns_and_classifies(tmp_path):
+    _, path = _inventory(tmp_path, 'jsonl', assets=50)
+    (tmp_path / 'file').write_text('')
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'classify_assets.py'), os.path.join(EXAMPLES, 'example4.json'), path,
+         '-o', str(tmp_path / 'out.csv')],
+        capture_output=True, text=True, env=dict(os.environ, XDG_CACHE_HOME=str(tmp_path / 'file' / 'x')))
+
+    assert result.returncode == 0, result.stderr
+    assert 'Warning: Could not use cache' in result.stderr
+    assert (tmp_path / 'out.csv').read_text().count('\n') == 51
+
+
+@pytest.mark.parametrize('evaluator', _evaluators())
+def test_categorize_assigns_the_final_merged_group(evaluator):
+    groups = [('1', 'a'), ('2', 'b'), ('3', 'b'), ('4', 'c'), ('5', 'd')]
+    perspective = parse_perspective.compile_perspective({'schema': {
+        'name': 'Merged',
+        'rules': [{'type': 'categorize', 'asset': 'AwsAccount', 'tag_field': ['Env'], 'ref_id': '10',
+                   'name': 'Env', 'condition': {'clauses': []}}],
+        'merges': [{'type': 'Group', 'to': '4', 'from': ['1']}, {'type': 'Group', 'to': '5', 'from': ['4']}],
+        'constants': [
+            {'type': 'Dynamic Group', 'list': [
+                {'ref_id': ref_id, 'name': f"Env {val}", 'val': val, 'blk_id': '10'} for ref_id, val in groups]},
+            {'type': 'Static Group', 'list': [{'ref_id': '99', 'name': 'Other', 'is_other': 'true'}]},
+        ],
+    }})
+    assets = [Asset(str(index), 'AwsAccount', {}, {'Env': value} if value else {})
+              for index, value in enumerate(['a', 'b', 'c', 'd', 'e', None])]
+    # 'e' has no dynamic group yet, so it gets a new one named after the value
+    assert _classify(perspective, assets, evaluator) == ['Env d', 'Env b', 'Env d', 'Env d', 'e', 'Other']
+
+
+def _reference_groups(perspective, assets):
+    """First-match classification straight from the IR; new dynamic groups are reported as ('new', value)."""
+    other = [group.ref_id for group in perspective.static_groups if group.is_other]
+    results = []
+    for asset in assets:
+        for rule in perspective.rules:
+            clauses = rule.clauses if type(rule) is parse_perspective.GroupBlock else rule.rule.clauses
+            asset_type = rule.asset if type(rule) is parse_perspective.GroupBlock else rule.rule.asset
+            if asset_type != asset.type or not all(
+                    classify_assets.CLAUSE_TESTS[clause.op.lower()](
+                        (asset.tags if clause.is_tag else asset.fields).get(clause.field), clause.val)
+                    for clause in clauses):
+                continue
+            if type(rule) is not parse_perspective.GroupBlock:
+                results.append(perspective.final_group(rule.to))
+                break
+            value = asset.tags.get(rule.tag_field)
+            if value:
+                group = rule.index.get(value)
+                results.append(('new', value) if group is None else group)
+                break
+        else:
+            results.append(other[0] if other else None)
+    return results
+
+
+def _generated_schemas():
+    import generate_schema
+    with open(os.path.join(EXAMPLES, 'example4.json')) as f:
+        yield 'example4', json.load(f)
+    yield 'generated', generate_schema.generate_schema(blocks=2, groups_per_block=20, static_groups=8,
+                                                       clauses_per_filter=2, seed=5)
+    yield 'generated-no-other', generate_schema.generate_schema(blocks=1, groups_per_block=10, static_groups=4,
+                                                                include_other=False, seed=6)
+
+
+@pytest.mark.parametrize('evaluator', _evaluators())
+@pytest.mark.parametrize('name, schema_data', list(_generated_schemas()), ids=lambda value: str(value)[:20])
+def test_evaluators_agree_with_first_match_reference(name, schema_data, evaluator, monkeypatch):
+    import generate_schema
+    # Several batches for the 'numpy' evaluator
+    monkeypatch.setattr(classify_assets, 'NUMPY_BATCH_ASSETS', 700)
+    perspective = parse_perspective.compile_perspective(schema_data)
+    assets = [Asset(asset['id'], asset['type'], asset['fields'], asset['tags'])
+              for asset in generate_schema.generate_inventory(schema_data, 3000, seed=11)]
+
+    classifier = PerspectiveClassifier(perspective, 'auto', evaluator)
+    groups = [group_id for _, group_id in classify_assets.classify_assets(classifier, assets)]
+    ref_ids = perspective.ref_ids
+    groups = [('new', classifier.group_label(group_id)[1]) if group_id is not None and group_id >= len(ref_ids)
+              else group_id for group_id in groups]
+    assert groups == _reference_groups(perspective, assets)
+
+
+def test_compiled_classifier_reuses_cached_bytecode(tmp_path, monkeypatch):
+    schema_data, _ = _inventory(tmp_path, 'jsonl', assets=1)
+    perspective = parse_perspective.compile_perspective(schema_data)
+    cache = parse_perspective.CompiledPerspectiveCache(str(tmp_path / 'compiled'))
+    first = PerspectiveClassifier(perspective, 'auto', 'compiled', cache)
+    code_files = [name for name in os.listdir(cache.cache_dir) if name.endswith('.code')]
+    assert len(code_files) == len(first.sources)
+
+    def no_compile(*args):
+        raise AssertionError('compiled again')
+    monkeypatch.setattr(classify_assets, 'compile', no_compile, raising=False)
+    second = PerspectiveClassifier(perspective, 'auto', 'compiled', cache)
+    assert second.sources == first.sources
+
+
+@pytest.mark.parametrize('evaluator', [evaluator for evaluator in _evaluators() if evaluator in ('encoded', 'numpy')])
+def test_encoded_evaluator_encodes_each_distinct_value_once(evaluator):
+    perspective = _perspective([
+        ('AwsAccount', '1', [{'field': ['Account Name'], 'op': '=', 'val': 'prod'}]),
+        ('AwsAccount', '1', [{'tag_field': ['Env'], 'op': 'Contains', 'val': 'prod'}]),
+    ])
+    assets = [Asset(str(index), 'AwsAccount', {'Account Name': name}, {'Env': env})
+              for index, (name, env) in enumerate([('prod', 'dev'), ('dev', 'preprod'), ('prod', 'preprod'),
+                                                    ('test', 'dev'), ('dev', 'dev')] * 20)]
+    classifier = PerspectiveClassifier(perspective, 'auto', evaluator)
+    assert classifier.encoding_stats() == {'columns': 2, 'values': 0}
+
+    groups = [classifier.group_label(group_id)[1]
+              for _, group_id in classify_assets.classify_assets(classifier, assets)]
+    assert groups == ['Match', 'Match', 'Match', 'Other', 'Other'] * 20
+    # 'Account Name': prod, dev, test; 'Env': dev, preprod
+    assert classifier.encoding_stats() == {'columns': 2, 'values': 5}
+
+
+@pytest.mark.parametrize('max_signatures', [4, classify_assets.DEFAULT_SIGNATURE_CACHE_SIZE])
+@pytest.mark.parametrize('evaluator', [evaluator for evaluator in _evaluators() if evaluator != 'numpy'])
+def test_dedupe_matches_classifying_every_asset(tmp_path, evaluator, max_signatures):
+    schema_data, path = _inventory(tmp_path, 'jsonl')
+    perspective = parse_perspective.compile_perspective(schema_data)
+    with open(path, 'rb') as f:
+        assets = list(classify_assets.iter_inventory(f))
+
+    plain = PerspectiveClassifier(perspective, 'auto', evaluator)
+    deduped = PerspectiveClassifier(perspective, 'auto', evaluator, max_signatures=max_signatures)
+    assert ([group_id for _, group_id in classify_assets.classify_assets(deduped, assets)] ==
+            [group_id for _, group_id in classify_assets.classify_assets(plain, assets)])
+
+    stats = deduped.signature_stats()
+    classified = sum(1 for asset in assets if asset.type in deduped.rule_counts)
+    assert stats['hits'] + stats['misses'] == classified
+    assert stats['hits'] > 0
+    assert stats['signatures'] <= max_signatures * len(deduped.rule_counts)
+    assert PerspectiveClassifier(perspective, 'auto', evaluator).signature_stats()['signatures'] == 0
+
+
+@pytest.mark.parametrize('args, message', [
+    (['--dedupe', '--max-signatures', '0'], '--max-signatures must be at least 1'),
+    (['--dedupe', '--evaluator', 'numpy'], '--dedupe does not apply to the numpy evaluator'),
+])
+def test_cli_rejects_bad_dedupe_options(tmp_path, args, message):
+    _, path = _inventory(tmp_path, 'jsonl', assets=10)
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'classify_assets.py'), '--no-cache',
+         os.path.join(EXAMPLES, 'example4.json'), path] + args,
+        capture_output=True, text=True)
+    assert result.returncode == 1
+    assert message in result.stderr
+
+
+def test_cli_dedupe_writes_the_same_assignments(tmp_path):
+    _, path = _inventory(tmp_path, 'jsonl')
+    outputs = []
+    for args in ([], ['--dedupe', '--max-signatures', '16']):
+        output = tmp_path / f"out{len(outputs)}.csv"
+        result = subprocess.run(
+            [sys.executable, os.path.join(ROOT, 'classify_assets.py'), '--no-cache',
+             os.path.join(EXAMPLES, 'example4.json'), path, '-o', str(output)] + args,
+            capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+        outputs.append(output.read_text())
+    assert outputs[0] == outputs[1]
+
+
+def _multi_perspectives():
+    """example4, a generated schema named 'Cost, by team', and example4 again."""
+    schemas = [data for _, data in _generated_schemas()][:2]
+    schemas[1]['schema']['name'] = 'Cost, by team'
+    return [parse_perspective.compile_perspective(data) for data in schemas + schemas[:1]]
+
+
+def test_multi_classifier_matches_single_classifiers():
+    import generate_schema
+    perspectives = _multi_perspectives()
+    assets = []
+    for index, (_, schema_data) in enumerate(list(_generated_schemas())[:2]):
+        assets.extend(Asset(asset['id'], asset['type'], asset['fields'], asset['tags'])
+                      for asset in generate_schema.generate_inventory(schema_data, 1500, seed=index))
+
+    multi = classify_assets.MultiPerspectiveClassifier(perspectives)
+    results = list(classify_assets.classify_assets(multi, assets))
+    for index, perspective in enumerate(perspectives):
+        single = PerspectiveClassifier(perspective, 'auto', 'interpreted')
+        assert ([multi.groups[index].group_label(group_ids[index]) for _, group_ids in results] ==
+                [single.group_label(group_id) for _, group_id in classify_assets.classify_assets(single, assets)])
+
+    stats = multi.encoding_stats()
+    single_stats = classify_assets.MultiPerspectiveClassifier(perspectives[:2]).encoding_stats()
+    # The repeated schema adds clauses but no distinct ones
+    assert stats['clauses'] > single_stats['clauses']
+    assert stats['distinct_clauses'] == single_stats['distinct_clauses'] < stats['clauses']
+
+
+@pytest.mark.parametrize('output_format', classify_assets.OUTPUT_FORMATS)
+def test_write_multi_assignments_has_a_column_per_perspective(tmp_path, output_format):
+    perspectives = _multi_perspectives()
+    names = classify_assets.perspective_column_names(perspectives)
+    assert names == [f"{perspectives[0].name} (1)", 'Cost, by team', f"{perspectives[0].name} (2)"]
+    _, path = _inventory(tmp_path, 'jsonl', assets=200)
+    with open(path, 'rb') as f:
+        assets = list(classify_assets.iter_inventory(f))
+
+    multi = classify_assets.MultiPerspectiveClassifier(perspectives)
+    out = io.StringIO()
+    counts = classify_assets.write_multi_assignments(classify_assets.classify_assets(multi, assets), out, multi,
+                                                     names, output_format)
+    assert [sum(perspective_counts.values()) for perspective_counts in counts] == [200] * 3
+
+    singles = [PerspectiveClassifier(perspective, 'auto', 'encoded') for perspective in perspectives]
+    expected = [[single.group_label(single.classify(asset.type, asset.fields, asset.tags)) for single in singles]
+                for asset in assets]
+    if output_format == 'csv':
+        rows = list(csv.reader(io.StringIO(out.getvalue())))
+        assert rows[0] == ['id', 'type'] + [f"{name}:{column}" for name in names for column in ('group_id', 'group')]
+        assert [row[:2] for row in rows[1:]] == [[asset.id, asset.type] for asset in assets]
+        assert [[tuple(row[i:i + 2]) for i in range(2, 8, 2)] for row in rows[1:]] == expected
+    else:
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert [(record['id'], record['type']) for record in records] == [(asset.id, asset.type) for asset in assets]
+        assert [list(record['groups']) for record in records] == [names] * 200
+        assert [[(groups['group_id'], groups['group']) for groups in record['groups'].values()]
+                for record in records] == expected
+
+
+def test_cli_classifies_against_several_schemas(tmp_path):
+    _, path = _inventory(tmp_path, 'jsonl', assets=100)
+    schema = os.path.join(EXAMPLES, 'example4.json')
+    command = [sys.executable, os.path.join(ROOT, 'classify_assets.py'), '--no-cache', schema, schema, path]
+    result = subprocess.run(command + ['-o', str(tmp_path / 'out.csv')], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    with open(tmp_path / 'out.csv', newline='') as f:
+        rows = list(csv.reader(f))
+    assert len(rows) == 101 and rows[0][2].endswith(' (1):group_id') and rows[0][4].endswith(' (2):group_id')
+    assert all(row[2:4] == row[4:6] for row in rows[1:])
+
+    result = subprocess.run(command + ['--dedupe'], capture_output=True, text=True)
+    assert result.returncode == 1
+    assert 'Several schema files are classified with the encoded evaluator' in result.stderr
+
+
+@pytest.mark.parametrize('evaluator', _evaluators() + ['multi'])
+def test_type_stats_count_every_asset_by_type(tmp_path, evaluator):
+    schema_data, path = _inventory(tmp_path, 'jsonl')
+    perspective = parse_perspective.compile_perspective(schema_data)
+    with open(path, 'rb') as f:
+        assets = list(classify_assets.iter_inventory(f))
+    assets.append(Asset('untyped', 'NoRulesForThisType', {}, {}))
+    if evaluator == 'multi':
+        classifier = classify_assets.MultiPerspectiveClassifier([perspective])
+    else:
+        classifier = PerspectiveClassifier(perspective, 'auto', evaluator)
+
+    type_stats = {}
+    results = list(classify_assets.classify_assets(classifier, assets, batch_size=300, type_stats=type_stats))
+    assert results == list(classify_assets.classify_assets(classifier, assets))
+    assert {asset_type: stats[0] for asset_type, stats in type_stats.items()} == Counter(
+        asset.type for asset in assets)
+    assert all(seconds >= 0 for _, seconds in type_stats.values())
+
+
+def test_format_type_stats_orders_by_time():
+    table = classify_assets.format_type_stats(
+        {'AwsAccount': [10, 0.5], 'AzureSubscription': [30, 1.5], '': [0, 0.0]}, {'AzureSubscription': 4})
+    lines = table.splitlines()
+    assert lines[0].split() == ['assets', '%', 'seconds', '%', 'us/asset', 'rules', 'asset', 'type']
+    assert set(lines[1]) == {'-'}
+    assert [line.split() for line in lines[2:]] == [
+        ['30', '75.0%', '1.5000', '75.0%', '50000.00', '4', 'AzureSubscription'],
+        ['10', '25.0%', '0.5000', '25.0%', '50000.00', '0', 'AwsAccount'],
+        ['0', '0.0%', '0.0000', '0.0%', '0.00', '0', '(no', 'type)'],
+    ]
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_cli_type_stats(tmp_path, jobs):
+    _, path = _inventory(tmp_path, 'jsonl')
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'classify_assets.py'), '--no-cache', '--type-stats', '--jobs', jobs,
+         os.path.join(EXAMPLES, 'example4.json'), path, '-o', str(tmp_path / 'out.csv')],
+        capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    lines = result.stderr.splitlines()
+    start = next(index for index, line in enumerate(lines) if line.split()[:1] == ['assets']) + 2
+    rows = [line.split() for line in lines[start:] if line[:10].strip().isdigit()]
+    assert sum(int(row[0]) for row in rows) == 2000
@@ -0,0 +1,161 @@
+import argparse
+import email.utils
+import json
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+import parse_perspective
+from mock_api_server import start_mock_server
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'examples')
+
+
+@pytest.fixture
+def fixtures_dir(tmp_path):
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    shutil.copy(os.path.join(EXAMPLES, 'example.json'), str(fixtures / '101.json'))
+    shutil.copy(os.path.join(EXAMPLES, 'example2.json'), str(fixtures / '102.json'))
+    return fixtures
+
+
+@pytest.fixture
+def mock_server(fixtures_dir):
+    server = start_mock_server(str(fixtures_dir))
+    yield server.base_url
+    server.shutdown()
+    server.server_close()
+
+
+def test_bulk_fetch_renders_good_schemas_when_one_is_not_an_object(fixtures_dir, mock_server, tmp_path, capsys):
+    (fixtures_dir / '666.json').write_text(json.dumps(['not', 'a', 'schema']))
+    out_dir = tmp_path / 'out'
+
+    exit_code = parse_perspective.run_bulk_fetch('key', ['101', '666', '102'], str(out_dir), workers=2,
+                                                 base_url=mock_server)
+
+    assert exit_code == 1
+    assert sorted(os.listdir(str(out_dir))) == ['101.txt', '102.txt']
+    assert (out_dir / '101.txt').read_text().startswith('Perspective:')
+    err = capsys.readouterr().err
+    assert '666: Could not render schema' in err
+
+
+@pytest.mark.parametrize('ttl', [3600, 0], ids=['fresh', 'revalidated'])
+def test_corrupt_cache_entry_is_refetched(fixtures_dir, mock_server, tmp_path, ttl):
+    cache = parse_perspective.HTTPSchemaCache(str(tmp_path / 'cache'), ttl=ttl)
+    body = (fixtures_dir / '101.json').read_bytes()
+    etag = None
+    if ttl == 0:
+        # A current validator, so the server answers 304 for the truncated body
+        with parse_perspective.create_api_session() as session:
+            parse_perspective.fetch_perspective(session, 'key', '101', cache, base_url=mock_server)
+        etag = cache.load(mock_server, '101')[0]['etag']
+    cache.store(mock_server, '101', body[:len(body) // 2], etag)
+
+    with parse_perspective.create_api_session() as session:
+        schema_data = parse_perspective.fetch_perspective(session, 'key', '101', cache, base_url=mock_server)
+
+    assert schema_data == json.loads(body)
+    assert cache.load(mock_server, '101')[1] == body
+
+
+class _Response:
+    def __init__(self, retry_after=None, status_code=429):
+        self.status_code = status_code
+        self.headers = {'Retry-After': retry_after} if retry_after is not None else {}
+
+
+@pytest.mark.parametrize('retry_after', ['garbage', 'Mon, 99 Foo 2020 25:61:00 GMT', '5 seconds'])
+def test_malformed_retry_after_falls_back_to_jittered_backoff(retry_after):
+    scheduler = parse_perspective.FetchScheduler()
+    ceiling = parse_perspective.BACKOFF_BASE_SECONDS * 2 ** 3
+    for _ in range(20):
+        assert 0 <= scheduler.backoff_delay(_Response(retry_after), 3) <= ceiling
+
+
+def test_retry_after_date_is_utc_and_never_negative():
+    scheduler = parse_perspective.FetchScheduler()
+    soon = email.utils.formatdate(time.time() + 30, usegmt=True)
+    # '-0000' is parsed into a naive datetime; it still means UTC
+    soon_naive = soon.replace('GMT', '-0000')
+    assert 25 <= scheduler.backoff_delay(_Response(soon), 0) <= 30
+    assert 25 <= scheduler.backoff_delay(_Response(soon_naive), 0) <= 30
+    assert scheduler.backoff_delay(_Response('Wed, 21 Oct 2015 07:28:00 GMT'), 0) == 0
+    assert scheduler.backoff_delay(_Response('-3'), 0) == 0
+
+
+def test_token_bucket_paces_requests_after_the_burst():
+    scheduler = parse_perspective.FetchScheduler(rate_limit=20)
+    start = time.monotonic()
+    for _ in range(20):
+        scheduler._acquire_token()
+    assert time.monotonic() - start < 0.1
+    for _ in range(5):
+        scheduler._acquire_token()
+    assert 0.2 <= time.monotonic() - start < 0.6
+
+
+def test_token_bucket_below_one_request_per_second_does_not_hang():
+    scheduler = parse_perspective.FetchScheduler(rate_limit=0.5)
+
+    def acquire_twice():
+        scheduler._acquire_token()
+        # Two seconds later at 0.5/sec there is a whole token again
+        scheduler._last_refill -= 2
+        scheduler._acquire_token()
+
+    thread = threading.Thread(target=acquire_twice, daemon=True)
+    thread.start()
+    thread.join(timeout=1)
+    assert not thread.is_alive()
+
+
+def test_concurrency_halves_on_throttling_and_grows_back_additively():
+    scheduler = parse_perspective.FetchScheduler(max_concurrency=8, max_retries=0)
+    for expected in (4, 2, 1, 1):
+        assert scheduler.send(lambda: _Response(status_code=429)).status_code == 429
+        assert scheduler.concurrency == expected
+    # Each success adds 1/concurrency: about one slot per window of successes
+    scheduler.send(lambda: _Response(status_code=200))
+    assert scheduler.concurrency == 2
+    for _ in range(2):
+        scheduler.send(lambda: _Response(status_code=200))
+    assert scheduler.concurrency == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(100):
+        scheduler.send(lambda: _Response(status_code=200))
+    assert scheduler.concurrency == 8
+    assert (scheduler.requests, scheduler.throttled, scheduler.retries) == (107, 4, 0)
+
+
+def test_throttled_request_is_retried_after_retry_after():
+    responses = iter([_Response('0'), _Response('0', 503), _Response(status_code=200)])
+    scheduler = parse_perspective.FetchScheduler(max_retries=2)
+
+    assert scheduler.send(lambda: next(responses)).status_code == 200
+    assert (scheduler.requests, scheduler.throttled, scheduler.retries) == (3, 2, 2)
+
+
+def test_rate_limit_must_be_positive():
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_perspective.positive_float('0')
+    assert parse_perspective.positive_float('0.5') == 0.5
+
+
+def test_benchmark_fetch_revalidates_warm_cache(tmp_path):
+    import benchmark
+
+    results = benchmark.benchmark_fetch(5, str(tmp_path), workers=2)
+
+    assert [name for name, _, _ in benchmark.FETCH_SCENARIOS] == list(results)
+    assert results['cold']['server'] == {'requests': 5, 'ok': 5}
+    assert results['cold']['cache']['misses'] == 5
+    assert results['warm']['server'] == {'requests': 5, 'not_modified': 5}
+    assert results['warm']['cache']['revalidated'] == 5
+    faults = results['faults']
+    assert faults['schemas'] + faults['errors'] == 5
+    assert faults['server']['requests'] == 5 + faults['retries']
@@ -0,0 +1,711 @@
+import bz2
+import gzip
+import importlib.util
+import io
+import json
+import lzma
+import mmap
+import os
+import pickle
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pytest
+
+import parse_perspective
+from generate_schema import generate_schema
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES = os.path.join(ROOT, 'examples')
+
+
+def _run_cli(*args, **env):
+    """Run parse_perspective.py with args and extra environment variables. Returns the CompletedProcess."""
+    return subprocess.run([sys.executable, os.path.join(ROOT, 'parse_perspective.py')] + list(args),
+                          capture_output=True, text=True, env=dict(os.environ, **env))
+
+
+def _expected_blocks(schema_data):
+    """Return [(block name, [group names in schema order])] for the categorize rules, from the raw schema."""
+    schema = schema_data['schema']
+    names_by_block = {}
+    for constant in schema['constants']:
+        if constant['type'] == 'Dynamic Group':
+            for group in constant['list']:
+                names_by_block.setdefault(group['blk_id'], []).append(group['name'])
+    return [(rule['name'], names_by_block.get(rule['ref_id'], []))
+            for rule in schema['rules'] if rule['type'] == 'categorize']
+
+
+def _rendered_blocks(lines):
+    """Return [(block name, [group names])] from rendered categorize lines."""
+    blocks = []
+    for line in lines:
+        if line.startswith('Group Block: '):
+            blocks.append((line[len('Group Block: '):].rstrip('\n'), []))
+        elif line.startswith('Group:  '):
+            blocks[-1][1].append(line[len('Group:  '):])
+    return blocks
+
+
+def _render_seconds(schema_data, repeat):
+    """Best time to compile schema_data and render its categorize lines; returns (seconds, lines)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = list(parse_perspective.iter_categorize_lines(parse_perspective.compile_perspective(schema_data)))
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, lines
+
+
+def test_categorize_render_scales_linearly_to_500k_dynamic_groups():
+    # More blocks of the same size, so a per-block rescan of every dynamic
+    # group (blocks x groups) grows 100x while linear work grows 10x
+    small = generate_schema(blocks=20, groups_per_block=2500, static_groups=10, merges_per_block=0)
+    large = generate_schema(blocks=200, groups_per_block=2500, static_groups=10, merges_per_block=0)
+
+    small_seconds, small_lines = _render_seconds(small, repeat=3)
+    large_seconds, large_lines = _render_seconds(large, repeat=1)
+
+    # Every group is rendered once, under its own block, in schema order
+    assert _rendered_blocks(small_lines) == _expected_blocks(small)
+    large_blocks = _rendered_blocks(large_lines)
+    assert sum(len(names) for _, names in large_blocks) == 500000
+    assert large_blocks == _expected_blocks(large)
+
+    assert large_seconds < small_seconds * 30
+
+
+def test_batch_output_paths_keep_subdirectories(tmp_path):
+    inputs = [str(tmp_path / 't1' / 'p.json'), str(tmp_path / 't2' / 'p.json.gz'), str(tmp_path / 't1' / 'q.json')]
+    out_dir = str(tmp_path / 'out')
+    assert parse_perspective.batch_output_paths(inputs, out_dir) == [
+        str(tmp_path / 'out' / 't1' / 'p.txt'),
+        str(tmp_path / 'out' / 't2' / 'p.txt'),
+        str(tmp_path / 'out' / 't1' / 'q.txt'),
+    ]
+    assert parse_perspective.batch_output_paths([str(tmp_path / 'a.json')], out_dir) == [
+        str(tmp_path / 'out' / 'a.txt'),
+    ]
+
+
+def test_batch_output_paths_reject_clashing_inputs(tmp_path):
+    with pytest.raises(ValueError, match='same output file'):
+        parse_perspective.batch_output_paths([str(tmp_path / 'q.json'), str(tmp_path / 'q.json.gz')],
+                                             str(tmp_path / 'out'))
+
+
+@pytest.mark.parametrize('jobs', ['0', '-2'])
+def test_batch_rejects_jobs_below_one(tmp_path, jobs):
+    result = _run_cli('--batch', EXAMPLES, '--out-dir', str(tmp_path / 'out'), '--jobs', jobs)
+
+    assert result.returncode == 1
+    assert 'Error: --jobs must be at least 1' in result.stderr
+    assert 'Traceback' not in result.stderr
+
+
+def _stream_items(data, chunk_size):
+    return list(parse_perspective._SchemaStreamReader(io.BytesIO(data), chunk_size).iter_schema_items())
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 5, 7, 16, 1 << 20])
+def test_stream_reader_handles_values_split_across_chunks(chunk_size):
+    data = json.dumps({
+        'schema': {
+            'name': 'n',
+            'extra': 3.5e10,
+            'numbers': [-0.25e-3, 12345678901234, 1E+2, 0, -7, True, None, 'ünï "x"'],
+            'rules': [{'type': 'filter', 'asset': 'AwsAccount', 'to': 12345, 'weight': -1.5e+7}],
+            'merges': [],
+            'constants': [{'type': 'Static Group', 'list': [{'ref_id': 9876543210, 'name': 'S', 'pct': 0.125}]}],
+        },
+        'version': 2.0,
+    }).encode('utf-8')
+    assert _stream_items(data, chunk_size) == _stream_items(data, 1 << 20)
+    assert ('name', 'n') in _stream_items(data, chunk_size)
+
+
+class _Trickle(io.BytesIO):
+    """A file object whose reads return at most chunk_size bytes."""
+
+    def __init__(self, data, chunk_size):
+        super().__init__(data)
+        self.chunk_size = chunk_size
+
+    def read(self, size=-1):
+        return super().read(self.chunk_size if size < 0 else min(size, self.chunk_size))
+
+
+def _stream_parsers():
+    return ['python'] + (['ijson'] if importlib.util.find_spec('ijson') is not None else [])
+
+
+@pytest.mark.parametrize('parser', _stream_parsers())
+@pytest.mark.parametrize('chunk_size', [1, 3, 17, 4096])
+def test_stream_compile_matches_full_decode_at_any_chunk_size(chunk_size, parser):
+    with open(os.path.join(EXAMPLES, 'example4.json'), 'rb') as f:
+        data = f.read()
+    # Numbers render as json.loads decodes them: 1e2 as 100.0
+    data = data.replace(b'"val":"Transim"', b'"val":1e2', 1).replace(b'"val":"TRANSIM"', b'"val":-2.5', 1)
+    assert b'1e2' in data
+    streamed = parse_perspective.compile_perspective_stream(_Trickle(data, chunk_size), parser)
+    assert list(parse_perspective.iter_perspective_lines(streamed)) == \
+        list(parse_perspective.iter_perspective_lines(json.loads(data)))
+
+
+@pytest.mark.skipif(importlib.util.find_spec('ijson') is None, reason='needs ijson')
+def test_ijson_stream_compile_with_float_values_is_cached(tmp_path):
+    with open(os.path.join(EXAMPLES, 'example4.json'), 'rb') as f:
+        data = f.read().replace(b'"val":"Transim"', b'"val":1e2', 1)
+    schema_path = tmp_path / 'float.json'
+    schema_path.write_bytes(data)
+    args = [str(schema_path), '-o', str(tmp_path / 'out.txt'), '--stream', '--stream-parser', 'ijson',
+            '--cache-dir', str(tmp_path / 'cache'), '--no-cache-output', '-v']
+
+    assert '1 misses' in _run_cli(*args).stderr
+    assert '1 compiled hits, 0 misses' in _run_cli(*args).stderr
+    assert "'100.0'" in (tmp_path / 'out.txt').read_text()
+
+
+def _render_uncached(schema_path):
+    out = io.StringIO()
+    parse_perspective.write_perspective_lines(
+        parse_perspective.iter_perspective_lines(parse_perspective.load_perspective(schema_path)), out)
+    return out.getvalue()
+
+
+def test_unusable_cache_dir_warns_and_renders(tmp_path):
+    (tmp_path / 'file').write_text('')
+    result = _run_cli(os.path.join(EXAMPLES, 'example.json'), XDG_CACHE_HOME=str(tmp_path / 'file' / 'x'))
+
+    assert result.returncode == 0, result.stderr
+    assert 'Warning: Could not use cache' in result.stderr
+    assert 'Traceback' not in result.stderr
+    assert result.stdout.startswith('Perspective:')
+
+
+def test_first_render_writes_destination_and_cache_together(tmp_path, monkeypatch):
+    schema_path = os.path.join(EXAMPLES, 'example2.json')
+    cache = parse_perspective.CompiledPerspectiveCache(str(tmp_path / 'cache'))
+    # Output is never copied back out of the cache on a miss
+    monkeypatch.setattr(cache, 'open_rendered', lambda key: None)
+    output = tmp_path / 'out.txt'
+
+    parse_perspective.render_schema_file(schema_path, str(output), cache=cache)
+
+    expected = _render_uncached(schema_path)
+    assert output.read_text() == expected
+    key = cache.file_key(schema_path)
+    with open(cache._rendered_path(key, parse_perspective.OUTPUT_FORMAT)) as f:
+        assert f.read() == expected
+    assert not [name for name in os.listdir(cache.cache_dir) if name.endswith('.tmp')]
+
+
+class _FullFile:
+    """Cache temporary file on a full disk: writes fail after the first few."""
+
+    def __init__(self, writes=3):
+        self.writes = writes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, data):
+        self.writes -= 1
+        if self.writes < 0:
+            raise OSError(28, 'No space left on device')
+        return len(data)
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize('fail_on_open', [True, False], ids=['open', 'write'])
+def test_cache_write_errors_do_not_fail_the_render(tmp_path, monkeypatch, capsys, fail_on_open):
+    schema_path = os.path.join(EXAMPLES, 'example2.json')
+    cache = parse_perspective.CompiledPerspectiveCache(str(tmp_path / 'cache'))
+
+    real_open = open
+
+    def cache_open(path, *args, **kwargs):
+        if not str(path).endswith('.tmp'):
+            return real_open(path, *args, **kwargs)
+        if fail_on_open:
+            raise OSError(28, 'No space left on device')
+        return _FullFile()
+
+    monkeypatch.setattr(parse_perspective, 'open', cache_open, raising=False)
+    output = tmp_path / 'out.txt'
+    parse_perspective.render_schema_file(schema_path, str(output), cache=cache)
+
+    assert output.read_text() == _render_uncached(schema_path)
+    assert os.listdir(cache.cache_dir) == []
+    assert capsys.readouterr().err.count('Warning: Could not write to cache') == 1
+
+
+# Reference output rendered by the original parse_perspective_schema()
+REFERENCE_OUTPUTS = [('example.json', 'example1.txt'), ('example4.json', 'example4.txt')]
+
+
+def _load_example(name):
+    with open(os.path.join(EXAMPLES, name)) as f:
+        return json.load(f)
+
+
+def _read_example(name):
+    with open(os.path.join(EXAMPLES, name)) as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('schema_name, output_name', REFERENCE_OUTPUTS)
+def test_parse_perspective_schema_matches_reference_output(schema_name, output_name):
+    schema_data = _load_example(schema_name)
+
+    assert parse_perspective.parse_perspective_schema(schema_data) == _read_example(output_name)
+    assert '\n'.join(parse_perspective.iter_perspective_lines(schema_data)) == _read_example(output_name)
+
+
+def test_lines_are_produced_lazily():
+    lines = parse_perspective.iter_perspective_lines(_load_example('example4.json'))
+
+    assert not isinstance(lines, (list, tuple, str))
+    assert next(lines) == 'Perspective: Business Unit Combined\n'
+
+
+def test_write_perspective_lines_joins_lines_with_newlines():
+    out = io.StringIO()
+    parse_perspective.write_perspective_lines(iter(['a\n', 'b', '', 'c']), out)
+    assert out.getvalue() == '\n'.join(['a\n', 'b', '', 'c'])
+
+
+@pytest.mark.parametrize('schema_name, output_name', REFERENCE_OUTPUTS)
+def test_cli_writes_reference_output_to_file_and_stdout(tmp_path, schema_name, output_name):
+    schema_path = os.path.join(EXAMPLES, schema_name)
+    output = tmp_path / 'out.txt'
+    cache_home = str(tmp_path / 'cache')
+
+    result = _run_cli(schema_path, '-o', str(output), XDG_CACHE_HOME=cache_home)
+    assert result.returncode == 0, result.stderr
+    assert output.read_text() == _read_example(output_name)
+
+    result = _run_cli(schema_path, XDG_CACHE_HOME=cache_home)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout == _read_example(output_name) + '\n'
+
+
+GENERATOR_KNOBS = dict(blocks=4, groups_per_block=30, static_groups=6, rules_per_static_group=2,
+                       clauses_per_filter=3, merges_per_block=3, merge_fan_in=2)
+
+
+def test_generated_schema_is_deterministic_by_seed():
+    assert generate_schema(seed=7, **GENERATOR_KNOBS) == generate_schema(seed=7, **GENERATOR_KNOBS)
+    assert json.dumps(generate_schema(seed=7, **GENERATOR_KNOBS)) == \
+        json.dumps(generate_schema(seed=7, **GENERATOR_KNOBS))
+    assert generate_schema(seed=7, **GENERATOR_KNOBS) != generate_schema(seed=8, **GENERATOR_KNOBS)
+
+
+def test_generated_schema_follows_the_knobs():
+    schema = generate_schema(seed=1, **GENERATOR_KNOBS)['schema']
+    constants = {constant['type']: constant['list'] for constant in schema['constants']}
+    rules = schema['rules']
+
+    assert len(constants['Dynamic Group Block']) == 4
+    assert len(constants['Dynamic Group']) == 4 * 30
+    statics = constants['Static Group']
+    assert len(statics) == 6 + 1 and [group for group in statics if group.get('is_other') == 'true'] == [statics[-1]]
+
+    categorize = [rule for rule in rules if rule['type'] == 'categorize']
+    filters = [rule for rule in rules if rule['type'] == 'filter']
+    assert len(categorize) == 4
+    assert len(schema['merges']) == 4 * 3
+    assert all(merge['type'] == 'Group' and len(merge['from']) == 2 for merge in schema['merges'])
+    # Static group rules, plus one forwarded rule per merge
+    assert len(filters) == 6 * 2 + 4 * 3
+    assert sum('fwd_to' in rule for rule in filters) == 4 * 3
+    assert all(len(rule['condition']['clauses']) == 3 for rule in filters if 'fwd_to' not in rule)
+
+    lines = parse_perspective.parse_perspective_schema(generate_schema(seed=1, **GENERATOR_KNOBS))
+    assert lines.count('Group Block: ') == 4
+
+
+def test_generated_schema_without_other_group():
+    schema = generate_schema(seed=1, include_other=False, **GENERATOR_KNOBS)['schema']
+    statics = [constant for constant in schema['constants'] if constant['type'] == 'Static Group'][0]['list']
+    assert len(statics) == 6
+    assert not any(group.get('is_other') for group in statics)
+
+
+def test_generator_cli_output_is_reproducible(tmp_path):
+    outputs = []
+    for name in ('a.json', 'b.json'):
+        subprocess.run([sys.executable, os.path.join(ROOT, 'generate_schema.py'), '--blocks', '2',
+                        '--groups-per-block', '50', '--seed', '42', '-o', str(tmp_path / name)], check=True,
+                       capture_output=True)
+        outputs.append((tmp_path / name).read_bytes())
+    assert outputs[0] == outputs[1]
+    assert json.loads(outputs[0]) == generate_schema(blocks=2, groups_per_block=50, seed=42)
+
+
+def test_profiling_times_each_render_stage():
+    schema_data = _load_example('example4.json')
+    with parse_perspective.profiling() as profiler:
+        lines = list(parse_perspective.iter_perspective_lines(schema_data))
+
+    report = profiler.report()
+    stages = {stage['name']: stage for stage in report['stages']}
+    assert {'index', 'categorize', 'static'} <= set(stages)
+    # Every line but the header and 'Done' comes from a render stage
+    assert stages['categorize']['lines'] + stages['static']['lines'] == len(lines) - 2
+    assert report['total_seconds'] >= sum(stage['seconds'] for stage in report['stages'])
+    assert report['peak_bytes'] > 0
+    assert json.loads(json.dumps(report)) == report
+    table = profiler.format_table()
+    assert 'categorize' in table and any(line.startswith('total ') for line in table.splitlines())
+
+
+def test_nested_stage_excludes_time_of_inner_stages():
+    profiler = parse_perspective.Profiler(trace_memory=False)
+    profiler.start()
+    with profiler.stage('outer'):
+        time.sleep(0.05)
+        with profiler.stage('inner'):
+            time.sleep(0.1)
+    profiler.stop()
+
+    seconds = {stage['name']: stage['seconds'] for stage in profiler.report()['stages']}
+    assert 0.05 <= seconds['outer'] < 0.1
+    assert seconds['inner'] >= 0.1
+    assert profiler.report()['peak_bytes'] is None
+
+
+def test_stage_peak_memory_is_traced():
+    with parse_perspective.profiling() as profiler:
+        with parse_perspective.profile_stage('allocate'):
+            block = bytearray(8 * 1024 * 1024)
+            del block
+        with parse_perspective.profile_stage('idle'):
+            pass
+
+    stages = {stage['name']: stage for stage in profiler.report()['stages']}
+    assert stages['allocate']['peak_bytes'] >= 8 * 1024 * 1024
+    assert not tracemalloc.is_tracing()
+
+
+def test_profile_hooks_do_nothing_without_profiling():
+    with parse_perspective.profile_stage('unused'):
+        pass
+    items = [1, 2]
+    assert parse_perspective.profile_iter('unused', items) is items
+
+
+def test_cli_profile_reports_json_on_stderr(tmp_path):
+    result = _run_cli(os.path.join(EXAMPLES, 'example4.json'), '-o', str(tmp_path / 'out.txt'), '--profile', 'json',
+                      XDG_CACHE_HOME=str(tmp_path / 'cache'))
+
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stderr)
+    assert {'decode', 'index', 'categorize', 'static', 'write'} <= {stage['name'] for stage in report['stages']}
+
+
+def _ir_objects(perspective):
+    """Yield every compiled object of a Perspective."""
+    yield perspective
+    for block in perspective.blocks:
+        yield block
+        yield from block.clauses
+    yield from perspective.dynamic_groups.values()
+    for group in perspective.static_groups:
+        yield group
+        for rule in group.rules:
+            yield rule
+            yield from rule.clauses
+
+
+def test_compiled_perspective_is_slotted_and_immutable():
+    perspective = parse_perspective.compile_perspective(_load_example('example4.json'))
+
+    objects = list(_ir_objects(perspective))
+    assert {type(obj).__name__ for obj in objects} == {
+        'Perspective', 'GroupBlock', 'DynamicGroup', 'StaticGroup', 'FilterRule', 'Clause'}
+    for obj in objects:
+        assert not hasattr(obj, '__dict__')
+        with pytest.raises(AttributeError):
+            obj.name = 'changed'
+
+
+def test_compiled_perspective_uses_integer_ref_ids_and_interned_strings():
+    schema_data = _load_example('example4.json')
+    perspective = parse_perspective.compile_perspective(schema_data)
+    other = parse_perspective.compile_perspective(json.loads(json.dumps(schema_data)))
+
+    ref_strings = {str(group['ref_id']) for constant in schema_data['schema']['constants']
+                   for group in constant['list']}
+    for group in perspective.dynamic_groups.values():
+        assert type(group.ref_id) is int and type(group.block_id) is int
+        assert perspective.ref_id_string(group.ref_id) in ref_strings
+    merged = [group for group in perspective.dynamic_groups.values() if group.merged_from]
+    assert merged and all(perspective.dynamic_groups[ref_id].is_merged
+                          for group in merged for ref_id in group.merged_from)
+
+    # Equal strings from separately decoded schemas are the same object
+    for block, other_block in zip(perspective.blocks, other.blocks):
+        assert block.tag_field is other_block.tag_field
+    clauses = [clause for group in perspective.static_groups for rule in group.rules for clause in rule.clauses]
+    other_clauses = [clause for group in other.static_groups for rule in group.rules for clause in rule.clauses]
+    assert clauses and all(clause.field is other_clause.field and clause.op is other_clause.op
+                           for clause, other_clause in zip(clauses, other_clauses))
+
+
+@pytest.mark.parametrize('schema_name, output_name', REFERENCE_OUTPUTS)
+def test_compiled_perspective_renders_repeatedly(schema_name, output_name):
+    perspective = parse_perspective.compile_perspective(_load_example(schema_name))
+
+    for _ in range(2):
+        assert parse_perspective.parse_perspective_schema(perspective) == _read_example(output_name)
+
+
+def _installed_json_backends():
+    return [name for name in parse_perspective.JSON_BACKENDS
+            if name == 'json' or importlib.util.find_spec(name) is not None]
+
+
+@pytest.fixture
+def restore_json_backend():
+    previous = parse_perspective.json_backend_name()
+    yield
+    parse_perspective.set_json_backend(previous)
+
+
+def test_auto_json_backend_is_the_first_installed():
+    name, _ = parse_perspective.load_json_backend('auto')
+    assert name == _installed_json_backends()[0]
+    assert parse_perspective.load_json_backend('json') == ('json', json.loads)
+
+
+def test_json_backend_falls_back_to_the_standard_library(monkeypatch):
+    for name in parse_perspective.JSON_BACKENDS:
+        if name != 'json':
+            # A None entry makes the import raise ImportError
+            monkeypatch.setitem(sys.modules, name, None)
+
+    assert parse_perspective.load_json_backend('auto') == ('json', json.loads)
+    with pytest.raises(ValueError, match="JSON backend 'orjson' is not installed"):
+        parse_perspective.load_json_backend('orjson')
+    with pytest.raises(ValueError, match="Unknown JSON backend 'yaml'"):
+        parse_perspective.load_json_backend('yaml')
+
+
+@pytest.mark.parametrize('backend', _installed_json_backends())
+def test_json_backends_decode_alike(backend, restore_json_backend):
+    with open(os.path.join(EXAMPLES, 'example4.json'), 'rb') as f:
+        data = f.read()
+
+    assert parse_perspective.set_json_backend(backend) == backend
+    assert parse_perspective.json_backend_name() == backend
+    assert parse_perspective.json_loads(data) == json.loads(data)
+    assert parse_perspective.json_loads(data.decode('utf-8')) == json.loads(data)
+    with pytest.raises(ValueError):
+        parse_perspective.json_loads(b'{"schema": ')
+
+
+@pytest.mark.parametrize('backend', _installed_json_backends())
+def test_cli_renders_alike_with_each_json_backend(tmp_path, backend):
+    output = tmp_path / 'out.txt'
+    result = _run_cli(os.path.join(EXAMPLES, 'example4.json'), '-o', str(output), '--json-backend', backend,
+                      XDG_CACHE_HOME=str(tmp_path / 'cache'))
+
+    assert result.returncode == 0, result.stderr
+    assert output.read_text() == _read_example('example4.txt')
+
+
+@pytest.mark.skipif(len(_installed_json_backends()) == len(parse_perspective.JSON_BACKENDS),
+                    reason='every JSON backend is installed')
+def test_cli_reports_a_missing_json_backend(tmp_path):
+    missing = [name for name in parse_perspective.JSON_BACKENDS if name not in _installed_json_backends()][0]
+    result = _run_cli(os.path.join(EXAMPLES, 'example4.json'), '--json-backend', missing)
+
+    assert result.returncode == 1
+    assert f"Error: JSON backend '{missing}' is not installed" in result.stderr
+
+
+COMPRESSORS = {'gzip': (gzip.compress, '.gz'), 'bz2': (bz2.compress, '.bz2'), 'xz': (lzma.compress, '.xz')}
+
+
+def _write_compressed(tmp_path, compression, name):
+    compress, _ = COMPRESSORS[compression]
+    with open(os.path.join(EXAMPLES, 'example4.json'), 'rb') as f:
+        data = compress(f.read())
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize('compression', sorted(COMPRESSORS))
+def test_compressed_schema_files_are_read_transparently(tmp_path, compression):
+    suffix = COMPRESSORS[compression][1]
+    # Detected by magic bytes, so the file name does not matter
+    for name in (f"schema.json{suffix}", 'schema'):
+        path = _write_compressed(tmp_path, compression, name)
+        assert parse_perspective.load_schema_file(path) == _load_example('example4.json')
+        with parse_perspective.open_schema_file(path) as f:
+            streamed = parse_perspective.compile_perspective_stream(f)
+        assert parse_perspective.parse_perspective_schema(streamed) == _read_example('example4.txt')
+
+    assert parse_perspective.schema_file_stem(f"/data/schema.json{suffix}") == 'schema'
+    output = tmp_path / 'out.txt'
+    result = _run_cli(path, '-o', str(output), XDG_CACHE_HOME=str(tmp_path / 'cache'))
+    assert result.returncode == 0, result.stderr
+    assert output.read_text() == _read_example('example4.txt')
+
+
+def test_uncompressed_schema_files_are_memory_mapped(tmp_path):
+    with parse_perspective.open_schema_file(os.path.join(EXAMPLES, 'example4.json')) as f:
+        assert isinstance(f, mmap.mmap)
+        assert parse_perspective.decode_schema_file(f) == _load_example('example4.json')
+
+    # Empty files cannot be mapped; they are read (and rejected) as usual
+    empty = tmp_path / 'empty.json'
+    empty.write_bytes(b'')
+    with pytest.raises(ValueError):
+        parse_perspective.load_schema_file(str(empty))
+
+
+@pytest.mark.parametrize('compression', sorted(COMPRESSORS))
+def test_truncated_compressed_schema_is_reported(tmp_path, compression):
+    path = _write_compressed(tmp_path, compression, 'schema.json')
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:len(data) // 2])
+
+    with pytest.raises((OSError,) + parse_perspective.DECOMPRESSION_ERRORS):
+        parse_perspective.load_schema_file(path)
+    result = _run_cli(path, '-o', str(tmp_path / 'out.txt'), XDG_CACHE_HOME=str(tmp_path / 'cache'))
+    assert result.returncode == 1
+    assert f"Error: Could not read '{path}'" in result.stderr
+
+
+def test_compiled_cache_serves_unchanged_files(tmp_path):
+    schema_path = tmp_path / 'schema.json'
+    schema_path.write_bytes(open(os.path.join(EXAMPLES, 'example4.json'), 'rb').read())
+    cache = parse_perspective.CompiledPerspectiveCache(str(tmp_path / 'cache'))
+
+    first = parse_perspective.load_perspective(str(schema_path), cache=cache)
+    second = parse_perspective.load_perspective(str(schema_path), cache=cache)
+    assert second == first
+    assert (cache.misses, cache.compiled_hits) == (1, 1)
+
+    # Any change to the bytes is a new entry
+    schema_path.write_bytes(schema_path.read_bytes() + b'\n')
+    parse_perspective.load_perspective(str(schema_path), cache=cache)
+    assert cache.misses == 2
+
+
+def test_compiled_cache_serves_rendered_output(tmp_path):
+    schema_path = os.path.join(EXAMPLES, 'example4.json')
+    cache = parse_perspective.CompiledPerspectiveCache(str(tmp_path / 'cache'))
+    for name in ('first.txt', 'second.txt'):
+        parse_perspective.render_schema_file(schema_path, str(tmp_path / name), cache=cache)
+        assert (tmp_path / name).read_text() == _read_example('example4.txt')
+    assert (cache.misses, cache.rendered_hits) == (1, 1)
+
+    compiled_only = parse_perspective.CompiledPerspectiveCache(str(tmp_path / 'compiled-only'))
+    for _ in range(2):
+        parse_perspective.render_schema_file(schema_path, str(tmp_path / 'out.txt'), cache=compiled_only,
+                                             cache_output=False)
+    assert (compiled_only.misses, compiled_only.compiled_hits, compiled_only.rendered_hits) == (1, 1, 0)
+    assert not [name for name in os.listdir(compiled_only.cache_dir) if name.endswith('.txt')]
+
+
+def test_compiled_cache_ignores_other_versions_and_corrupt_entries(tmp_path, monkeypatch):
+    schema_path = os.path.join(EXAMPLES, 'example4.json')
+    cache = parse_perspective.CompiledPerspectiveCache(str(tmp_path / 'cache'))
+    key = cache.file_key(schema_path)
+    perspective = parse_perspective.compile_perspective(_load_example('example4.json'))
+
+    # An entry stamped with another version is dropped
+    with open(cache._compiled_path(key), 'wb') as f:
+        pickle.dump((parse_perspective.COMPILED_CACHE_VERSION - 1, perspective), f)
+    assert cache.load(key) is None
+    assert not os.path.exists(cache._compiled_path(key))
+
+    with open(cache._compiled_path(key), 'wb') as f:
+        f.write(b'not a pickle')
+    assert cache.load(key) is None
+    assert not os.path.exists(cache._compiled_path(key))
+    assert cache.misses == 2
+
+    # A new version also changes the keys, so old rendered output is not served
+    monkeypatch.setattr(parse_perspective, 'COMPILED_CACHE_VERSION', parse_perspective.COMPILED_CACHE_VERSION + 1)
+    assert cache.file_key(schema_path) != key
+
+
+def test_compiled_cache_evicts_least_recently_used(tmp_path):
+    perspective = parse_perspective.compile_perspective(_load_example('example4.json'))
+    cache_dir = str(tmp_path / 'cache')
+    cache = parse_perspective.CompiledPerspectiveCache(cache_dir)
+    cache.store('a', perspective)
+    size = os.path.getsize(cache._compiled_path('a'))
+
+    # Room for two entries; entries already on disk count towards the bound
+    cache = parse_perspective.CompiledPerspectiveCache(cache_dir, max_bytes=size * 2 + size // 2)
+    time.sleep(0.01)
+    cache.store('b', perspective)
+    time.sleep(0.01)
+    assert cache.load('a') == perspective
+    time.sleep(0.01)
+    cache.store('c', perspective)
+
+    assert cache.evictions == 1
+    assert sorted(os.listdir(cache_dir)) == ['a.pickle', 'c.pickle']
+
+
+def test_cli_cache_options(tmp_path):
+    schema_path = os.path.join(EXAMPLES, 'example4.json')
+    cache_dir = tmp_path / 'cache'
+    args = [schema_path, '-o', str(tmp_path / 'out.txt'), '--cache-dir', str(cache_dir), '-v']
+
+    assert '1 misses' in _run_cli(*args).stderr
+    assert '1 rendered hits' in _run_cli(*args).stderr
+    assert '1 compiled hits' in _run_cli(*args, '--no-cache-output').stderr
+
+    result = _run_cli(*(args + ['--no-cache']))
+    assert result.returncode == 0 and 'Compiled cache' not in result.stderr
+    result = _run_cli(schema_path, '-o', str(tmp_path / 'out.txt'), '--no-cache', XDG_CACHE_HOME=str(tmp_path / 'home'))
+    assert result.returncode == 0 and not (tmp_path / 'home').exists()
+
+
+def _merged_schema():
+    """A categorize block whose groups are merged, with a chained merge and a duplicate value."""
+    groups = [('1', 'a'), ('2', 'b'), ('3', 'b'), ('4', 'c'), ('5', 'd')]
+    return {'schema': {
+        'name': 'Merged',
+        'rules': [{'type': 'categorize', 'asset': 'AwsAccount', 'tag_field': ['Env'], 'ref_id': '10',
+                   'name': 'Env', 'condition': {'clauses': []}}],
+        'merges': [{'type': 'Group', 'to': '4', 'from': ['1']}, {'type': 'Group', 'to': '5', 'from': ['4']}],
+        'constants': [{'type': 'Dynamic Group', 'list': [
+            {'ref_id': ref_id, 'name': f"Env {val}", 'val': val, 'blk_id': '10'} for ref_id, val in groups
+        ]}],
+    }}
+
+
+def test_tag_index_maps_values_to_final_groups():
+    perspective = parse_perspective.compile_perspective(_merged_schema())
+    block, = perspective.blocks
+    ref_ids = perspective.ref_ids
+    index = {value: ref_ids[group] for value, group in block.index.items()}
+    # Merges are followed to the end of the chain; the first group with a value wins
+    assert index == {'a': '5', 'b': '2', 'c': '5', 'd': '5'}
+
+
+def test_tag_index_is_noted_in_the_profile():
+    with parse_perspective.profiling(trace_memory=False) as profiler:
+        parse_perspective.compile_perspective(_merged_schema())
+    notes = profiler.stages['tag-index']['notes']
+    assert notes['blocks'] == 1 and notes['entries'] == 4 and notes['bytes'] > 0